@@ -0,0 +1,159 @@
+import array
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from embedding_cache import normalize_text
+from memory import cosine
+from startup import LazyValue
+
+
+# -------------------------------
+# Cache des réponses aux questions sur les PDF
+# -------------------------------
+def answer_scope(collection, model, prompt_template):
+    """
+    Portée d'une réponse : même collection, même modèle, même prompt.
+    """
+    key = f"{collection}\0{model}\0{prompt_template}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Cache SQLite des réponses. Couche exacte : (portée, morceaux retrouvés,
+    question normalisée). Couche sémantique optionnelle (si `embeddings`) : une
+    question reformulée de même portée est servie si sa similarité avec une
+    question en cache dépasse `similarity_threshold` et si au moins
+    `min_overlap` des morceaux retrouvés sont communs. Les entrées expirent
+    après `ttl` secondes et sont évincées LRU au-delà de `max_entries`.
+    Le vecteur d'une question (`query_vector`) est partagé entre lookup() et
+    store() : une question non servie n'est embeddée qu'une fois.
+    """
+
+    def __init__(self, path, embeddings=None, similarity_threshold=0.92, min_overlap=0.6,
+                 ttl=7 * 24 * 3600, max_entries=5000):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.min_overlap = min_overlap
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, scope TEXT NOT NULL, question TEXT NOT NULL, ids TEXT NOT NULL, "
+            "vector BLOB, answer TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers(scope)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(scope, question, chunk_ids):
+        raw = f"{scope}\0{normalize_text(question).lower()}\0{','.join(sorted(chunk_ids))}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def query_vector(self, question):
+        """
+        Vecteur de la question, calculé à la première demande seulement (None
+        sans embeddings ou si le calcul échoue), à passer à lookup() puis store().
+        """
+        def embed():
+            if self.embeddings is None:
+                return None
+            try:
+                return self.embeddings.embed_query(question)
+            except Exception:
+                return None
+        return LazyValue(embed)
+
+    def lookup(self, scope, question, chunk_ids, query=None):
+        """
+        Retourne (réponse, "exact" | "semantic") ou None.
+        """
+        now = time.time()
+        key = self.key(scope, question, chunk_ids)
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            row = self._conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._touch(key, now)
+                self.hits += 1
+                return row[0], "exact"
+
+        match = self._semantic_lookup(scope, query or self.query_vector(question), chunk_ids, now)
+        with self._lock:
+            if match:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return match
+
+    def store(self, scope, question, chunk_ids, answer, query=None):
+        vector = (query or self.query_vector(question)).get()
+        if vector is not None:
+            vector = array.array("d", vector).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, scope, question, ids, vector, answer, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(scope, question, chunk_ids), scope, question, json.dumps(sorted(chunk_ids)),
+                 vector, answer, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM answers WHERE key IN ("
+                    "SELECT key FROM answers ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _semantic_lookup(self, scope, query, chunk_ids, now):
+        if self.embeddings is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, ids, vector, answer FROM answers WHERE scope = ? AND vector IS NOT NULL",
+                (scope,)
+            ).fetchall()
+        if not rows:
+            return None
+        query = query.get()
+        if query is None:
+            return None
+
+        wanted = set(chunk_ids)
+        best = None
+        for key, ids, blob, answer in rows:
+            ids = set(json.loads(ids))
+            overlap = len(ids & wanted) / max(len(ids | wanted), 1)
+            if overlap < self.min_overlap:
+                continue
+            score = cosine(query, array.array("d", blob).tolist())
+            if score >= self.similarity_threshold and (best is None or score > best[0]):
+                best = (score, key, answer)
+        if best is None:
+            return None
+        with self._lock:
+            self._touch(best[1], now)
+        return best[2], "semantic"
+
+    def _touch(self, key, now):
+        self._conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+        self._conn.commit()
@@ -0,0 +1,288 @@
+"""
+Benchmarks d'ingestion, de recherche et de réponse, contre un faux serveur Ollama.
+
+    python -m benchmarks.bench                          # 10, 100 et 1000 pages, comparé à baseline.json
+    python -m benchmarks.bench --sizes 10 100 --questions 10
+    python -m benchmarks.bench --save-baseline          # enregistre les résultats comme nouvelle référence
+
+Chaque taille de PDF est mesurée dans un processus séparé (pic de mémoire
+propre à la mesure) ; le faux serveur tourne dans le processus principal.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_ollama import FakeOllama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = (10, 100, 1000)
+BENCH_MODEL = "bench-llm"
+
+# Métrique -> True si une valeur plus grande est meilleure
+METRICS = {
+    "pages_per_sec": True,
+    "embeddings_per_sec": True,
+    "ingest_seconds": False,
+    "query_p50": False,
+    "query_p95": False,
+    "ttft_p50": False,
+    "ttft_p95": False,
+    "summary_seconds": False,
+    "peak_rss_mb": False,
+}
+
+WORDS = ("pompe filtre moteur vanne capteur pression débit température courant tension "
+         "maintenance procédure contrôle sécurité garantie installation réglage nettoyage "
+         "alarme défaut remplacement joint roulement carter huile circuit câble boîtier").split()
+
+
+# -------------------------------
+# Données de test
+# -------------------------------
+def page_text(rng, page):
+    sentences = []
+    for _ in range(12):
+        words = rng.choices(WORDS, k=rng.randint(10, 18))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), f"E-{rng.randint(1000, 9999)}")
+        sentences.append(" ".join(words).capitalize() + ".")
+    return f"Section {page}\n\n" + " ".join(sentences)
+
+
+def generate_pdf(path, pages, seed=0):
+    """
+    PDF déterministe de `pages` pages de texte technique (mots, codes d'erreur).
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), page_text(rng, i + 1), fontsize=9)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_questions(count, seed=1):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        if i % 3 == 2:
+            questions.append(f"Que signifie le code E-{rng.randint(1000, 9999)} ?")
+        else:
+            a, b = rng.sample(WORDS, 2)
+            questions.append(f"Question {i} : que dit le document sur {a} et {b} ?")
+    return questions
+
+
+# -------------------------------
+# Mesures
+# -------------------------------
+def percentile(values, q):
+    """
+    Percentile par interpolation linéaire (q entre 0 et 100).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Ko sous Linux, octets sous macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_size(pages, workdir, ollama_url, questions=20, summarize_max_pages=10):
+    """
+    Mesure une taille de PDF dans le processus courant et retourne les métriques.
+    """
+    os.environ["OLLAMA_HOST"] = ollama_url
+    from engine import RAGEngine, collection_name
+    from streaming import StreamingCall
+
+    pdf_path = os.path.join(workdir, f"bench-{pages}.pdf")
+    if not os.path.exists(pdf_path):
+        generate_pdf(pdf_path, pages)
+
+    run_dir = os.path.join(workdir, f"run-{pages}-{os.getpid()}")
+    os.makedirs(run_dir)
+    # Le faux serveur répond à toutes les requêtes en parallèle : même concurrence
+    # que les workers du résumé map-reduce
+    engine = RAGEngine(os.path.join(run_dir, "chroma_db"), workers=4)
+    engine.warm_up(BENCH_MODEL)
+
+    start = time.perf_counter()
+    result = engine.ingest(pdf_path)
+    ingest_seconds = time.perf_counter() - start
+    embedded = engine.embeddings.stats()["misses"]
+    vectorstore = result["vectorstore"]
+
+    chain = engine.qa_chain(vectorstore, BENCH_MODEL)
+    name = collection_name(vectorstore)
+    latencies = []
+    ttfts = []
+    for question in make_questions(questions):
+        # Horloge de StreamingCall : le premier token est compté depuis la question (recherche comprise)
+        start = time.monotonic()
+        prepared = engine.prepare_question(chain, name, BENCH_MODEL, question)
+        call = StreamingCall(prepared.generate).start()
+        call.join()
+        latencies.append(time.monotonic() - start)
+        if call.first_token_at is not None:
+            ttfts.append(call.first_token_at - start)
+
+    summary_seconds = None
+    if pages <= summarize_max_pages:
+        start = time.perf_counter()
+        engine.summarize(vectorstore, BENCH_MODEL)
+        summary_seconds = time.perf_counter() - start
+
+    return {
+        "pages": pages,
+        "chunks": result["chunks"],
+        "ingest_seconds": ingest_seconds,
+        "pages_per_sec": pages / ingest_seconds,
+        "embeddings_per_sec": embedded / ingest_seconds,
+        "query_p50": percentile(latencies, 50),
+        "query_p95": percentile(latencies, 95),
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "summary_seconds": summary_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(pages, workdir, ollama_url, questions, summarize_max_pages):
+    command = [sys.executable, "-m", "benchmarks.bench", "--single", str(pages), "--workdir", workdir,
+               "--ollama-url", ollama_url, "--questions", str(questions),
+               "--summarize-max-pages", str(summarize_max_pages)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark {pages} pages en échec :\n{result.stderr.strip()[-3000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# -------------------------------
+# Comparaison avec la référence
+# -------------------------------
+def compare(results, baseline, tolerance=0.25):
+    """
+    Lignes (pages, métrique, valeur, référence, écart relatif, régression ?) pour
+    chaque métrique présente des deux côtés. Une régression est un écart
+    défavorable de plus de `tolerance`.
+    """
+    rows = []
+    for result in results:
+        base = baseline.get("results", {}).get(str(result["pages"]))
+        for metric, higher_is_better in METRICS.items():
+            value = result.get(metric)
+            reference = base.get(metric) if base else None
+            if value is None or not reference:
+                rows.append((result["pages"], metric, value, reference, None, False))
+                continue
+            delta = (value - reference) / reference
+            worse = -delta if higher_is_better else delta
+            rows.append((result["pages"], metric, value, reference, delta, worse > tolerance))
+    return rows
+
+
+def format_rows(rows):
+    def fmt(value):
+        return "-" if value is None else f"{value:.4g}"
+
+    lines = [f"{'pages':>6}  {'métrique':<20} {'mesure':>10} {'référence':>10} {'écart':>8}"]
+    for pages, metric, value, reference, delta, regression in rows:
+        change = "-" if delta is None else f"{delta:+.0%}"
+        lines.append(f"{pages:>6}  {metric:<20} {fmt(value):>10} {fmt(reference):>10} {change:>8}"
+                     + ("  RÉGRESSION" if regression else ""))
+    return "\n".join(lines)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, fake):
+    data = {
+        "fake_ollama": {
+            "embed_latency": fake.embed_latency,
+            "embed_item_latency": fake.embed_item_latency,
+            "first_token_latency": fake.first_token_latency,
+            "token_latency": fake.token_latency,
+            "tokens": fake.tokens,
+        },
+        "results": {str(r["pages"]): r for r in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Nombre de pages")
+    parser.add_argument("--questions", type=int, default=20, help="Questions par taille")
+    parser.add_argument("--summarize-max-pages", type=int, default=10, help="Résumé mesuré jusqu'à cette taille")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Écart défavorable toléré (0.25 = 25 %%)")
+    parser.add_argument("--workdir", help="Répertoire des PDF générés et des bases (temporaire par défaut)")
+    parser.add_argument("--json-out", help="Écrit aussi les résultats bruts dans ce fichier")
+    # Usage interne : mesure d'une seule taille dans un processus dédié
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--ollama-url", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.single:
+        print(json.dumps(run_size(args.single, args.workdir, args.ollama_url, args.questions,
+                                  args.summarize_max_pages)))
+        return 0
+
+    fake = FakeOllama().start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="ollama-bench-") as tmp:
+            workdir = args.workdir or tmp
+            os.makedirs(workdir, exist_ok=True)
+            results = []
+            for pages in args.sizes:
+                print(f"[bench] {pages} pages...", file=sys.stderr)
+                results.append(run_isolated(pages, workdir, fake.url, args.questions, args.summarize_max_pages))
+    finally:
+        fake.stop()
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    rows = compare(results, load_baseline(args.baseline), args.tolerance)
+    print(format_rows(rows))
+    if args.save_baseline:
+        save_baseline(args.baseline, results, fake)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 0
+    return 1 if any(regression for *_, regression in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# -------------------------------
+# Faux serveur Ollama déterministe pour les benchmarks
+# -------------------------------
+def fake_vector(text, dim=64):
+    """
+    Vecteur unitaire déterministe dérivé du hash du texte.
+    """
+    digest = b""
+    counter = 0
+    while len(digest) < dim:
+        digest += hashlib.sha256(f"{counter}\0{text}".encode("utf-8")).digest()
+        counter += 1
+    values = [b / 255.0 - 0.5 for b in digest[:dim]]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+class FakeOllama:
+    """
+    Implémente /api/embed, /api/generate (flux NDJSON), /api/tags et /api/show avec des
+    latences fixes : `embed_latency` par requête + `embed_item_latency` par
+    texte, `first_token_latency` avant le premier token puis `token_latency`
+    entre deux tokens, `tokens` tokens par réponse. /api/show annonce une longueur
+    de contexte `context_length` et, si `num_ctx` est fixé, ce paramètre du Modelfile.
+    """
+
+    def __init__(self, embed_latency=0.005, embed_item_latency=0.0005, first_token_latency=0.05,
+                 token_latency=0.005, tokens=40, dim=64, models=("bench-llm", "nomic-embed-text"),
+                 context_length=8192, num_ctx=None):
+        self.embed_latency = embed_latency
+        self.embed_item_latency = embed_item_latency
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.dim = dim
+        self.models = list(models)
+        self.context_length = context_length
+        self.num_ctx = num_ctx
+        self.counts = {"embed_requests": 0, "embedded": 0, "generate_requests": 0, "show_requests": 0}
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    return self._json({"models": [{"name": m} for m in fake.models]})
+                if self.path == "/api/version":
+                    return self._json({"version": "0.0.0-bench"})
+                self._json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if self.path == "/api/embed":
+                    return self._embed(body)
+                if self.path == "/api/generate":
+                    return self._generate(body)
+                if self.path == "/api/show":
+                    return self._show(body)
+                self._json({"error": "not found"}, status=404)
+
+            def _embed(self, body):
+                texts = body.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                time.sleep(fake.embed_latency + fake.embed_item_latency * len(texts))
+                with fake._lock:
+                    fake.counts["embed_requests"] += 1
+                    fake.counts["embedded"] += len(texts)
+                self._json({"model": body.get("model"),
+                            "embeddings": [fake_vector(t, fake.dim) for t in texts]})
+
+            def _show(self, body):
+                if body.get("model") not in fake.models:
+                    return self._json({"error": "model not found"}, status=404)
+                with fake._lock:
+                    fake.counts["show_requests"] += 1
+                parameters = f"num_ctx {fake.num_ctx}" if fake.num_ctx else ""
+                self._json({"parameters": parameters,
+                            "model_info": {"general.architecture": "llama",
+                                           "llama.context_length": fake.context_length}})
+
+            def _generate(self, body):
+                with fake._lock:
+                    fake.counts["generate_requests"] += 1
+                prompt = body.get("prompt", "")
+                if not prompt:
+                    # Préchargement (prompt vide) : réponse immédiate, sans génération
+                    return self._json({"model": body.get("model"), "response": "", "done": True})
+                words = [f"mot{int(h, 16) % 997}" for h in
+                         (hashlib.sha256(f"{i}\0{prompt}".encode()).hexdigest()[:6] for i in range(fake.tokens))]
+                prompt_tokens = -(-len(prompt) // 3)  # ~3 caractères par token
+                if not body.get("stream", True):
+                    time.sleep(fake.first_token_latency + fake.token_latency * (fake.tokens - 1))
+                    return self._json({"model": body.get("model"), "response": " ".join(words), "done": True,
+                                       "prompt_eval_count": prompt_tokens, "eval_count": len(words)})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(fake.first_token_latency)
+                for i, word in enumerate(words):
+                    if i:
+                        time.sleep(fake.token_latency)
+                    self._chunk({"model": body.get("model"), "response": (" " if i else "") + word,
+                                 "done": False})
+                self._chunk({"model": body.get("model"), "response": "", "done": True, "done_reason": "stop",
+                             "prompt_eval_count": prompt_tokens, "eval_count": len(words)})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _chunk(self, payload):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _json(self, payload, status=200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
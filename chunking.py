@@ -0,0 +1,161 @@
+import re
+
+from langchain.docstore.document import Document
+
+
+# -------------------------------
+# Découpage des pages en morceaux bornés en tokens
+# -------------------------------
+def estimate_tokens(text):
+    """
+    Estimation du nombre de tokens (~4 caractères par token), sans dépendre
+    du tokenizer du modèle.
+    """
+    text = text.strip()
+    if not text:
+        return 0
+    return max(1, round(len(text) / 4))
+
+
+HEADING_RE = re.compile(r"^(#{1,6}\s+\S|\d+(\.\d+)*\.?\s+[A-ZÀ-Ý]|[A-ZÀ-Ý0-9][A-ZÀ-Ý0-9 '’\-:]{2,}$)")
+PARAGRAPH_RE = re.compile(r"\S.*?(?=\n[ \t]*\n|\Z)", re.S)
+SENTENCE_RE = re.compile(r"\S.*?(?:[.!?](?=\s)|\Z)", re.S)
+WORD_RE = re.compile(r"\S+")
+LINE_RE = re.compile(r"[^\n]*\S[^\n]*")
+
+
+def is_heading(text):
+    """
+    Heuristique : ligne courte, sans ponctuation finale, numérotée, en majuscules ou en Markdown.
+    """
+    text = text.strip()
+    if not text or "\n" in text or len(text) > 80 or text[-1] in ".;,":
+        return False
+    return bool(HEADING_RE.match(text))
+
+
+class TokenChunker:
+    """
+    Découpe chaque page en morceaux d'au plus `chunk_tokens` tokens, avec
+    `overlap_tokens` de recouvrement. Les paragraphes ne sont coupés que s'ils
+    dépassent le budget, un titre ouvre toujours un nouveau morceau, et les
+    morceaux de moins de `min_tokens` tokens (pages quasi vides) sont ignorés.
+    Chaque morceau garde les métadonnées de sa page plus `start_index` (offset
+    dans la page), `chunk` et, s'il existe, `heading`.
+    """
+
+    def __init__(self, chunk_tokens=350, overlap_tokens=40, min_tokens=8):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+
+    def split(self, doc):
+        text = doc.page_content
+        chunks = []
+        current = []
+        fresh = 0  # unités du morceau courant qui ne viennent pas du recouvrement
+        heading = None
+
+        def flush():
+            nonlocal current, fresh
+            if fresh and sum(u[2] for u in current) >= self.min_tokens:
+                start, end = current[0][0], current[-1][1]
+                metadata = dict(doc.metadata, start_index=start, chunk=len(chunks))
+                if heading:
+                    metadata["heading"] = heading
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+            current = self._overlap(current, text) if fresh else []
+            fresh = 0
+
+        for start, end, tokens in self._units(text):
+            unit_text = text[start:end]
+            if is_heading(unit_text):
+                flush()
+                current = []
+                heading = unit_text.strip()
+            elif current and sum(u[2] for u in current) + tokens > self.chunk_tokens:
+                flush()
+            current.append((start, end, tokens))
+            fresh += 1
+        flush()
+        return chunks
+
+    def split_documents(self, docs):
+        return [chunk for doc in docs for chunk in self.split(doc)]
+
+    def _units(self, text):
+        """
+        Paragraphes (start, end, tokens), redécoupés en phrases puis en fenêtres
+        de mots lorsqu'ils dépassent le budget. Les lignes de titre forment leur
+        propre unité, PyMuPDF ne séparant pas toujours les blocs par une ligne vide.
+        """
+        for para in PARAGRAPH_RE.finditer(text):
+            block = None
+            for line in LINE_RE.finditer(text, para.start(), para.end()):
+                if is_heading(line.group()):
+                    if block:
+                        yield from self._fit(block[0], block[1], text, [SENTENCE_RE, WORD_RE])
+                        block = None
+                    yield line.start(), line.end(), estimate_tokens(line.group())
+                elif block:
+                    block = (block[0], line.end())
+                else:
+                    block = (line.start(), line.end())
+            if block:
+                yield from self._fit(block[0], block[1], text, [SENTENCE_RE, WORD_RE])
+
+    def _fit(self, start, end, text, splitters):
+        tokens = estimate_tokens(text[start:end])
+        if tokens <= self.chunk_tokens or not splitters:
+            yield start, end, tokens
+            return
+        pattern, rest = splitters[0], splitters[1:]
+        pieces = [(start + m.start(), start + m.end()) for m in pattern.finditer(text[start:end])]
+        if pattern is WORD_RE:
+            # Fenêtres de mots consécutifs tenant dans le budget
+            window = []
+            for piece in pieces:
+                if window and estimate_tokens(text[window[0][0]:piece[1]]) > self.chunk_tokens:
+                    yield window[0][0], window[-1][1], estimate_tokens(text[window[0][0]:window[-1][1]])
+                    window = []
+                window.append(piece)
+            if window:
+                yield window[0][0], window[-1][1], estimate_tokens(text[window[0][0]:window[-1][1]])
+            return
+        for piece_start, piece_end in pieces:
+            yield from self._fit(piece_start, piece_end, text, rest)
+
+    def _overlap(self, units, text):
+        """
+        Fin du morceau reprise au début du suivant : les dernières unités entières
+        qui tiennent dans `overlap_tokens`, complétées par la fin (phrases, sinon
+        mots) de l'unité qui ne tient pas entière, un paragraphe le plus souvent.
+        """
+        kept = []
+        total = 0
+        for unit in reversed(units):
+            if total + unit[2] > self.overlap_tokens:
+                kept[:0] = self._tail(unit, text, self.overlap_tokens - total)
+                break
+            kept.insert(0, unit)
+            total += unit[2]
+        return kept
+
+    def _tail(self, unit, text, budget):
+        """
+        Dernières phrases de l'unité tenant dans `budget` tokens, ou à défaut ses
+        derniers mots, en une unité (start, end, tokens) ; [] si rien ne tient.
+        """
+        start, end = unit[0], unit[1]
+        for pattern in (SENTENCE_RE, WORD_RE):
+            tail_start = None
+            total = 0
+            for match in reversed(list(pattern.finditer(text, start, end))):
+                tokens = estimate_tokens(match.group())
+                if total + tokens > budget:
+                    break
+                tail_start = match.start()
+                total += tokens
+            if tail_start is not None and tail_start > start:
+                return [(tail_start, end, estimate_tokens(text[tail_start:end]))]
+        return []
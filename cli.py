@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+# -------------------------------
+# Interface en ligne de commande (sans Tk)
+#   python main.py ingest docs/ rapport.pdf
+#   python main.py ask --pdf rapport.pdf "Quel est le budget ?"
+#   python main.py ask --questions questions.jsonl
+#   python main.py ask --corpus "Quels documents parlent du budget ?"
+#   python main.py summarize rapport.pdf
+#   python main.py serve --port 8765 --metrics
+#   python main.py --trace-log traces.jsonl ask --corpus "..."
+#   python main.py store list|gc|compact
+#   python main.py watch partage/ --interval 5
+#   python main.py --quantize int8 ask --corpus "..."
+#   python main.py startup-report
+# -------------------------------
+def find_pdfs(paths):
+    """
+    Fichiers PDF désignés par `paths` : fichiers tels quels, dossiers parcourus récursivement.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".pdf"))
+        else:
+            found.append(path)
+    return found
+
+
+def read_questions(path):
+    """
+    Fichier JSONL : une question par ligne, soit une chaîne, soit un objet
+    {"question": ..., "pdf"?: ..., "collection"?: ..., "corpus"?: true, "model"?: ...}.
+    """
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            questions.append({"question": item} if isinstance(item, str) else item)
+    return questions
+
+
+def default_model():
+    from model_discovery import get_ollama_models
+    models = get_ollama_models()
+    if not models:
+        raise SystemExit("Aucun modèle Ollama disponible (utilisez --model).")
+    return models[0]
+
+
+def public(result):
+    """
+    Résultat d'ingestion sérialisable (sans l'objet vectorstore).
+    """
+    return {k: v for k, v in result.items() if k != "vectorstore"}
+
+
+def emit(record, out):
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+def run_ingest(engine, args, out):
+    pdfs = find_pdfs(args.paths)
+
+    def ingest(path):
+        try:
+            return public(engine.ingest(path))
+        except Exception as e:
+            return {"path": path, "error": str(e)}
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for record in pool.map(ingest, pdfs):
+            failed += "error" in record
+            emit(record, out)
+    return 1 if failed else 0
+
+
+def run_ask(engine, args, out):
+    questions = [{"question": q} for q in args.question]
+    if args.questions:
+        questions.extend(read_questions(args.questions))
+    if not questions:
+        raise SystemExit("Aucune question (arguments ou --questions).")
+
+    model = args.model
+    if model is None and any("model" not in q for q in questions):
+        model = default_model()
+    # Les modèles se chargent dans Ollama pendant l'ingestion des PDF visés
+    engine.warm_up(*dict.fromkeys(q.get("model", model) for q in questions))
+    vectorstores = {}
+
+    def vectorstore(pdf, collection):
+        # Un PDF n'est ingéré qu'une fois, même s'il est visé par plusieurs questions
+        key = (pdf, collection)
+        if key not in vectorstores:
+            vectorstores[key] = engine.vectorstore_for(pdf_path=pdf, collection=collection)
+        return vectorstores[key]
+
+    targets = []
+    for q in questions:
+        if q.get("corpus", args.corpus):
+            targets.append(None)
+            continue
+        pdf = q.get("pdf", args.pdf)
+        collection = q.get("collection", args.collection)
+        if not pdf and not collection:
+            raise SystemExit(f"Question sans PDF ni collection : {q['question']}")
+        targets.append((pdf, collection))
+    for target in dict.fromkeys(targets):
+        if target is not None:
+            vectorstore(*target)
+
+    def ask(item):
+        q, target = item
+        try:
+            if target is None:
+                # Recherche sur tous les documents, réponse avec références [document, page]
+                return engine.ask_corpus(q.get("model", model), q["question"], k=args.k)
+            return engine.ask(vectorstore(*target), q.get("model", model), q["question"])
+        except Exception as e:
+            return {"question": q["question"], "error": str(e)}
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for record in pool.map(ask, zip(questions, targets)):
+            failed += "error" in record
+            emit(record, out)
+    return 1 if failed else 0
+
+
+def run_summarize(engine, args, out):
+    model = args.model or default_model()
+    targets = [("pdf", p) for p in find_pdfs(args.paths)]
+    targets += [("collection", c) for c in args.collection]
+
+    def summarize(target):
+        kind, name = target
+        try:
+            if kind == "pdf":
+                vectorstore = engine.vectorstore_for(pdf_path=name)
+            else:
+                vectorstore = engine.vectorstore_for(collection=name)
+            return {kind: name, "summary": engine.summarize(vectorstore, model)}
+        except Exception as e:
+            return {kind: name, "error": str(e)}
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for record in pool.map(summarize, targets):
+            failed += "error" in record
+            emit(record, out)
+    return 1 if failed else 0
+
+
+def run_store(engine, args, out):
+    from maintenance import StoreMaintenance
+    maintenance = StoreMaintenance(engine)
+    if args.action == "list":
+        for info in maintenance.inventory():
+            emit(info, out)
+        emit({"total_bytes": maintenance.usage()}, out)
+    elif args.action == "gc":
+        removed = maintenance.collect_garbage(dry_run=args.dry_run, orphans=not args.keep_orphans,
+                                              missing_files=args.missing_files)
+        for info in removed:
+            emit({"collection": info["collection"], "status": info["status"], "vectors": info["vectors"],
+                  "disk_bytes": info["disk_bytes"], "removed": not args.dry_run}, out)
+        emit({"removed": 0 if args.dry_run else len(removed), "total_bytes": maintenance.usage()}, out)
+    elif args.action == "compact":
+        emit(maintenance.compact(), out)
+    elif args.action == "quantize":
+        if engine.vectors is None:
+            raise SystemExit("Précisez le format compact : main.py --quantize int8|float16 store quantize")
+        for name in engine.collections():
+            engine.ensure_quantized(name)
+            emit({"collection": name, "mode": engine.vectors.mode}, out)
+        emit(engine.vectors.stats(), out)
+    return 0
+
+
+def watch_record(event):
+    record = dict(event)
+    if "error" in record:
+        record["error"] = str(record["error"])
+    return record
+
+
+def run_watch(engine, args, out):
+    from watcher import FolderWatcher
+    missing = [folder for folder in args.folders if not os.path.isdir(folder)]
+    if missing:
+        raise SystemExit(f"Dossier introuvable : {', '.join(missing)}")
+    watcher = FolderWatcher(engine, args.folders, interval=args.interval, settle=args.settle)
+    if args.once:
+        watcher.run_once()
+        failed = 0
+        while not watcher.events.empty():
+            event = watcher.events.get_nowait()
+            failed += event["type"] == "error"
+            emit(watch_record(event), out)
+        return 1 if failed else 0
+
+    watcher.start()
+    try:
+        while True:
+            try:
+                emit(watch_record(watcher.events.get(timeout=0.5)), out)
+            except queue.Empty:
+                pass
+    except KeyboardInterrupt:
+        watcher.stop()
+        watcher.join(timeout=10)
+    return 0
+
+
+def run_serve(engine, args, out):
+    from server import serve
+    engine.warm_up()
+    serve(engine, host=args.host, port=args.port, metrics=args.metrics)
+    return 0
+
+
+def run_startup_report(engine, args, out):
+    from startup import IMPORT_TARGET, format_report, import_report
+    total, ranked = import_report(args.module, top=args.top)
+    out.write(format_report(total, ranked, IMPORT_TARGET) + "\n")
+    return 0 if total <= IMPORT_TARGET else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="Ollama chatbot + analyse PDF, sans interface.")
+    parser.add_argument("--persist-dir", default="chroma_db", help="Répertoire Chroma (défaut : chroma_db)")
+    parser.add_argument("--quantize", choices=["int8", "float16"],
+                        help="Recherche vectorielle sur une copie compacte des collections")
+    parser.add_argument("--memory-budget", type=int, default=256, help="Mémoire des vecteurs compacts (Mo)")
+    parser.add_argument("--ollama-parallel", type=int,
+                        help="Appels simultanés au modèle (défaut : OLLAMA_NUM_PARALLEL, sinon 2)")
+    parser.add_argument("--ocr", nargs="?", const="fra+eng", metavar="LANGUES",
+                        help="OCR (Tesseract) des pages numérisées, langues par défaut fra+eng")
+    parser.add_argument("--context-tokens", type=int, default=1500,
+                        help="Tokens d'extraits au plus dans le prompt, dans la limite de la fenêtre du modèle")
+    parser.add_argument("--trace-log", help="Journal JSON des durées par étape (fichier, ou - pour stderr)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Indexer des PDF ou des dossiers de PDF")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--workers", type=int, default=2, help="PDF ingérés en parallèle")
+    ingest.set_defaults(run=run_ingest)
+
+    ask = commands.add_parser("ask", help="Poser des questions à un PDF ; réponses en JSONL sur stdout")
+    ask.add_argument("question", nargs="*")
+    ask.add_argument("--pdf")
+    ask.add_argument("--collection")
+    ask.add_argument("--corpus", action="store_true", help="Interroger tous les PDF ingérés")
+    ask.add_argument("--k", type=int, default=4, help="Morceaux visés en mode corpus (2k candidats avant le budget de contexte)")
+    ask.add_argument("--questions", help="Fichier JSONL de questions")
+    ask.add_argument("--model")
+    ask.add_argument("--concurrency", type=int, default=4, help="Questions traitées en parallèle")
+    ask.add_argument("--rerank", action="store_true", help="Reclassement léger des morceaux retrouvés")
+    ask.set_defaults(run=run_ask)
+
+    summarize = commands.add_parser("summarize", help="Résumer des PDF ou des dossiers de PDF")
+    summarize.add_argument("paths", nargs="*")
+    summarize.add_argument("--collection", action="append", default=[])
+    summarize.add_argument("--model")
+    summarize.add_argument("--workers", type=int, default=1)
+    summarize.set_defaults(run=run_summarize)
+
+    serve = commands.add_parser("serve", help="API HTTP locale (JSON) sur un moteur partagé")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--rerank", action="store_true", help="Reclassement léger des morceaux retrouvés")
+    serve.add_argument("--metrics", action="store_true", help="Expose GET /metrics (format Prometheus)")
+    serve.set_defaults(run=run_serve)
+
+    store = commands.add_parser("store", help="Entretien de chroma_db : inventaire, nettoyage, compactage")
+    store.add_argument("action", choices=["list", "gc", "compact", "quantize"])
+    store.add_argument("--dry-run", action="store_true", help="gc : affiche sans supprimer")
+    store.add_argument("--keep-orphans", action="store_true", help="gc : garde les collections hors registre")
+    store.add_argument("--missing-files", action="store_true", help="gc : supprime aussi les PDF disparus")
+    store.set_defaults(run=run_store)
+
+    watch = commands.add_parser("watch", help="Surveiller des dossiers : ingestion des PDF ajoutés, modifiés, supprimés")
+    watch.add_argument("folders", nargs="+")
+    watch.add_argument("--interval", type=float, default=2.0, help="Secondes entre deux parcours")
+    watch.add_argument("--settle", type=float, default=1.0, help="Secondes de stabilité avant ingestion")
+    watch.add_argument("--once", action="store_true", help="Un seul parcours, puis quitter")
+    watch.set_defaults(run=run_watch)
+
+    report = commands.add_parser("startup-report", help="Temps d'import de l'application, comparé à l'objectif")
+    report.add_argument("--module", default="main")
+    report.add_argument("--top", type=int, default=15)
+    report.set_defaults(run=run_startup_report, needs_engine=False)
+    return parser
+
+
+def main(argv=None, engine=None, out=None):
+    args = build_parser().parse_args(argv)
+    if not args.trace_log:
+        return _run(args, engine, out)
+    from tracing import log_json, logger
+    stream = sys.stderr if args.trace_log == "-" else open(args.trace_log, "a", encoding="utf-8")
+    handler = log_json(stream)
+    try:
+        return _run(args, engine, out)
+    finally:
+        logger.removeHandler(handler)
+        if stream is not sys.stderr:
+            stream.close()
+
+
+def _run(args, engine, out):
+    if engine is None and getattr(args, "needs_engine", True):
+        from engine import RAGEngine
+        engine = RAGEngine(args.persist_dir, rerank=getattr(args, "rerank", False), quantize=args.quantize,
+                           memory_budget_mb=args.memory_budget, workers=args.ollama_parallel, ocr=args.ocr,
+                           context_tokens=args.context_tokens)
+    return args.run(engine, args, out or sys.stdout)
@@ -0,0 +1,287 @@
+import json
+import math
+import os
+import threading
+import time
+import urllib.request
+
+from langchain.docstore.document import Document
+
+from model_discovery import ollama_base_url
+
+# Fenêtre supposée quand Ollama ne répond pas (non mise en cache, redemandée ensuite)
+FALLBACK_WINDOW = 2048
+# num_ctx appliqué par Ollama quand le Modelfile ne le fixe pas (OLLAMA_CONTEXT_LENGTH sinon)
+DEFAULT_NUM_CTX = 4096
+# Caractères par token : estimation par défaut (chunking.estimate_tokens) et plancher
+# de la calibration, pour ne jamais sous-estimer un texte dense en tokens
+CHARS_PER_TOKEN = 4.0
+MIN_CHARS_PER_TOKEN = 2.5
+
+
+def parse_show(payload, default_num_ctx=DEFAULT_NUM_CTX):
+    """
+    (fenêtre effective, longueur d'entraînement) d'après la réponse de /api/show :
+    le `num_ctx` du Modelfile, sinon celui du serveur, borné par la longueur de
+    contexte du modèle (`<architecture>.context_length`).
+    """
+    trained = None
+    for key, value in (payload.get("model_info") or {}).items():
+        if key.endswith(".context_length") and isinstance(value, int):
+            trained = value
+    num_ctx = None
+    for line in (payload.get("parameters") or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "num_ctx" and parts[1].isdigit():
+            num_ctx = int(parts[1])
+    window = num_ctx or default_num_ctx
+    if trained:
+        window = min(window, trained)
+    return window, trained
+
+
+# -------------------------------
+# Fenêtre de contexte et comptage des tokens, par modèle
+# -------------------------------
+class ModelContext:
+    """
+    Fenêtre de contexte de chaque modèle Ollama, lue une fois via /api/show puis
+    gardée dans un fichier JSON (comme la liste des modèles), et comptage des
+    tokens d'un texte. Le comptage part de ~4 caractères par token et se calibre
+    sur les `prompt_eval_count` renvoyés par Ollama pour ce modèle.
+    """
+
+    def __init__(self, cache_path, base_url=None, default_num_ctx=None, timeout=3.0, retry_after=60.0):
+        self.cache_path = cache_path
+        self.base_url = base_url
+        if default_num_ctx is None:
+            try:
+                default_num_ctx = int(os.environ.get("OLLAMA_CONTEXT_LENGTH", ""))
+            except ValueError:
+                default_num_ctx = DEFAULT_NUM_CTX
+        self.default_num_ctx = default_num_ctx
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._failed = {}
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def window(self, model):
+        """
+        Tokens que le modèle accepte (prompt + réponse).
+        """
+        with self._lock:
+            entry = self.data["models"].get(model)
+            failed = self._failed.get(model)
+        if entry:
+            return entry["window"]
+        if failed is not None and time.monotonic() - failed < self.retry_after:
+            return FALLBACK_WINDOW
+        try:
+            window, trained = parse_show(self._show(model), self.default_num_ctx)
+        except Exception:
+            with self._lock:
+                self._failed[model] = time.monotonic()
+            return FALLBACK_WINDOW
+        with self._lock:
+            self.data["models"][model] = {"window": window, "trained": trained, "fetched_at": time.time()}
+            self._failed.pop(model, None)
+            self._save()
+        return window
+
+    def chars_per_token(self, model=None):
+        with self._lock:
+            return self.data["ratios"].get(model, CHARS_PER_TOKEN)
+
+    def count(self, text, model=None):
+        text = text.strip()
+        if not text:
+            return 0
+        return max(1, math.ceil(len(text) / self.chars_per_token(model)))
+
+    def observe(self, model, prompt_chars, prompt_tokens):
+        """
+        Calibre le comptage sur un prompt réellement évalué. Un `prompt_eval_count`
+        réduit par la réutilisation du cache KV d'Ollama donnerait un ratio trop
+        élevé : le ratio est borné à l'estimation par défaut.
+        """
+        if not model or not prompt_chars or not prompt_tokens:
+            return
+        ratio = min(CHARS_PER_TOKEN, max(MIN_CHARS_PER_TOKEN, prompt_chars / prompt_tokens))
+        with self._lock:
+            previous = self.data["ratios"].get(model)
+            self.data["ratios"][model] = round(ratio if previous is None else 0.7 * previous + 0.3 * ratio, 3)
+            self._save()
+
+    def forget(self, model=None):
+        """
+        Oublie la fenêtre mise en cache (modèle recréé avec un autre num_ctx).
+        """
+        with self._lock:
+            if model is None:
+                self.data["models"].clear()
+            else:
+                self.data["models"].pop(model, None)
+            self._save()
+
+    # ---- Interne
+    def _show(self, model):
+        url = (self.base_url or ollama_base_url()).rstrip("/") + "/api/show"
+        request = urllib.request.Request(url, data=json.dumps({"model": model}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _load(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        return {"models": dict(data.get("models") or {}), "ratios": dict(data.get("ratios") or {})}
+
+    def _save(self):
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass  # cache seulement : la fenêtre sera redemandée au prochain démarrage
+
+
+# -------------------------------
+# Assemblage du contexte : morceaux dédoublonnés puis empaquetés dans un budget
+# -------------------------------
+def _span(doc):
+    meta = doc.metadata
+    start = meta.get("start_index")
+    if not isinstance(start, int):
+        return None
+    return (meta.get("collection"), meta.get("source"), meta.get("page")), start, start + len(doc.page_content)
+
+
+def _merge(kept, doc):
+    """
+    Un seul morceau couvrant `kept` et `doc` s'ils se recouvrent dans la même page
+    (TokenChunker reprend jusqu'à `overlap_tokens` de la fin d'un morceau au
+    début du suivant, paragraphes longs compris), None sinon.
+    Le texte d'un morceau est la tranche [start_index, start_index + len) de sa
+    page : la fusion est exacte.
+    """
+    a, b = _span(kept), _span(doc)
+    if a is None or b is None or a[0] != b[0] or b[1] >= a[2] or a[1] >= b[2]:
+        return None
+    if a[1] <= b[1] and b[2] <= a[2]:
+        return kept
+    first, second = (kept, doc) if a[1] <= b[1] else (doc, kept)
+    first_start, first_end = min(a[1], b[1]), (a if first is kept else b)[2]
+    second_start = (b if first is kept else a)[1]
+    text = first.page_content + second.page_content[first_end - second_start:]
+    return Document(page_content=text, metadata=dict(kept.metadata, start_index=first_start))
+
+
+def dedupe_chunks(docs):
+    """
+    Retire les morceaux au texte identique et fusionne ceux qui se recouvrent,
+    à la place du mieux classé. Retourne (morceaux, nombre de morceaux absorbés).
+    """
+    result = []
+    seen = set()
+    absorbed = 0
+    for doc in docs:
+        text = " ".join(doc.page_content.split())
+        if text in seen:
+            absorbed += 1
+            continue
+        seen.add(text)
+        for i, kept in enumerate(result):
+            merged = _merge(kept, doc)
+            if merged is not None:
+                absorbed += 1
+                # Le morceau agrandi peut à son tour recouvrir un morceau moins bien classé
+                rest = []
+                for other in result[i + 1:]:
+                    joined = _merge(merged, other)
+                    if joined is None:
+                        rest.append(other)
+                    else:
+                        merged = joined
+                        absorbed += 1
+                result[i:] = [merged] + rest
+                break
+        else:
+            result.append(doc)
+    return result, absorbed
+
+
+class ContextBudget:
+    """
+    Choisit les morceaux passés au prompt "stuff" : dédoublonnés, puis pris dans
+    l'ordre de pertinence tant qu'ils tiennent dans le budget (un morceau trop
+    long est sauté au profit des suivants). Le budget est le plus petit de
+    `max_tokens` et de ce que laisse la fenêtre du modèle une fois retirés le
+    gabarit, la question et `answer_tokens` pour la réponse : le prefill reste
+    borné quel que soit le modèle, et un petit modèle ne tronque pas le prompt.
+    """
+
+    def __init__(self, models, max_tokens=1500, answer_tokens=512):
+        self.models = models
+        self.max_tokens = max_tokens
+        self.answer_tokens = answer_tokens
+
+    def budget(self, model, template, question):
+        """
+        (budget en tokens pour les extraits, fenêtre du modèle).
+        """
+        window = self.models.window(model)
+        fixed = self.models.count(template.format(context="", question=question), model)
+        return max(0, min(self.max_tokens, window - self.answer_tokens - fixed)), window
+
+    def fit(self, model, docs, template, question, document_prompt=None):
+        """
+        Morceaux retenus et description de l'assemblage pour la trace.
+        """
+        budget, window = self.budget(model, template, question)
+        candidates, merged = dedupe_chunks(docs)
+        packed = []
+        used = 0
+        for doc in candidates:
+            cost = self._cost(model, doc, document_prompt, first=not packed)
+            if used + cost <= budget:
+                packed.append(doc)
+                used += cost
+            elif not packed:
+                # Même le meilleur morceau ne tient pas : il est raccourci plutôt qu'omis
+                doc = self._truncate(model, doc, budget, cost)
+                if doc is not None:
+                    packed.append(doc)
+                    used += self._cost(model, doc, document_prompt, first=True)
+        return packed, {
+            "window": window,
+            "budget": budget,
+            "tokens": used,
+            "candidates": len(docs),
+            "merged": merged,
+            "docs": len(packed),
+        }
+
+    def _cost(self, model, doc, document_prompt, first):
+        text = doc.page_content
+        if document_prompt:
+            meta = doc.metadata
+            text = document_prompt.format(page_content=text, document=meta.get("document", "?"),
+                                          page=meta.get("page", "?"))
+        # Les extraits sont séparés par une ligne vide
+        return self.models.count(text, model) + (0 if first else 1)
+
+    def _truncate(self, model, doc, budget, cost):
+        chars = int(len(doc.page_content) * budget / cost)
+        text = doc.page_content[:chars]
+        if " " in text:
+            text = text[:text.rindex(" ")]
+        if not text.strip():
+            return None
+        return Document(page_content=text, metadata=dict(doc.metadata, truncated=True))
@@ -0,0 +1,90 @@
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# -------------------------------
+# Recherche sur l'ensemble des PDF ingérés (une collection Chroma par document)
+# -------------------------------
+def citation(doc):
+    """
+    Référence lisible d'un morceau : "rapport.pdf, p. 3".
+    """
+    meta = doc.metadata
+    return f"{os.path.basename(str(meta.get('source', '?')))}, p. {meta.get('page', '?')}"
+
+
+def with_document(doc):
+    """
+    Ajoute le nom du document (métadonnée "document") utilisé dans les références du prompt.
+    """
+    doc.metadata.setdefault("document", os.path.basename(str(doc.metadata.get("source", "?"))))
+    return doc
+
+
+class CorpusSearch:
+    """
+    Recherche vectorielle sur toutes les collections retournées par
+    `collections()`. La question est embeddée une seule fois, puis chaque
+    collection est interrogée en parallèle avec ce vecteur ; les k meilleurs
+    morceaux sont fusionnés par distance (même modèle d'embedding partout, les
+    distances sont comparables). Les vectorstores ouverts sont gardés en mémoire
+    pour que les requêtes suivantes ne rouvrent pas des centaines de collections.
+    """
+
+    def __init__(self, embeddings, open_collection, collections, max_workers=8):
+        self.embeddings = embeddings
+        self.open_collection = open_collection
+        self.collections = collections
+        self.max_workers = max_workers
+        self._stores = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def search(self, query, k=5, only=None):
+        """
+        Retourne [(document, distance)] triés du plus proche au plus lointain.
+        `only` restreint la recherche à certaines collections.
+        """
+        names = [c for c in self.collections() if only is None or c in only]
+        if not names:
+            return []
+        vector = self.embeddings.embed_query(query)
+        per_collection = self._pool.map(lambda name: self._search_one(name, vector, k), names)
+        merged = heapq.nsmallest(k, (hit for hits in per_collection for hit in hits), key=lambda hit: hit[1])
+        for doc, _ in merged:
+            with_document(doc)
+        return merged
+
+    def forget(self, collection):
+        """
+        Oublie le vectorstore d'une collection supprimée ou réécrite.
+        """
+        with self._lock:
+            self._stores.pop(collection, None)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _store(self, name):
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None:
+                store = self._stores[name] = self.open_collection(name)
+            return store
+
+    def _search_one(self, name, vector, k):
+        hits = []
+        for attempt in range(2):
+            try:
+                hits = self._store(name).similarity_search_by_vector_with_relevance_scores(vector, k=k)
+                break
+            except Exception:
+                # Collection recréée depuis l'ouverture : on la rouvre une fois ; si elle
+                # reste illisible, le reste du corpus reste interrogeable
+                self.forget(name)
+        for doc, _ in hits:
+            doc.metadata["collection"] = name
+        return hits
+
@@ -0,0 +1,138 @@
+import array
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+from langchain_core.embeddings import Embeddings
+
+
+# -------------------------------
+# Cache persistant des embeddings
+# -------------------------------
+def normalize_text(text):
+    """
+    Normalise un texte avant hachage : les différences d'espaces ne comptent pas.
+    """
+    return " ".join(text.split())
+
+
+def embedding_key(model_name, text):
+    """
+    Clé de cache : (modèle d'embedding, hash du texte normalisé).
+    """
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un modèle d'embeddings avec un cache SQLite sur disque.
+    Seuls les textes absents du cache sont envoyés au modèle ; au-delà de
+    `max_entries`, les entrées les moins récemment utilisées sont évincées.
+    Les appels au modèle sont mesurés par `tracer` (étapes "embed" et "embed_query").
+    """
+
+    def __init__(self, inner, model_name, cache_path, max_entries=200_000, tracer=None):
+        self.inner = inner
+        self.tracer = tracer
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._last_access = 0.0
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+
+    def embed_documents(self, texts):
+        keys = [embedding_key(self.model_name, t) for t in texts]
+        found = self._lookup(keys)
+
+        # Textes manquants, dédoublonnés pour ne payer qu'un seul appel par contenu
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            with self._span("embed", texts=len(missing), cached=len(texts) - len(missing)):
+                vectors = self.inner.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        with self._span("embed_query", chars=len(text)):
+            return self.inner.embed_query(text)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def _span(self, name, **attrs):
+        return self.tracer.span(name, **attrs) if self.tracer else nullcontext(attrs)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _lookup(self, keys):
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            now = self._tick()
+            # SQLite limite le nombre de paramètres par requête
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array.array("d", blob).tolist()
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})",
+                    [now, *batch]
+                )
+            self._conn.commit()
+        return found
+
+    def _store(self, vectors):
+        with self._lock:
+            now = self._tick()
+            rows = [(key, array.array("d", vec).tobytes(), now) for key, vec in vectors.items()]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _tick(self):
+        # Horodatage strictement croissant, pour un ordre LRU fiable même à résolution d'horloge grossière
+        self._last_access = max(time.time(), self._last_access + 1e-6)
+        return self._last_access
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
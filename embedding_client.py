@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from langchain_core.embeddings import Embeddings
+
+from model_discovery import ollama_base_url
+
+
+# -------------------------------
+# Client d'embeddings Ollama : lots, concurrence bornée, retries
+# -------------------------------
+class OllamaEmbeddingClient(Embeddings):
+    """
+    Embeddings via l'API HTTP /api/embed d'Ollama, sur une session keep-alive.
+    Les textes sont envoyés par lots, au plus `concurrency` requêtes à la fois
+    (les lots suivants attendent : contre-pression sur le serveur local). Une
+    requête en échec est rejouée avec un backoff exponentiel. La taille des lots
+    s'adapte à la latence observée : elle croît tant qu'un lot répond en moins
+    de `target_latency` secondes et est divisée par deux au-delà ou en cas d'erreur.
+    """
+
+    def __init__(self, model, base_url=None, batch_size=16, min_batch_size=1, max_batch_size=256,
+                 concurrency=4, target_latency=2.0, max_retries=4, backoff=0.5, timeout=120,
+                 keep_alive="10m"):
+        self.model = model
+        self.base_url = base_url or ollama_base_url()
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.concurrency = max(1, concurrency)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        results = [None] * len(texts)
+        pending = {}
+        pos = 0
+        while pos < len(texts) or pending:
+            # Contre-pression : jamais plus de `concurrency` lots en vol
+            while pos < len(texts) and len(pending) < self.concurrency:
+                end = min(pos + self.batch_size, len(texts))
+                pending[self._pool.submit(self._embed_batch, texts[pos:end])] = (pos, end)
+                pos = end
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, end = pending.pop(future)
+                results[start:end] = future.result()
+        return results
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0]
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "retries": self.retries, "batch_size": self.batch_size}
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.session.close()
+
+    def _embed_batch(self, texts):
+        payload = {"model": self.model, "input": texts, "keep_alive": self.keep_alive}
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.session.post(f"{self.base_url}/api/embed", json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    response.raise_for_status()  # 4xx : inutile de réessayer
+                    with self._lock:
+                        self.requests += 1
+                        self._adapt(time.monotonic() - start, len(texts))
+                    embeddings = response.json().get("embeddings") or []
+                    if len(embeddings) != len(texts):
+                        # Sinon les vecteurs seraient rattachés (et mis en cache) aux mauvais textes
+                        raise ValueError(f"/api/embed a renvoyé {len(embeddings)} vecteurs "
+                                         f"pour {len(texts)} textes")
+                    return embeddings
+                error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+
+            # Serveur saturé ou injoignable : lots plus petits et nouvel essai après un délai
+            with self._lock:
+                self.requests += 1
+                self._shrink()
+            if attempt >= self.max_retries:
+                raise error
+            with self._lock:
+                self.retries += 1
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def _adapt(self, latency, size):
+        # Seuls les lots pleins renseignent sur la taille courante
+        if size < self.batch_size:
+            return
+        if latency < self.target_latency:
+            self.batch_size = min(self.max_batch_size, max(self.batch_size + 1, int(self.batch_size * 1.5)))
+        else:
+            self._shrink()
+
+    def _shrink(self):
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
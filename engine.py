@@ -0,0 +1,582 @@
+import os
+import threading
+import time
+
+from langchain.vectorstores import Chroma
+from langchain.chains import RetrievalQA, LLMChain
+from langchain.prompts import PromptTemplate
+from langchain.docstore.document import Document
+from langchain_core.callbacks import BaseCallbackHandler
+
+from ingestion import IngestionJob, run_ingestion
+from embedding_cache import CachedEmbeddings
+from embedding_client import OllamaEmbeddingClient
+from registry import DocumentRegistry, document_ids
+from extraction import ExtractionCache, count_pages, iter_pages
+from chunking import TokenChunker
+from summarization import SummaryCache, SummaryEngine
+from answer_cache import AnswerCache, answer_scope
+from context_budget import ContextBudget, ModelContext
+from corpus import CorpusSearch, citation, with_document
+from lexical import LexicalIndex
+from hybrid import HybridRetriever
+from model_pool import ModelPool
+from scheduler import BACKGROUND, QUESTION, RequestScheduler
+from streaming import GenerationStopped
+from tracing import Tracer
+from vector_index import QuantizedIndex
+
+
+# PromptTemplate du chat : "context" (mémoire de conversation) et "question"
+CHAT_PROMPT = """{context}
+Question utilisateur : {question}
+Réponds en français en tenant compte du contexte ci-dessus :
+"""
+
+PDF_QA_PROMPT = """Vous êtes un assistant qui s'appuie sur un document PDF.
+Voici les extraits pertinents (pages) :
+
+{context}
+
+Question : {question}
+
+Réponse en français :
+"""
+
+# Mode corpus : chaque extrait est précédé de sa référence (document, page)
+CORPUS_QA_PROMPT = """Vous êtes un assistant qui s'appuie sur un ensemble de documents PDF.
+Voici les extraits pertinents, chacun précédé de sa référence [document, page] :
+
+{context}
+
+Question : {question}
+
+Réponse en français, en citant les références [document, page] utilisées :
+"""
+
+CORPUS_DOCUMENT_PROMPT = "[{document}, p. {page}]\n{page_content}"
+
+# Portée du cache de réponses pour le mode corpus
+CORPUS_SCOPE = "corpus"
+
+
+def collection_name(vectorstore):
+    return vectorstore._collection.name
+
+
+class GenerationTrace(BaseCallbackHandler):
+    """
+    Callback LangChain qui découpe un appel de chaîne en deux étapes de la trace :
+    "prompt" (assemblage, taille du prompt) puis "generation" (tokens produits,
+    temps jusqu'au premier token). `on_prompt(caractères, tokens)` reçoit la
+    taille du prompt évalué par Ollama.
+    """
+
+    def __init__(self, trace, on_prompt=None):
+        self.trace = trace
+        self.on_prompt = on_prompt
+        self.prompt_chars = 0
+        self.started = time.perf_counter()
+        self.llm_started = None
+        self.first_token = None
+        self.tokens = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_started = time.perf_counter()
+        self.prompt_chars = sum(len(p) for p in prompts)
+        self.trace.record("prompt", self.llm_started - self.started, prompt_chars=self.prompt_chars)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens += 1
+
+    def on_llm_end(self, response, **kwargs):
+        if self.llm_started is None:
+            return
+        info = {}
+        if response.generations and response.generations[0]:
+            info = response.generations[0][0].generation_info or {}
+        attrs = {"tokens": info.get("eval_count") or self.tokens}
+        if info.get("prompt_eval_count") is not None:
+            attrs["prompt_tokens"] = info["prompt_eval_count"]
+            if self.on_prompt is not None:
+                self.on_prompt(self.prompt_chars, info["prompt_eval_count"])
+        if self.first_token is not None:
+            attrs["ttft_ms"] = round((self.first_token - self.llm_started) * 1000, 2)
+        self.trace.record("generation", time.perf_counter() - self.llm_started, **attrs)
+
+
+class PreparedQuestion:
+    """
+    Question sur un PDF dont les morceaux ont été retrouvés et le cache consulté.
+    `cached` vaut (réponse, "exact" | "semantic") ou None ; generate() appelle
+    le modèle sur ces mêmes morceaux et met la réponse en cache. `trace` mesure
+    la requête : elle est close par generate(), ou dès la préparation si la
+    réponse vient du cache.
+    """
+
+    def __init__(self, engine, qa_chain, scope, question, docs, ids, cached, trace=None, model=None,
+                 query=None):
+        self.engine = engine
+        self.model = model
+        self.query = query  # vecteur de la question, calculé au plus une fois (cache de réponses)
+        self.qa_chain = qa_chain
+        self.scope = scope
+        self.question = question
+        self.docs = docs
+        self.ids = ids
+        self.cached = cached
+        self.trace = trace or engine.tracer.trace("question")
+
+    def sources(self):
+        return sorted({(d.metadata.get("source"), d.metadata.get("page")) for d in self.docs},
+                      key=lambda s: (str(s[0]), s[1] or 0))
+
+    def citations(self):
+        """
+        Références "document, p. N" des extraits, dans l'ordre de pertinence, sans doublons.
+        """
+        return list(dict.fromkeys(citation(d) for d in self.docs))
+
+    def generate(self, callbacks=None):
+        def on_prompt(chars, tokens):
+            self.engine.context.observe(self.model, chars, tokens)
+        callbacks = list(callbacks or []) + [GenerationTrace(self.trace, on_prompt)]
+        try:
+            answer = self.qa_chain.combine_documents_chain.run(
+                input_documents=self.docs, question=self.question, callbacks=callbacks
+            )
+        except BaseException as e:
+            self.trace.finish(error=type(e).__name__)
+            raise
+        self.engine.answer_cache.store(self.scope, self.question, self.ids, answer, query=self.query)
+        self.trace.finish(answer_chars=len(answer))
+        return answer
+
+
+class RAGEngine:
+    """
+    Cœur ingestion / recherche / génération, sans interface : utilisé par
+    l'application Tk, la CLI (`python main.py ingest|ask|summarize`) et l'API HTTP.
+    Toutes les méthodes sont utilisables depuis plusieurs threads.
+    """
+
+    def __init__(self, persist_dir="chroma_db", embedding_model="nomic-embed-text", rerank=False,
+                 keep_alive="30m", tracer=None, quantize=None, memory_budget_mb=256, workers=None,
+                 ocr=None, context_tokens=1500):
+        self.persist_dir = persist_dir
+        if not os.path.exists(self.persist_dir):
+            os.mkdir(self.persist_dir)
+        data_dir = os.path.dirname(os.path.abspath(self.persist_dir))
+
+        # Registre des PDF déjà indexés (hash de contenu -> collection)
+        self.registry = DocumentRegistry(os.path.join(self.persist_dir, "registry.json"))
+
+        # Durée de chaque étape (extraction, embeddings, recherche, prompt, génération) :
+        # journal JSON, métriques Prometheus et dernière requête affichée par l'interface
+        self.tracer = tracer or Tracer()
+
+        # Clients LLM et chaînes partagés par (modèle, paramètres) ; modèles gardés
+        # chargés par Ollama `keep_alive` entre deux questions
+        self.models = ModelPool(keep_alive=keep_alive)
+
+        # Appels au modèle ordonnancés sur un pool borné à ce que sert Ollama
+        # (OLLAMA_NUM_PARALLEL) ; une réponse à la fois par onglet de l'interface
+        self.scheduler = RequestScheduler(workers=workers, lane_limits={"chat": 1, "pdf": 1})
+
+        # Client HTTP par lots (session keep-alive, requêtes concurrentes bornées),
+        # embeddings mis en cache sur disque à côté de chroma_db
+        self.embedding_model = embedding_model
+        self.embeddings = CachedEmbeddings(
+            OllamaEmbeddingClient(model=self.embedding_model, keep_alive=keep_alive),
+            self.embedding_model,
+            os.path.join(data_dir, "embedding_cache.sqlite3"),
+            tracer=self.tracer
+        )
+
+        # Résumés partiels mis en cache : un second résumé du même PDF est quasi instantané
+        self.summary_cache = SummaryCache(os.path.join(data_dir, "summary_cache.sqlite3"))
+
+        # Réponses aux questions PDF mises en cache (exactes + questions reformulées)
+        self.answer_cache = AnswerCache(
+            os.path.join(data_dir, "answer_cache.sqlite3"),
+            embeddings=self.embeddings
+        )
+
+        # Index BM25 tenu à jour pendant l'ingestion, fusionné avec la recherche vectorielle
+        self.lexical = LexicalIndex(os.path.join(self.persist_dir, "lexical_index.sqlite3"))
+        self.rerank = rerank
+
+        # Recherche vectorielle optionnelle sur une copie compacte (int8 / float16) des
+        # collections, en mémoire bornée, au lieu des index HNSW float32 de Chroma
+        self.vectors = None
+        if quantize:
+            self.vectors = QuantizedIndex(
+                os.path.join(self.persist_dir, f"vectors_{quantize}.sqlite3"),
+                mode=quantize,
+                memory_budget=memory_budget_mb << 20
+            )
+
+        # Texte des pages dans l'ordre de lecture (tableaux compris), mis en cache par
+        # (hash du contenu, page) ; OCR local des pages numérisées si `ocr` (langues Tesseract)
+        self.ocr = ocr
+        self.extraction_cache = ExtractionCache(os.path.join(data_dir, "extraction_cache.sqlite3"))
+
+        # Extraits du prompt bornés par la fenêtre de chaque modèle (lue via /api/show,
+        # mise en cache) et par `context_tokens`, pour un prefill prévisible
+        self.context = ModelContext(os.path.join(data_dir, "model_context.json"))
+        self.context_budget = ContextBudget(self.context, max_tokens=context_tokens)
+
+        # Découpage des pages en morceaux bornés en tokens avant embedding
+        self.chunker = TokenChunker(chunk_tokens=350, overlap_tokens=40)
+
+        # Recherche sur tous les PDF ingérés (collections interrogées en parallèle)
+        self.corpus = CorpusSearch(self.embeddings, self.open_collection, self.collections)
+
+        # Deux ingestions concurrentes du même fichier (CLI, API) sont sérialisées
+        self._ingest_locks = {}
+        self._lock = threading.Lock()
+
+    # ---- Ingestion
+    def open_collection(self, name):
+        return Chroma(
+            collection_name=name,
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_dir
+        )
+
+    def attach_existing(self, pdf_path):
+        """
+        Contenu déjà indexé : vectorstore de la collection persistée, sans embedding.
+        Appelé par le thread d'ingestion : une collection indexée avant l'index BM25
+        y est rattrapée, plutôt qu'à la création de la chaîne (thread Tk).
+        """
+        entry = self.registry.find(pdf_path)
+        if entry is None:
+            return None
+        vectorstore = self.open_collection(entry["collection"])
+        self.ensure_lexical(entry["collection"], vectorstore)
+        return vectorstore
+
+    def _ingestion_args(self, pdf_path, extract_pages):
+        args = (pdf_path, extract_pages or self.extract_pages, self.embeddings)
+        kwargs = dict(
+            store=self.registry.writer(pdf_path, self.persist_dir, self.lexical),
+            batch_size=64,
+            attach_existing=self.attach_existing,
+            split_document=self.chunker.split,
+            count_pages=safe_count_pages,
+        )
+        return args, kwargs
+
+    def extract_pages(self, pdf_path):
+        """
+        Pages du PDF, extraites ou relues depuis le cache. Les pages sans texte (ni
+        OCR) ne produisent aucun morceau ; leur nombre est ajouté à la trace active.
+        """
+        trace = self.tracer.current()
+        counts = {"empty_pages": 0, "ocr_pages": 0}
+        for page in iter_pages(pdf_path, ocr=self.ocr, cache=self.extraction_cache,
+                               content_hash=self.registry.content_hash(pdf_path)):
+            counts["empty_pages"] += bool(page.metadata.get("empty"))
+            counts["ocr_pages"] += bool(page.metadata.get("ocr"))
+            yield page
+        if trace is not None:
+            trace.attrs.update(counts)
+
+    def ingestion_job(self, pdf_path, extract_pages=None):
+        """
+        IngestionJob (thread de fond + file d'événements) pour l'interface.
+        """
+        args, kwargs = self._ingestion_args(pdf_path, extract_pages)
+        return IngestionJob(*args, trace=self.tracer.trace("ingest", path=pdf_path), **kwargs)
+
+    def ingest(self, pdf_path, report=None, cancel_event=None, extract_pages=None):
+        """
+        Ingestion synchrone. Retourne un dictionnaire décrivant le résultat :
+        `added` / `deleted` comptent les morceaux réellement ajoutés (embeddés) et
+        retirés, une réingestion ne touchant que ce qui a changé.
+        """
+        with self._lock:
+            lock = self._ingest_locks.setdefault(os.path.abspath(pdf_path), threading.Lock())
+        with lock:
+            args, kwargs = self._ingestion_args(pdf_path, extract_pages)
+            writer = kwargs["store"]
+            vectorstore, chunks, pages = run_ingestion(*args, report=report, cancel_event=cancel_event,
+                                                       trace=self.tracer.trace("ingest", path=pdf_path), **kwargs)
+        return {
+            "path": pdf_path,
+            "collection": collection_name(vectorstore),
+            "attached": chunks is None,
+            "chunks": chunks,
+            "added": writer.added,
+            "deleted": writer.deleted,
+            "pages": pages,
+            "vectorstore": vectorstore,
+        }
+
+    def collections(self):
+        return [entry["collection"] for entry in self.registry.entries()]
+
+    def drop_collection(self, name):
+        """
+        Supprime une collection de Chroma et des index dérivés (BM25, copie compacte, chaînes).
+        """
+        try:
+            self.open_collection(name).delete_collection()
+        except Exception:
+            pass  # déjà absente de Chroma : on nettoie quand même les index dérivés
+        self.lexical.drop(name)
+        if self.vectors is not None:
+            self.vectors.drop(name)
+        self.corpus.forget(name)
+        self.models.forget_chains(lambda key: name in key)
+
+    def vectorstore_for(self, pdf_path=None, collection=None):
+        """
+        Vectorstore d'un PDF (ingéré au besoin) ou d'une collection nommée.
+        """
+        if collection:
+            vectorstore = self.open_collection(collection)
+            self.ensure_lexical(collection, vectorstore)
+            return vectorstore
+        return self.ingest(pdf_path)["vectorstore"]
+
+    # ---- Génération
+    def warm_up(self, *models):
+        """
+        Précharge en arrière-plan le modèle d'embedding et les modèles de génération indiqués.
+        """
+        self.models.warm_up(self.embedding_model, kind="embed")
+        for model in models:
+            self.models.warm_up(model)
+            threading.Thread(target=self.context.window, args=(model,), daemon=True).start()
+
+    def chat_chain(self, model):
+        def build():
+            prompt = PromptTemplate(template=CHAT_PROMPT, input_variables=["context", "question"])
+            return LLMChain(llm=self.models.llm(model), prompt=prompt)
+        return self.models.chain(("chat", model), build)
+
+    def ensure_lexical(self, collection, vectorstore, page_size=500):
+        """
+        Indexe en BM25 une collection ingérée avant l'existence de l'index (une seule fois).
+        """
+        if self.lexical.count(collection):
+            return
+        offset = 0
+        while True:
+            batch = vectorstore.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            docs = [Document(page_content=text, metadata=meta or {})
+                    for text, meta in zip(batch["documents"], batch["metadatas"])]
+            self.lexical.add(collection, docs, batch["ids"])
+            if len(docs) < page_size:
+                break
+            offset += page_size
+
+    def ensure_quantized(self, collection, vectorstore=None, page_size=500):
+        """
+        Construit la copie compacte d'une collection, ou la reconstruit si le PDF a
+        été ré-ingéré depuis (date d'ingestion du registre).
+        """
+        entry = next((e for e in self.registry.entries() if e["collection"] == collection), None)
+        version = str(entry["ingested_at"]) if entry else None
+        if self.vectors.has(collection) and self.vectors.version(collection) == version:
+            return
+        vectorstore = vectorstore or self.open_collection(collection)
+        ids, vectors, texts, metadatas = [], [], [], []
+        offset = 0
+        while True:
+            batch = vectorstore.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            ids.extend(batch["ids"])
+            vectors.extend(batch["embeddings"])
+            texts.extend(batch["documents"])
+            metadatas.extend(batch["metadatas"])
+            if len(batch["ids"]) < page_size:
+                break
+            offset += page_size
+        self.vectors.build(collection, ids, vectors, texts, metadatas, version)
+
+    def _quantized_search(self, query, k, collections):
+        for name in collections:
+            self.ensure_quantized(name)
+        return self.vectors.search(self.embeddings.embed_query(query), k, collections)
+
+    def qa_chain(self, vectorstore, model, k=4):
+        """
+        RetrievalQA "stuff" sur les morceaux les mieux classés par la recherche
+        hybride (vecteurs + BM25 de la collection) : 2k candidats, dont
+        prepare_question ne garde que ce qui tient dans le budget de contexte.
+        Réutilisée par (collection, modèle, k).
+        """
+        name = collection_name(vectorstore)
+
+        def build():
+            if self.vectors is not None:
+                def vector_search(query, n):
+                    return self._quantized_search(query, n, [name])
+            else:
+                def vector_search(query, n):
+                    return vectorstore.similarity_search_with_score(query, k=n)
+            retriever = HybridRetriever(
+                vector_search=self._traced("vector_search", vector_search),
+                lexical_search=self._traced("lexical_search",
+                                            lambda query, n: self.lexical.search(query, n, collections=[name])),
+                k=2 * k,
+                rerank=self.rerank
+            )
+            prompt = PromptTemplate(template=PDF_QA_PROMPT, input_variables=["context", "question"])
+            return RetrievalQA.from_chain_type(
+                llm=self.models.llm(model),
+                retriever=retriever,
+                chain_type="stuff",
+                chain_type_kwargs={"prompt": prompt}
+            )
+        return self.models.chain(("qa", name, model, k), build)
+
+    def corpus_chain(self, model, k=4):
+        """
+        RetrievalQA "stuff" sur les meilleurs morceaux de l'ensemble des documents
+        (recherche hybride sur toutes les collections, 2k candidats avant le budget
+        de contexte). Réutilisée par (modèle, k).
+        """
+        for name in self.collections():
+            if not self.lexical.count(name):
+                self.ensure_lexical(name, self.open_collection(name))
+
+        def build():
+            if self.vectors is not None:
+                def vector_search(query, n):
+                    return [(with_document(doc), distance)
+                            for doc, distance in self._quantized_search(query, n, self.collections())]
+            else:
+                vector_search = self.corpus.search
+            retriever = HybridRetriever(
+                vector_search=self._traced("vector_search", vector_search),
+                lexical_search=self._traced("lexical_search", self._corpus_lexical_search),
+                k=2 * k,
+                rerank=self.rerank
+            )
+            prompt = PromptTemplate(template=CORPUS_QA_PROMPT, input_variables=["context", "question"])
+            document_prompt = PromptTemplate(template=CORPUS_DOCUMENT_PROMPT,
+                                             input_variables=["document", "page", "page_content"])
+            return RetrievalQA.from_chain_type(
+                llm=self.models.llm(model),
+                retriever=retriever,
+                chain_type="stuff",
+                chain_type_kwargs={"prompt": prompt, "document_prompt": document_prompt}
+            )
+        return self.models.chain(("corpus", model, k), build)
+
+    def _traced(self, stage, search):
+        def run(query, k):
+            with self.tracer.span(stage, k=k) as span:
+                results = search(query, k)
+                span["results"] = len(results)
+                return results
+        return run
+
+    def _corpus_lexical_search(self, query, k):
+        return [(with_document(doc), score)
+                for doc, score in self.lexical.search(query, k, collections=self.collections())]
+
+    def prepare_question(self, qa_chain, collection, model, question, prompt_template=PDF_QA_PROMPT):
+        """
+        Morceaux retrouvés, ramenés au budget de contexte du modèle, puis
+        consultation du cache, pour la collection `collection` (ou CORPUS_SCOPE
+        en mode corpus).
+        """
+        trace = self.tracer.trace("corpus_question" if collection == CORPUS_SCOPE else "question",
+                                  model=model, collection=collection, question_chars=len(question))
+        try:
+            with trace.activate():
+                with trace.span("retrieval") as span:
+                    docs = qa_chain.retriever.invoke(question)
+                    span["docs"] = len(docs)
+                with trace.span("context_budget") as span:
+                    document_prompt = CORPUS_DOCUMENT_PROMPT if prompt_template == CORPUS_QA_PROMPT else None
+                    docs, packing = self.context_budget.fit(model, docs, prompt_template, question,
+                                                            document_prompt)
+                    span.update(packing)
+                ids = document_ids(docs)
+                scope = answer_scope(collection, model, prompt_template)
+                query = self.answer_cache.query_vector(question)
+                with trace.span("answer_cache") as span:
+                    cached = self.answer_cache.lookup(scope, question, ids, query=query)
+                    span["hit"] = cached[1] if cached else None
+        except BaseException as e:
+            trace.finish(error=type(e).__name__)
+            raise
+        if cached:
+            trace.finish(cached=cached[1])
+        return PreparedQuestion(self, qa_chain, scope, question, docs, ids, cached, trace, model, query)
+
+    def ask(self, vectorstore, model, question):
+        return self._answer(self.prepare_question(
+            self.qa_chain(vectorstore, model), collection_name(vectorstore), model, question
+        ))
+
+    def ask_corpus(self, model, question, k=4):
+        return self._answer(self.prepare_question(
+            self.corpus_chain(model, k), CORPUS_SCOPE, model, question, CORPUS_QA_PROMPT
+        ))
+
+    def _answer(self, prepared):
+        if prepared.cached:
+            answer, cached = prepared.cached
+        else:
+            # Une question identique déjà en cours (autre client de l'API) est partagée
+            call = self.scheduler.submit("api", prepared.generate, QUESTION,
+                                         key=("answer", prepared.scope, prepared.question, tuple(prepared.ids)))
+            try:
+                answer, cached = call.result(), None
+            finally:
+                prepared.trace.finish(shared=True)  # sans effet si generate() l'a close
+        return {
+            "question": prepared.question,
+            "answer": answer,
+            "cached": cached,
+            "sources": [{"source": s, "page": p} for s, p in prepared.sources()],
+            "citations": prepared.citations(),
+        }
+
+    def summarize(self, vectorstore, model, stop_event=None):
+        """
+        Résumé map-reduce ; chaque appel au modèle passe par l'ordonnanceur en
+        priorité basse, derrière les questions. `stop_event` interrompt le résumé
+        entre deux appels.
+        """
+        llm = self.models.llm(model)
+
+        def run_llm(prompt):
+            if stop_event is not None and stop_event.is_set():
+                raise GenerationStopped()
+            call = self.scheduler.submit("summary", lambda callbacks: llm.invoke(prompt), BACKGROUND,
+                                         key=("summary", model, prompt))
+            while stop_event is not None:
+                try:
+                    return call.result(timeout=0.2)
+                except TimeoutError:
+                    if stop_event.is_set():
+                        self.scheduler.cancel(call)
+                        break
+            return call.result()
+
+        engine = SummaryEngine(llm, model, self.summary_cache, run_llm=run_llm)
+        trace = self.tracer.trace("summarize", model=model)
+        try:
+            with trace.activate(), trace.span("map_reduce"):
+                summary = engine.summarize(vectorstore)
+        except BaseException as e:
+            trace.finish(error=type(e).__name__)
+            raise
+        trace.finish(summary_chars=len(summary))
+        return summary
+
+
+def safe_count_pages(pdf_path):
+    try:
+        return count_pages(pdf_path)
+    except Exception:
+        return None
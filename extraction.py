@@ -0,0 +1,276 @@
+import collections
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from langchain.docstore.document import Document
+
+from registry import hash_file
+
+# Version de l'extraction : un changement invalide le cache des pages extraites
+EXTRACTION_VERSION = "layout-1"
+# Texte des blocs, sans les images (get_text("dict") les inclurait en binaire)
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Sans cela, find_tables() conseille un paquet optionnel sur stdout (sortie JSON de la CLI)
+getattr(fitz, "no_recommend_layout", lambda: None)()
+
+
+# -------------------------------
+# Extraction du texte des PDF : ordre de lecture, tableaux, OCR des pages numérisées
+# -------------------------------
+def count_pages(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _block_text(block):
+    lines = ("".join(span["text"] for span in line["spans"]).rstrip() for line in block["lines"])
+    return "\n".join(line for line in lines if line.strip())
+
+
+def _tables(page):
+    """
+    [(bbox, texte)] des tableaux détectés : une ligne par rangée, cellules séparées
+    par " | " (au lieu de cellules lues colonne par colonne et mélangées). Seules
+    les pages comportant des tracés (bordures) sont analysées : find_tables()
+    coûte plusieurs dizaines de ms par page, contre moins d'une pour l'extraction.
+    """
+    try:
+        if len(page.get_cdrawings()) < 4:
+            return []
+        found = page.find_tables().tables
+    except Exception:
+        return []  # page que la détection de tableaux ne sait pas analyser
+    tables = []
+    for table in found:
+        rows = [[" ".join((cell or "").split()) for cell in row] for row in table.extract()]
+        rows = [row for row in rows if any(row)]
+        if len(rows) < 2 or max(len(row) for row in rows) < 2:
+            continue  # simple cadre autour d'un paragraphe
+        tables.append((fitz.Rect(table.bbox), "\n".join(" | ".join(row) for row in rows)))
+    return tables
+
+
+def reading_order(items, width):
+    """
+    Range les blocs (bbox, texte, nombre de lignes) dans l'ordre de lecture : de haut
+    en bas, les blocs pleine largeur (titres, tableaux) séparant des bandes ; dans une
+    bande où les deux moitiés contiennent des paragraphes, la colonne de gauche est lue
+    avant celle de droite, sinon ligne par ligne (formulaires, libellé / valeur).
+    """
+    ordered = []
+    band = []
+
+    def flush():
+        left = [item for item in band if (item[0].x0 + item[0].x1) / 2 < width / 2]
+        right = [item for item in band if item not in left]
+        columns = any(item[2] >= 3 for item in left) and any(item[2] >= 3 for item in right)
+        if columns:
+            ordered.extend(sorted(left, key=lambda item: item[0].y0))
+            ordered.extend(sorted(right, key=lambda item: item[0].y0))
+        else:
+            ordered.extend(sorted(band, key=lambda item: (round(item[0].y0 / 4), item[0].x0)))
+        band.clear()
+
+    for item in sorted(items, key=lambda item: (item[0].y0, item[0].x0)):
+        if item[0].width > width * 0.55:
+            flush()
+            ordered.append(item)
+        else:
+            band.append(item)
+    flush()
+    return ordered
+
+
+def layout_text(page, textpage=None, tables=True):
+    """
+    Texte d'une page à partir de ses blocs (get_text("dict")), dans l'ordre de
+    lecture ; les tableaux sont rendus rangée par rangée à leur place.
+    """
+    found = _tables(page) if tables else []
+    items = [(bbox, text, len(text.splitlines())) for bbox, text in found]
+    for block in page.get_text("dict", flags=TEXT_FLAGS, textpage=textpage)["blocks"]:
+        if block.get("type") != 0:
+            continue
+        bbox = fitz.Rect(block["bbox"])
+        center = fitz.Point((bbox.x0 + bbox.x1) / 2, (bbox.y0 + bbox.y1) / 2)
+        if any(center in table for table, _ in found):
+            continue  # déjà dans le texte du tableau
+        text = _block_text(block)
+        if text:
+            items.append((bbox, text, len(block["lines"])))
+    return "\n\n".join(text for _, text, _ in reading_order(items, page.rect.width))
+
+
+def extract_page(page, ocr=None, dpi=200):
+    """
+    (texte, indicateurs) d'une page. Une page sans texte mais avec des images est
+    passée à l'OCR local (Tesseract, langues `ocr`, ex. "fra+eng") si demandé ;
+    indicateurs : "ocr" (texte issu de l'OCR), "ocr_failed" (Tesseract absent ou
+    en échec), "empty" (aucun texte : la page ne produira aucun morceau).
+    """
+    text = layout_text(page)
+    flags = {}
+    if not text.strip():
+        text = ""
+        if ocr and page.get_images():
+            try:
+                textpage = page.get_textpage_ocr(language=ocr, dpi=dpi, full=True)
+                text = layout_text(page, textpage=textpage, tables=False).strip()
+                flags["ocr"] = True
+            except Exception:
+                flags["ocr_failed"] = True
+        if not text:
+            flags["empty"] = True
+    return text, flags
+
+
+def extract_page_range(pdf_path, start, end, ocr=None):
+    """
+    (texte, indicateurs) des pages [start, end). Exécuté dans un processus du
+    pool : chaque worker ouvre son propre handle fitz.
+    """
+    with fitz.open(pdf_path) as doc:
+        return [extract_page(doc[i], ocr) for i in range(start, end)]
+
+
+def extraction_settings(ocr=None):
+    return f"{EXTRACTION_VERSION}|ocr={ocr or ''}"
+
+
+class ExtractionCache:
+    """
+    Cache SQLite du texte extrait, clé = (hash du contenu, réglages d'extraction,
+    page) : un PDF déjà lu n'est jamais réextrait, même sous un autre nom.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "content_hash TEXT NOT NULL, settings TEXT NOT NULL, page INTEGER NOT NULL, "
+            "text TEXT NOT NULL, flags TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (content_hash, settings, page))"
+        )
+        self._conn.commit()
+
+    def get_range(self, content_hash, settings, start, end):
+        """
+        {index de page: (texte, indicateurs)} des pages [start, end) en cache.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, text, flags FROM pages WHERE content_hash = ? AND settings = ? "
+                "AND page >= ? AND page < ?", (content_hash, settings, start, end)
+            ).fetchall()
+        return {page: (text, json.loads(flags)) for page, text, flags in rows}
+
+    def put_many(self, content_hash, settings, pages):
+        """
+        `pages` : {index de page: (texte, indicateurs)}.
+        """
+        if not pages:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (content_hash, settings, page, text, flags, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(content_hash, settings, page, text, json.dumps(flags), now)
+                 for page, (text, flags) in pages.items()]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _page_document(pdf_path, index, text, flags=None):
+    return Document(page_content=text, metadata={"source": pdf_path, "page": index + 1, **(flags or {})})
+
+
+def iter_pages(pdf_path, workers=None, pages_per_task=16, parallel_threshold=64, ocr=None,
+               cache=None, content_hash=None):
+    """
+    Génère les pages du PDF (une Document par page, dans l'ordre), par plages
+    de `pages_per_task` pages. Au-delà de `parallel_threshold` pages,
+    l'extraction est répartie sur un pool de processus ; au plus deux plages
+    par worker sont en vol, si bien que la mémoire reste bornée quelle que soit
+    la taille du document et que le consommateur (embeddings) travaille pendant
+    que les pages suivantes sont extraites.
+    Avec `cache` (ExtractionCache), les pages déjà extraites de ce contenu
+    (`content_hash`, calculé au besoin) sont relues depuis le cache et les
+    autres y sont ajoutées. Les indicateurs de extract_page() (empty, ocr...)
+    sont ajoutés aux métadonnées.
+    """
+    total = count_pages(pdf_path)
+    workers = workers or min(4, os.cpu_count() or 1)
+    settings = extraction_settings(ocr)
+    if cache is not None and content_hash is None:
+        content_hash = hash_file(pdf_path)
+
+    def cached(start, end):
+        return cache.get_range(content_hash, settings, start, end) if cache is not None else {}
+
+    def store(start, results, known):
+        # Une page dont l'OCR a échoué (Tesseract absent...) n'est pas gardée : elle sera retentée
+        if cache is not None:
+            cache.put_many(content_hash, settings,
+                           {start + i: r for i, r in enumerate(results)
+                            if start + i not in known and not r[1].get("ocr_failed")})
+
+    ranges = [(s, min(s + pages_per_task, total)) for s in range(0, total, pages_per_task)]
+
+    if workers <= 1 or total < parallel_threshold:
+        with fitz.open(pdf_path) as doc:
+            for start, end in ranges:
+                known = cached(start, end)
+                results = [known.get(i) or extract_page(doc[i], ocr) for i in range(start, end)]
+                store(start, results, known)
+                for offset, (text, flags) in enumerate(results):
+                    yield _page_document(pdf_path, start + offset, text, flags)
+        return
+
+    ranges = iter(ranges)
+    pool = None
+    try:
+        pending = collections.deque()
+
+        def submit_next():
+            nonlocal pool
+            page_range = next(ranges, None)
+            if page_range is None:
+                return
+            start, end = page_range
+            known = cached(start, end)
+            if len(known) == end - start:
+                pending.append((start, None, [known[i] for i in range(start, end)], known))
+                return
+            if pool is None:
+                # "spawn" : on ne duplique pas par fork un processus qui fait tourner Tk et des threads
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            pending.append((start, pool.submit(extract_page_range, pdf_path, start, end, ocr), None, known))
+
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            start, future, results, known = pending.popleft()
+            if future is not None:
+                results = future.result()
+                store(start, results, known)
+            submit_next()
+            for offset, (text, flags) in enumerate(results):
+                yield _page_document(pdf_path, start + offset, text, flags)
+    finally:
+        # Générateur abandonné (annulation) : on n'attend pas les plages restantes
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
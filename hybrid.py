@@ -0,0 +1,78 @@
+from typing import Any
+
+from langchain_core.retrievers import BaseRetriever
+
+from lexical import tokenize
+from registry import document_ids
+
+
+# -------------------------------
+# Recherche hybride : BM25 (termes exacts, références) + vecteurs (sens)
+# -------------------------------
+def chunk_key(doc):
+    """
+    Identité d'un morceau, identique quelle que soit la recherche qui l'a trouvé.
+    """
+    return document_ids([doc])[0]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fusionne des classements (listes de documents, du meilleur au moins bon) :
+    score = somme des 1 / (k + rang). Retourne [(document, score)] par score décroissant.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    return sorted(((docs[key], score) for key, score in scores.items()), key=lambda item: -item[1])
+
+
+def _term_weight(term):
+    # Les termes avec des chiffres (références, codes d'erreur) comptent double
+    return 2.0 if any(ch.isdigit() for ch in term) else 1.0
+
+
+def coverage_rerank(query, candidates):
+    """
+    Reclassement léger, sans modèle : score de fusion normalisé + part (pondérée)
+    des termes de la question présents dans le morceau.
+    """
+    terms = set(tokenize(query))
+    if not terms or not candidates:
+        return candidates
+    total = sum(_term_weight(t) for t in terms)
+    top = candidates[0][1] or 1.0
+
+    def score(item):
+        doc, fused = item
+        present = terms & set(tokenize(doc.page_content))
+        return fused / top + sum(_term_weight(t) for t in present) / total
+
+    return sorted(candidates, key=score, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever LangChain : `candidates` résultats vectoriels et `candidates`
+    résultats BM25 sont fusionnés par rang (RRF), éventuellement reclassés,
+    et seuls les `k` meilleurs sont passés au prompt.
+    vector_search(query, k) -> [(doc, distance)] ; lexical_search(query, k) -> [(doc, score)].
+    """
+
+    vector_search: Any
+    lexical_search: Any
+    k: int = 4
+    candidates: int = 20
+    rerank: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        vector = [doc for doc, _ in self.vector_search(query, self.candidates)]
+        lexical = [doc for doc, _ in self.lexical_search(query, self.candidates)]
+        fused = reciprocal_rank_fusion([vector, lexical])
+        if self.rerank:
+            fused = coverage_rerank(query, fused)
+        return [doc for doc, _ in fused[:self.k]]
@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+from contextlib import nullcontext
+
+
+# -------------------------------
+# Pipeline d'ingestion exécuté hors du thread Tk
+# -------------------------------
+class IngestionCancelled(Exception):
+    """
+    Levée lorsque l'utilisateur annule une ingestion en cours.
+    """
+
+
+def run_ingestion(pdf_path, extract_pages, embeddings, store,
+                  report=None, cancel_event=None, batch_size=16, attach_existing=None,
+                  split_document=None, count_pages=None, trace=None):
+    """
+    Ingestion synchrone d'un PDF, en flux : les pages produites par `extract_pages`
+    sont découpées par `split_document` (page -> liste de morceaux) puis écrites par
+    lots de `batch_size` via `store.add(docs, embeddings)` au fur et à mesure, si bien
+    que seuls les morceaux d'un lot sont gardés en mémoire. `store.finish(pages)`
+    retourne le vectorstore final ; `store.abort()` est appelé en cas d'échec.
+
+    `report` reçoit des dictionnaires de progression ; `cancel_event` permet d'interrompre
+    le travail entre deux pages ou deux lots (IngestionCancelled est alors levée).
+    Si `attach_existing` retourne un vectorstore, le PDF est déjà indexé : ni extraction
+    ni embedding n'ont lieu et le nombre de morceaux retourné vaut None.
+    Retourne (vectorstore, nombre de morceaux, nombre de pages).
+
+    `trace` (tracing.Trace) reçoit les étapes "extract" (temps cumulé d'extraction),
+    "store" (écriture de chaque lot) et les embeddings calculés, puis est close.
+    """
+    if trace is None:
+        return _run_ingestion(pdf_path, extract_pages, embeddings, store, report, cancel_event, batch_size,
+                              attach_existing, split_document, count_pages, None)
+    with trace.activate():
+        try:
+            vectorstore, embedded, pages = _run_ingestion(
+                pdf_path, extract_pages, embeddings, store, report, cancel_event, batch_size,
+                attach_existing, split_document, count_pages, trace
+            )
+        except BaseException as e:
+            trace.finish(error=type(e).__name__)
+            raise
+    trace.finish(pages=pages, chunks=embedded, attached=embedded is None)
+    return vectorstore, embedded, pages
+
+
+def _run_ingestion(pdf_path, extract_pages, embeddings, store, report, cancel_event, batch_size,
+                   attach_existing, split_document, count_pages, trace):
+    report = report or (lambda event: None)
+    cancel_event = cancel_event or threading.Event()
+
+    if attach_existing is not None:
+        vectorstore = attach_existing(pdf_path)
+        if vectorstore is not None:
+            return vectorstore, None, None
+
+    total_pages = count_pages(pdf_path) if count_pages else None
+    start = time.monotonic()
+    pages = 0
+    embedded = 0
+    batch = []
+
+    def progress():
+        eta = None
+        if total_pages and pages:
+            eta = (time.monotonic() - start) / pages * (total_pages - pages)
+        report({"type": "progress", "pages": pages, "total_pages": total_pages,
+                "chunks": embedded, "eta": eta})
+
+    def flush(docs):
+        nonlocal embedded
+        if cancel_event.is_set():
+            raise IngestionCancelled()
+        with trace.span("store", chunks=len(docs)) if trace else nullcontext():
+            store.add(docs, embeddings)
+        embedded += len(docs)
+
+    try:
+        page_iter = extract_pages(pdf_path)
+        if trace:
+            page_iter = trace.iterate("extract", page_iter)
+        for page in page_iter:
+            if cancel_event.is_set():
+                raise IngestionCancelled()
+            pages += 1
+            batch.extend(split_document(page) if split_document else [page])
+            while len(batch) >= batch_size:
+                flush(batch[:batch_size])
+                batch = batch[batch_size:]
+            progress()
+        if batch:
+            flush(batch)
+            progress()
+        if not embedded:
+            raise ValueError("aucun texte exploitable dans ce PDF")
+        vectorstore = store.finish(pages)
+    except BaseException:
+        store.abort()
+        raise
+    return vectorstore, embedded, pages
+
+
+class IngestionJob:
+    """
+    Exécute run_ingestion dans un thread de fond. Les événements (progression,
+    fin, erreur, annulation) sont déposés dans `self.events`, une file thread-safe
+    que l'interface Tk relève via after().
+    """
+
+    def __init__(self, pdf_path, extract_pages, embeddings, store, batch_size=16,
+                 attach_existing=None, split_document=None, count_pages=None, trace=None):
+        self.pdf_path = pdf_path
+        self.extract_pages = extract_pages
+        self.embeddings = embeddings
+        self.store = store
+        self.batch_size = batch_size
+        self.attach_existing = attach_existing
+        self.split_document = split_document
+        self.count_pages = count_pages
+        self.trace = trace
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def _run(self):
+        try:
+            vectorstore, chunks, pages = run_ingestion(
+                self.pdf_path,
+                self.extract_pages,
+                self.embeddings,
+                self.store,
+                report=self.events.put,
+                cancel_event=self.cancel_event,
+                batch_size=self.batch_size,
+                attach_existing=self.attach_existing,
+                split_document=self.split_document,
+                count_pages=self.count_pages,
+                trace=self.trace,
+            )
+        except IngestionCancelled:
+            self.events.put({"type": "cancelled"})
+        except Exception as e:
+            self.events.put({"type": "error", "error": e})
+        else:
+            self.events.put({"type": "done", "vectorstore": vectorstore, "chunks": chunks, "pages": pages})
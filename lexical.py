@@ -0,0 +1,163 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from langchain.docstore.document import Document
+
+
+# -------------------------------
+# Index inversé BM25 sur disque, tenu à jour pendant l'ingestion
+# -------------------------------
+# Mots, nombres et références techniques d'un seul tenant : "AB-1234/5", "E0x42", "v2.3.1"
+TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+SPLIT_RE = re.compile(r"[-./]")
+
+
+def tokenize(text):
+    """
+    Termes indexés : minuscules ; une référence composée est gardée entière
+    et ses parties sont aussi indexées ("ab-1234" -> "ab-1234", "ab", "1234").
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = [p for p in SPLIT_RE.split(token) if p]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class LexicalIndex:
+    """
+    Index inversé SQLite (terme -> morceaux, fréquence) par collection, avec
+    recherche BM25. Les ajouts ignorent les morceaux déjà indexés (identifiants
+    déterministes), ce qui rend la ré-ingestion incrémentale.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "collection TEXT NOT NULL, id TEXT NOT NULL, length INTEGER NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL, PRIMARY KEY (collection, id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "collection TEXT NOT NULL, term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (collection, term, id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_term ON postings(term)")
+        self._conn.commit()
+
+    def add(self, collection, docs, ids):
+        """
+        Indexe les morceaux absents de la collection. Retourne le nombre ajouté.
+        """
+        added = 0
+        with self._lock:
+            for doc, chunk_id in zip(docs, ids):
+                terms = Counter(tokenize(doc.page_content))
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks (collection, id, length, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (collection, chunk_id, sum(terms.values()), doc.page_content,
+                     json.dumps(doc.metadata, ensure_ascii=False))
+                )
+                if not cursor.rowcount:
+                    continue
+                self._conn.executemany(
+                    "INSERT INTO postings (collection, term, id, tf) VALUES (?, ?, ?, ?)",
+                    [(collection, term, chunk_id, tf) for term, tf in terms.items()]
+                )
+                added += 1
+            self._conn.commit()
+        return added
+
+    def remove(self, collection, ids):
+        with self._lock:
+            for chunk_id in ids:
+                self._conn.execute("DELETE FROM chunks WHERE collection = ? AND id = ?", (collection, chunk_id))
+                self._conn.execute("DELETE FROM postings WHERE collection = ? AND id = ?", (collection, chunk_id))
+            self._conn.commit()
+
+    def drop(self, collection):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM postings WHERE collection = ?", (collection,))
+            self._conn.commit()
+
+    def count(self, collection):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+
+    def collections(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT collection FROM chunks")]
+
+    def vacuum(self):
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    def search(self, query, k=20, collections=None):
+        """
+        Retourne [(document, score BM25)] par score décroissant, sur les
+        collections indiquées (toutes si None). Les statistiques (nombre de
+        morceaux, longueur moyenne, fréquence documentaire) portent sur ces collections.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        where, params = self._scope(collections, "collection")
+        p_where, _ = self._scope(collections, "p.collection")
+        with self._lock:
+            n, total = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE {where}", params
+            ).fetchone()
+            if not n:
+                return []
+            marks = ",".join("?" * len(terms))
+            rows = self._conn.execute(
+                f"SELECT p.collection, p.id, p.term, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.collection = p.collection AND c.id = p.id "
+                f"WHERE p.term IN ({marks}) AND {p_where}",
+                (*terms, *params)
+            ).fetchall()
+
+        avg_length = total / n
+        df = Counter(term for _, _, term, _, _ in rows)
+        scores = Counter()
+        for collection, chunk_id, term, tf, length in rows:
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[(collection, chunk_id)] += idf * tf * (self.k1 + 1) / norm
+        best = scores.most_common(k)
+        return [(self._document(collection, chunk_id), score) for (collection, chunk_id), score in best]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _scope(collections, column):
+        if collections is None:
+            return "1 = 1", ()
+        collections = list(collections)
+        if not collections:
+            return "0 = 1", ()
+        return f"{column} IN ({','.join('?' * len(collections))})", tuple(collections)
+
+    def _document(self, collection, chunk_id):
+        with self._lock:
+            text, metadata = self._conn.execute(
+                "SELECT text, metadata FROM chunks WHERE collection = ? AND id = ?", (collection, chunk_id)
+            ).fetchone()
+        metadata = json.loads(metadata)
+        metadata["collection"] = collection
+        return Document(page_content=text, metadata=metadata)
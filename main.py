@@ -1,62 +1,65 @@
+import time
+
+_STARTED_AT = time.perf_counter()
+
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
-import subprocess
-import fitz  # PyMuPDF
-import os
+import queue
+from collections import deque
+
+# Modules légers uniquement : LangChain, Chroma et PyMuPDF sont chargés par le
+# moteur, dans un thread de fond, une fois la fenêtre affichée
+from model_discovery import ModelDiscovery, get_ollama_models
+from startup import LazyValue, WINDOW_TARGET
+from tracing import format_trace
+
+
+def _build_engine(persist_dir, warm_models=()):
+    from engine import RAGEngine
+    engine = RAGEngine(persist_dir)
+    # Modèles chargés par Ollama pendant que l'utilisateur prend en main la fenêtre
+    engine.warm_up(*warm_models)
+    return engine
 
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.schema import HumanMessage
-from langchain.docstore.document import Document
-
-# Ollama (LLM & Embeddings)
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-
-# Import supplémentaire pour construire la chaîne de chat
-from langchain.chains import LLMChain
-
-# -------------------------------
-# Fonction pour lister les modèles Ollama
-# -------------------------------
-def get_ollama_models():
-    try:
-        result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            models = []
-            for line in lines:
-                if not line.strip():
-                    continue
-                parts = line.split()
-                model_name = parts[0]
-                models.append(model_name)
-            return models
-        else:
-            return []
-    except FileNotFoundError:
-        print("Erreur : la commande 'ollama' n'est pas trouvée.")
-        return []
 
 class PDFChatApplication:
     def __init__(self, master):
         self.master = master
         self.master.title("Ollama Chatbot + Analyse PDF")
 
-        # Liste des modèles Ollama
-        self.models = get_ollama_models()
-
-        # Embeddings
-        self.embeddings = OllamaEmbeddings(model="nomic-embed-text") 
-
+        # Ingestion, caches et chaînes : le moteur est partagé avec la CLI et l'API HTTP.
+        # Construit en arrière-plan après l'affichage ; self.engine attend sa fin si besoin.
         self.chroma_persist_dir = "chroma_db"
-        if not os.path.exists(self.chroma_persist_dir):
-            os.mkdir(self.chroma_persist_dir)
+        self._warm_models = ()
+        self._engine = LazyValue(lambda: _build_engine(self.chroma_persist_dir, self._warm_models))
+        self._chat_memory = None
+
+        # Liste des modèles Ollama : dernière liste connue, rafraîchie en arrière-plan
+        self.model_discovery = ModelDiscovery(
+            os.path.join(os.path.dirname(os.path.abspath(self.chroma_persist_dir)), "ollama_models.json")
+        )
+        self.models = self.model_discovery.cached()
 
         self.vectorstore = None
+        self.ingestion_job = None  # Ingestion en cours dans un thread de fond
+        self.watcher = None  # Dossier surveillé : PDF ajoutés / modifiés / supprimés ingérés au fil de l'eau
         self.chat_chain = None  # Sera une LLMChain pour le chat général
         self.qa_chain = None    # Sera un RetrievalQA pour le PDF
 
+        # Questions PDF posées à tous les documents ingérés plutôt qu'au dernier chargé
+        self.corpus_var = tk.BooleanVar(value=False)
+
+        # Réponses de chaque zone ("chat" / "pdf") dans l'ordre des demandes : la
+        # première s'affiche (en flux si activé), les suivantes attendent leur tour
+        # dans l'ordonnanceur du moteur
+        self.streaming_var = tk.BooleanVar(value=True)
+        self.streams = {}
+        self.stop_buttons = {}
+        self.queue_vars = {}
+        self.summary_call = None  # Résumé en cours (ses appels au modèle passent par l'ordonnanceur)
+
         self.chat_model_var = tk.StringVar()
         self.pdf_model_var = tk.StringVar()
         
@@ -81,6 +84,63 @@ class PDFChatApplication:
         self.notebook.add(self.pdf_frame, text="Analyse PDF")
         self._build_pdf_ui(self.pdf_frame)
 
+        # Après le premier affichage : chargement du moteur et découverte des modèles
+        self.master.after_idle(self._start_background_loading)
+        self.master.after(500, self._poll_queue_status)
+
+    @property
+    def engine(self):
+        return self._engine.get()
+
+    @property
+    def registry(self):
+        return self.engine.registry
+
+    @property
+    def embeddings(self):
+        return self.engine.embeddings
+
+    @property
+    def chat_memory(self):
+        # Mémoire du chat bornée en tokens : derniers échanges + résumé glissant + rappel
+        if self._chat_memory is None:
+            from memory import ConversationMemory
+            self._chat_memory = ConversationMemory(
+                self._summarize_conversation,
+                token_budget=1500,
+                embeddings=self.embeddings
+            )
+        return self._chat_memory
+
+    def _start_background_loading(self):
+        self._warm_models = tuple(dict.fromkeys(
+            m for m in (self.chat_model_var.get(), self.pdf_model_var.get()) if m in self.models
+        ))
+        self._engine.start()
+        self.model_discovery.start()
+        self.master.after(100, self._poll_models)
+
+    def _poll_models(self):
+        try:
+            event = self.model_discovery.events.get_nowait()
+        except queue.Empty:
+            if self.model_discovery.expired():
+                # Ollama ne répond pas à temps : on garde la dernière liste connue
+                # (une réponse tardive mettra quand même le cache à jour)
+                return
+            self.master.after(100, self._poll_models)
+            return
+        if event["type"] == "models":
+            self._set_models(event["models"])
+
+    def _set_models(self, models):
+        self.models = models
+        self.chat_model_combo.config(values=models)
+        self.pdf_model_combo.config(values=models)
+        for var in (self.chat_model_var, self.pdf_model_var):
+            if var.get() not in models:
+                var.set(models[0] if models else "Aucun modèle trouvé")
+
     def _build_chat_ui(self, parent):
         # Zone de conversation
         self.conversation_area = scrolledtext.ScrolledText(parent, wrap=tk.WORD)
@@ -95,13 +155,13 @@ class PDFChatApplication:
         model_frame = tk.Frame(parent)
         model_frame.pack(pady=5)
 
-        chat_model_combo = ttk.Combobox(
+        self.chat_model_combo = ttk.Combobox(
             model_frame, 
             textvariable=self.chat_model_var,
             values=self.models,
             state="readonly"
         )
-        chat_model_combo.pack(side=tk.LEFT)
+        self.chat_model_combo.pack(side=tk.LEFT)
 
         use_model_button = tk.Button(
             model_frame, 
@@ -110,9 +170,24 @@ class PDFChatApplication:
         )
         use_model_button.pack(side=tk.LEFT, padx=5)
 
-        # Bouton d'envoi de message
-        send_button = tk.Button(parent, text="Envoyer", command=self.send_message)
-        send_button.pack(pady=5)
+        streaming_check = ttk.Checkbutton(model_frame, text="Réponse en flux", variable=self.streaming_var)
+        streaming_check.pack(side=tk.LEFT, padx=5)
+
+        # Boutons d'envoi de message / d'arrêt de la génération
+        buttons_frame = tk.Frame(parent)
+        buttons_frame.pack(pady=5)
+
+        send_button = tk.Button(buttons_frame, text="Envoyer", command=self.send_message)
+        send_button.pack(side=tk.LEFT, padx=5)
+
+        self.stop_buttons["chat"] = tk.Button(buttons_frame, text="Arrêter la génération",
+                                              command=lambda: self.stop_generation("chat"),
+                                              state=tk.DISABLED)
+        self.stop_buttons["chat"].pack(side=tk.LEFT, padx=5)
+
+        # File d'attente des appels au modèle de l'onglet
+        self.queue_vars["chat"] = tk.StringVar(value="")
+        ttk.Label(parent, textvariable=self.queue_vars["chat"]).pack(pady=2)
 
     def update_chat_model(self):
         """
@@ -123,25 +198,22 @@ class PDFChatApplication:
             self._append_chat_message("Aucun modèle Ollama disponible.", area="chat")
             return
 
-        # PromptTemplate pour gérer le "context" et la "question"
-        chat_prompt_template = """{context}
-Question utilisateur : {question}
-Réponds en français en tenant compte du contexte ci-dessus :
-"""
-
-        prompt = PromptTemplate(
-            template=chat_prompt_template,
-            input_variables=["context", "question"]
-        )
-
-        # Construction de la LLMChain
-        self.chat_chain = LLMChain(
-            llm=OllamaLLM(model=selected_model),
-            prompt=prompt
-        )
+        # LLMChain avec un PromptTemplate "context" (mémoire) + "question", réutilisée
+        # par modèle ; le modèle est préchargé pour que la première réponse soit rapide
+        self.chat_chain = self.engine.chat_chain(selected_model)
+        self.engine.models.warm_up(selected_model)
 
         self._append_chat_message(f"[INFO] Modèle de chat sélectionné : {selected_model}", area="chat")
 
+    def _summarize_conversation(self, prompt):
+        """
+        Résumé glissant de la conversation, avec le modèle de chat courant, en
+        priorité basse (appelé depuis le thread de compression de la mémoire).
+        """
+        from scheduler import BACKGROUND
+        llm = self.chat_chain.llm
+        return self.engine.scheduler.submit("memory", lambda callbacks: llm.invoke(prompt), BACKGROUND).result()
+
     def send_message(self):
         """
         Gestion du message utilisateur pour le chat général.
@@ -154,26 +226,24 @@ Réponds en français en tenant compte du contexte ci-dessus :
         if not user_input:
             return
 
-        # On affiche le message de l'utilisateur
-        self._append_chat_message(f"**User**: {user_input}", area="chat")
-
-        # Préparation des variables à passer au prompt
-        final_inputs = {
-            "context": "",
-            "question": user_input
-        }
-
-        # Envoi au LLM via la LLMChain
-        try:
-            result = self.chat_chain.run(final_inputs)
-        except Exception as e:
-            result = f"Erreur lors de l'appel au modèle: {e}"
-
-        # On affiche la réponse
-        self._append_chat_message(f"**Bot**: {result}\n", area="chat")
-
-        # Reset de la zone de saisie
-        self.user_entry.delete("1.0", tk.END)
+        # Appel confié à l'ordonnanceur, en priorité interactive. Le contexte (borné
+        # par la mémoire) est construit au démarrage de l'appel, après la réponse précédente.
+        from scheduler import INTERACTIVE
+        chain = self.chat_chain
+        memory = self.chat_memory
+
+        def run(callbacks):
+            inputs = {"context": memory.build_context(user_input), "question": user_input}
+            answer = chain.run(inputs, callbacks=callbacks)
+            memory.add_turn(user_input, answer)
+            return answer
+
+        call = self._submit("chat", run, INTERACTIVE, key=("chat", id(chain), user_input))
+        if call:
+            # Reset de la zone de saisie
+            self.user_entry.delete("1.0", tk.END)
+            self._start_stream("chat", f"**User**: {user_input}\n**Bot**: ", call,
+                               error_prefix="Erreur lors de l'appel au modèle: ", suffix="\n\n")
 
     # -------------------------------
     # Onglet PDF
@@ -194,6 +264,34 @@ Réponds en français en tenant compte du contexte ci-dessus :
         pdf_use_button = tk.Button(control_frame, text="Utiliser ce modèle", command=self.update_pdf_model)
         pdf_use_button.pack(side=tk.LEFT, padx=5)
 
+        corpus_check = ttk.Checkbutton(control_frame, text="Tout le corpus", variable=self.corpus_var)
+        corpus_check.pack(side=tk.LEFT, padx=5)
+
+        self.watch_button = tk.Button(control_frame, text="Surveiller un dossier", command=self.toggle_watch)
+        self.watch_button.pack(side=tk.LEFT, padx=5)
+
+        # Progression de l'ingestion + annulation
+        progress_frame = ttk.Frame(parent)
+        progress_frame.pack(fill=tk.X, padx=5)
+
+        self.ingest_progress = ttk.Progressbar(progress_frame, mode="determinate", length=200)
+        self.ingest_progress.pack(side=tk.LEFT, padx=5)
+
+        self.ingest_status_var = tk.StringVar(value="")
+        ingest_status_label = ttk.Label(progress_frame, textvariable=self.ingest_status_var)
+        ingest_status_label.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_ingest_button = tk.Button(progress_frame, text="Annuler le chargement",
+                                              command=self.cancel_ingestion, state=tk.DISABLED)
+        self.cancel_ingest_button.pack(side=tk.RIGHT, padx=5)
+
+        # Durées par étape de la dernière requête (extraction, embeddings, recherche, génération)
+        timings_frame = ttk.LabelFrame(parent, text="Dernière requête")
+        timings_frame.pack(fill=tk.X, padx=10)
+        self.timings_var = tk.StringVar(value="Aucune requête mesurée pour le moment.")
+        timings_label = ttk.Label(timings_frame, textvariable=self.timings_var, justify=tk.LEFT, wraplength=700)
+        timings_label.pack(fill=tk.X, padx=5, pady=2)
+
         # Zone réponse PDF
         self.pdf_answer_area = scrolledtext.ScrolledText(parent, wrap=tk.WORD)
         self.pdf_answer_area.pack(padx=10, pady=10, expand=True, fill=tk.BOTH)
@@ -207,6 +305,14 @@ Réponds en français en tenant compte du contexte ci-dessus :
         self.ask_pdf_button = tk.Button(parent, text="Poser la question au PDF", command=self.ask_pdf_question)
         self.ask_pdf_button.pack(pady=5)
 
+        self.stop_buttons["pdf"] = tk.Button(parent, text="Arrêter la génération",
+                                             command=lambda: self.stop_generation("pdf"),
+                                             state=tk.DISABLED)
+        self.stop_buttons["pdf"].pack(pady=5)
+
+        self.queue_vars["pdf"] = tk.StringVar(value="")
+        ttk.Label(parent, textvariable=self.queue_vars["pdf"]).pack(pady=2)
+
         self.summarize_pdf_button = tk.Button(parent, text="Demander un résumé du PDF", command=self.summarize_pdf)
         self.summarize_pdf_button.pack(pady=5)
 
@@ -216,8 +322,16 @@ Réponds en français en tenant compte du contexte ci-dessus :
         """
         sel = self.pdf_model_var.get()
         self._append_chat_message(f"[INFO] Modèle PDF sélectionné : {sel}", area="pdf")
+        if sel in self.models:
+            self.engine.models.warm_up(sel)
+            if self.vectorstore is not None:
+                self._create_pdf_qa_chain()
 
     def load_pdf(self):
+        if self.ingestion_job and self.ingestion_job.is_alive():
+            self._append_chat_message("[INFO] Une ingestion est déjà en cours.", area="pdf")
+            return
+
         pdf_path = filedialog.askopenfilename(
             filetypes=[("PDF Files", "*.pdf")],
             title="Choisir un PDF"
@@ -226,28 +340,137 @@ Réponds en français en tenant compte du contexte ci-dessus :
             return
 
         self._append_chat_message(f"[INFO] Chargement du PDF : {pdf_path}", area="pdf")
-        docs = self._extract_text_by_page(pdf_path)
-        collection_name = os.path.basename(pdf_path).replace(".pdf", "")
-
-        self.vectorstore = Chroma.from_documents(
-            documents=docs,
-            embedding=self.embeddings,
-            collection_name=collection_name,
-            persist_directory=self.chroma_persist_dir
-        )
-        self.vectorstore.persist()
 
-        self._append_chat_message(f"[INFO] PDF ingéré ({len(docs)} pages).", area="pdf")
-        self._create_pdf_qa_chain()
+        # L'extraction et les embeddings tournent dans un thread : la fenêtre reste réactive
+        self._cache_stats_at_start = self.embeddings.stats()
+        self.ingestion_job = self.engine.ingestion_job(pdf_path, self._extract_text_by_page).start()
+        self.load_pdf_button.config(state=tk.DISABLED)
+        self.cancel_ingest_button.config(state=tk.NORMAL)
+        self.ingest_progress.config(value=0, maximum=1)
+        self.ingest_status_var.set("Extraction du texte...")
+        self.master.after(100, self._poll_ingestion)
+
+    def cancel_ingestion(self):
+        if self.ingestion_job and self.ingestion_job.is_alive():
+            self.ingestion_job.cancel()
+            self.ingest_status_var.set("Annulation en cours...")
+
+    def _poll_ingestion(self):
+        """
+        Relève les événements publiés par le thread d'ingestion (appelé via after()).
+        """
+        job = self.ingestion_job
+        if job is None:
+            return
+        finished = False
+        while True:
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
+            finished = self._handle_ingestion_event(event) or finished
+
+        if finished:
+            self._show_last_timings()
+            self.ingestion_job = None
+            self.load_pdf_button.config(state=tk.NORMAL)
+            self.cancel_ingest_button.config(state=tk.DISABLED)
+        else:
+            self.master.after(100, self._poll_ingestion)
+
+    def _handle_ingestion_event(self, event):
+        """
+        Met à jour l'interface pour un événement d'ingestion. Retourne True si l'ingestion est terminée.
+        """
+        kind = event["type"]
+        if kind == "progress":
+            total = event["total_pages"]
+            if total:
+                self.ingest_progress.config(value=event["pages"], maximum=total)
+            status = f"Pages : {event['pages']}/{total or '?'} - morceaux embeddés : {event['chunks']}"
+            if event["eta"] is not None:
+                status += f" (reste ~{event['eta']:.0f} s)"
+            self.ingest_status_var.set(status)
+        elif kind == "done":
+            self.vectorstore = event["vectorstore"]
+            self.ingest_status_var.set("")
+            if event["chunks"] is None:
+                self._append_chat_message(
+                    "[INFO] PDF déjà indexé : collection existante réutilisée.", area="pdf"
+                )
+                self._create_pdf_qa_chain()
+                return True
+            self._append_chat_message(
+                f"[INFO] PDF ingéré ({event['pages']} pages, {event['chunks']} morceaux).", area="pdf"
+            )
+            stats = self.embeddings.stats()
+            hits = stats["hits"] - self._cache_stats_at_start["hits"]
+            misses = stats["misses"] - self._cache_stats_at_start["misses"]
+            self._append_chat_message(
+                f"[INFO] Cache d'embeddings : {hits} réutilisés, {misses} calculés.", area="pdf"
+            )
+            self._create_pdf_qa_chain()
+            return True
+        elif kind == "cancelled":
+            self.ingest_status_var.set("")
+            self._append_chat_message("[INFO] Chargement du PDF annulé.", area="pdf")
+            return True
+        elif kind == "error":
+            self.ingest_status_var.set("")
+            self._append_chat_message(f"Erreur lors du chargement du PDF : {event['error']}", area="pdf")
+            return True
+        return False
+
+    def toggle_watch(self):
+        """
+        Surveille un dossier : les PDF ajoutés ou modifiés sont ingérés en arrière-plan
+        (seuls les morceaux nouveaux sont embeddés), les PDF supprimés retirés de l'index.
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+            self.watch_button.config(text="Surveiller un dossier")
+            self._append_chat_message("[INFO] Surveillance arrêtée.", area="pdf")
+            return
+        folder = filedialog.askdirectory(title="Dossier de PDF à surveiller")
+        if not folder:
+            return
+        from watcher import FolderWatcher
+        self.watcher = FolderWatcher(self.engine, [folder]).start()
+        self.watch_button.config(text="Arrêter la surveillance")
+        self._append_chat_message(f"[INFO] Surveillance de {folder}", area="pdf")
+        self.master.after(500, self._poll_watcher, self.watcher)
+
+    def _poll_watcher(self, watcher):
+        if watcher is not self.watcher:
+            return
+        while True:
+            try:
+                event = watcher.events.get_nowait()
+            except queue.Empty:
+                break
+            self._handle_watch_event(event)
+        self.master.after(500, self._poll_watcher, watcher)
+
+    def _handle_watch_event(self, event):
+        name = os.path.basename(event["path"] or "")
+        if event["type"] == "ingested":
+            if event["attached"]:
+                detail = "déjà indexé"
+            else:
+                detail = (f"{event['chunks']} morceaux, {event['added']} embeddés, "
+                          f"{event['deleted']} retirés")
+            self._append_chat_message(f"[INFO] {name} : {detail}", area="pdf")
+            self._show_last_timings()
+        elif event["type"] == "removed":
+            self._append_chat_message(f"[INFO] {name} supprimé : retiré de l'index", area="pdf")
+        elif event["type"] == "error":
+            self._append_chat_message(f"[ERREUR] Surveillance {name} : {event['error']}", area="pdf")
 
     def _extract_text_by_page(self, pdf_path):
-        docs = []
-        with fitz.open(pdf_path) as doc:
-            for i, page in enumerate(doc):
-                text = page.get_text("text")
-                metadata = {"source": pdf_path, "page": i+1}
-                docs.append(Document(page_content=text, metadata=metadata))
-        return docs
+        # Générateur : les pages arrivent au fil de l'extraction (pool de processus pour les
+        # gros PDF), ou depuis le cache d'extraction pour un contenu déjà lu
+        return self.engine.extract_pages(pdf_path)
 
     def _create_pdf_qa_chain(self):
         if not self.vectorstore:
@@ -257,34 +480,21 @@ Réponds en français en tenant compte du contexte ci-dessus :
             self._append_chat_message("Aucun modèle PDF sélectionné.", area="pdf")
             return
 
-        llm_for_pdf = OllamaLLM(model=sel)
-        retriever = self.vectorstore.as_retriever(search_kwargs={"k": 5})
-
-        prompt_template = """Vous êtes un assistant qui s'appuie sur un document PDF.
-Voici les extraits pertinents (pages) :
-
-{context}
-
-Question : {question}
-
-Réponse en français :
-"""
-        pt = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
-        )
-
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=llm_for_pdf,
-            retriever=retriever,
-            chain_type="stuff",
-            chain_type_kwargs={"prompt": pt}
-        )
+        self.qa_chain = self.engine.qa_chain(self.vectorstore, sel)
+        self.qa_model = sel
 
         self._append_chat_message(f"[INFO] QA chain prête avec le modèle '{sel}'.", area="pdf")
 
     def ask_pdf_question(self):
-        if not self.qa_chain:
+        corpus = self.corpus_var.get()
+        if corpus:
+            if self.pdf_model_var.get() == "Aucun modèle trouvé":
+                self._append_chat_message("Aucun modèle PDF sélectionné.", area="pdf")
+                return
+            if not self.engine.collections():
+                self._append_chat_message("Aucun PDF ingéré pour le moment.", area="pdf")
+                return
+        elif not self.qa_chain:
             self._append_chat_message("Veuillez charger un PDF et sélectionner un modèle PDF.", area="pdf")
             return
 
@@ -292,52 +502,218 @@ Réponse en français :
         if not user_q:
             return
 
-        self._append_chat_message(f"**Question**: {user_q}", area="pdf")
-        try:
-            answer = self.qa_chain.run(user_q)
-        except Exception as e:
-            answer = f"Erreur : {e}"
-        self._append_chat_message(f"**Réponse**: {answer}", area="pdf")
-        self.pdf_question_entry.delete("1.0", tk.END)
+        if self._answer_pdf_question(user_q, corpus):
+            self.pdf_question_entry.delete("1.0", tk.END)
+
+    def _answer_pdf_question(self, user_q, corpus=False):
+        """
+        Confie la question à l'ordonnanceur : dans le worker, récupère les morceaux
+        pertinents (du PDF courant ou de tout le corpus), sert la réponse depuis le
+        cache si possible, sinon la génère à partir de ces mêmes morceaux et la met
+        en cache. En mode corpus, les références sont affichées. Retourne False si
+        la question n'a pas été mise en file (question identique déjà en cours).
+        """
+        from engine import collection_name, CORPUS_QA_PROMPT, CORPUS_SCOPE
+        from scheduler import QUESTION
+
+        if corpus:
+            model = self.pdf_model_var.get()
+            scope = CORPUS_SCOPE
+        else:
+            chain, model = self.qa_chain, self.qa_model
+            scope = collection_name(self.vectorstore)
+        prepared = {}
+
+        def run(callbacks):
+            if corpus:
+                prepared["question"] = self.engine.prepare_question(
+                    self.engine.corpus_chain(model), scope, model, user_q, CORPUS_QA_PROMPT
+                )
+            else:
+                prepared["question"] = self.engine.prepare_question(chain, scope, model, user_q)
+            question = prepared["question"]
+            if question.cached:
+                answer, kind = question.cached
+                label = "depuis le cache" if kind == "exact" else "depuis le cache, question similaire"
+                return f"({label}) {answer}"
+            return question.generate(callbacks)
+
+        def cite(answer=None):
+            question = prepared.get("question")
+            if corpus and question and question.docs:
+                self._append_chat_message(f"Sources : {' ; '.join(question.citations())}", area="pdf")
+
+        call = self._submit("pdf", run, QUESTION, key=("pdf", scope, model, user_q))
+        if call is None:
+            return False
+        self._start_stream("pdf", f"**Question**: {user_q}\n**Réponse**: ", call, on_done=cite)
+        return True
 
     def summarize_pdf(self):
         if not self.vectorstore or not self.qa_chain:
             self._append_chat_message("PDF non prêt ou modèle PDF non sélectionné.", area="pdf")
             return
+        if self.summary_call is not None:
+            self._append_chat_message("[INFO] Un résumé est déjà en cours.", area="pdf")
+            return
 
         sel = self.pdf_model_var.get()
-        llm_for_pdf = OllamaLLM(model=sel)
-        retriever = self.vectorstore.as_retriever(search_kwargs={"k":9999})
-
-        summarize_prompt = PromptTemplate(
-            template="""Vous êtes un assistant. 
-On vous fournit des passages d'un document PDF. 
-Faites-en un résumé synthétique.
-
-{context}
+        question = "Pouvez-vous me faire un résumé de ce PDF ?"
+        self._append_chat_message(f"**Résumé demandé**: {question}", area="pdf")
 
-Question: {question}
+        # Map-reduce sur les morceaux de la collection, au lieu de tout "stuffer" dans un
+        # prompt ; les appels au modèle passent derrière les questions dans l'ordonnanceur
+        from streaming import StreamingCall
+        vectorstore = self.vectorstore
+        call = StreamingCall(None)
+        call.run = lambda callbacks: self.engine.summarize(vectorstore, sel, stop_event=call.stop_event)
+        self.summary_call = call.start()
+        self.stop_buttons["pdf"].config(state=tk.NORMAL)
+        self.master.after(100, self._poll_summary)
+
+    def _poll_summary(self):
+        """
+        Affiche le résumé une fois terminé, entre deux réponses de l'onglet PDF.
+        """
+        call = self.summary_call
+        final = call.outcome
+        if final is None or any(entry["shown"] for entry in self.streams.get("pdf", ())):
+            self.master.after(100, self._poll_summary)
+            return
+        if final["type"] == "done":
+            summary = final["text"]
+        elif final["type"] == "stopped":
+            summary = "[résumé interrompu]"
+        else:
+            summary = f"Erreur : {final['error']}"
+        self._append_chat_message(f"**Résumé**: {summary}", area="pdf")
+        self.summary_call = None
+        if not self.streams.get("pdf"):
+            self.stop_buttons["pdf"].config(state=tk.DISABLED)
+        self._show_last_timings()
 
-Résumé :
-""",
-            input_variables=["context","question"]
-        )
+    def _show_last_timings(self):
+        """
+        Panneau "Dernière requête" : durées par étape de la dernière trace terminée.
+        """
+        if self._engine.ready():
+            self.timings_var.set(format_trace(self.engine.tracer.last()))
 
-        sum_chain = RetrievalQA.from_chain_type(
-            llm=llm_for_pdf,
-            retriever=retriever,
-            chain_type="stuff",
-            chain_type_kwargs={"prompt": summarize_prompt}
-        )
+    # -------------------------------
+    # Génération en flux, via l'ordonnanceur
+    # -------------------------------
+    def _submit(self, area, run, priority, key=None):
+        """
+        Met un appel en file dans la voie de l'onglet. Une demande identique déjà
+        en file ou en cours pour cet onglet n'est pas affichée une seconde fois :
+        retourne None.
+        """
+        call = self.engine.scheduler.submit(area, run, priority, key=key)
+        if any(entry["call"] is call for entry in self.streams.get(area, ())):
+            call.stop()  # se retire de la requête partagée, qui continue pour le premier demandeur
+            self._append_chat_message("[INFO] Une demande identique est déjà en cours.", area=area)
+            return None
+        return call
+
+    def _start_stream(self, area, prefix, call, error_prefix="Erreur : ", suffix="\n", on_done=None):
+        """
+        Ajoute `call` aux réponses de la zone ; `prefix` est affiché quand son tour
+        vient, puis les tokens (ou la réponse complète si le flux est désactivé).
+        """
+        pending = self.streams.setdefault(area, deque())
+        pending.append({"call": call, "prefix": prefix, "error_prefix": error_prefix, "suffix": suffix,
+                        "on_done": on_done, "stream": self.streaming_var.get(), "shown": False})
+        self.stop_buttons[area].config(state=tk.NORMAL)
+        self._update_queue_status(area)
+        if len(pending) == 1:
+            self.master.after(50, self._poll_stream, area)
+
+    def stop_generation(self, area):
+        """
+        Interrompt la réponse affichée (ou la retire de la file si elle n'a pas démarré) ;
+        à défaut, le résumé en cours de l'onglet PDF.
+        """
+        pending = self.streams.get(area)
+        if pending:
+            pending[0]["call"].stop()
+        elif area == "pdf" and self.summary_call is not None:
+            self.summary_call.stop()
 
-        question = "Pouvez-vous me faire un résumé de ce PDF ?"
-        self._append_chat_message(f"**Résumé demandé**: {question}", area="pdf")
+    def _poll_stream(self, area):
+        """
+        Insère d'un bloc les tokens reçus depuis le dernier passage (toutes les 50 ms),
+        pour ne pas saturer la boucle Tk avec un modèle rapide.
+        """
+        pending = self.streams.get(area)
+        if not pending:
+            return
+        entry = pending[0]
+        call = entry["call"]
+        if not entry["shown"]:
+            if call.state == "queued":
+                self.master.after(50, self._poll_stream, area)
+                return
+            self._insert_text(area, entry["prefix"])
+            entry["shown"] = True
+
+        if entry["stream"]:
+            text, final = call.drain()
+            if text:
+                self._insert_text(area, text)
+        else:
+            final = call.outcome
+        if final is None:
+            self.master.after(50, self._poll_stream, area)
+            return
 
-        try:
-            summary = sum_chain.run(question)
-        except Exception as e:
-            summary = f"Erreur : {e}"
-        self._append_chat_message(f"**Résumé**: {summary}", area="pdf")
+        if final["type"] == "stopped":
+            self._insert_text(area, " [génération interrompue]")
+        elif final["type"] == "error":
+            self._insert_text(area, f"{entry['error_prefix']}{final['error']}")
+        elif final["type"] == "done" and (not entry["stream"] or call.first_token_at is None):
+            # Flux désactivé, ou modèle qui n'a rien diffusé : on affiche le résultat complet
+            self._insert_text(area, final["text"])
+        self._insert_text(area, entry["suffix"])
+        if final["type"] == "done" and entry["on_done"]:
+            entry["on_done"](final["text"])
+        pending.popleft()
+        self._update_queue_status(area)
+        if area == "pdf":
+            self._show_last_timings()
+        if pending:
+            self.master.after(0, self._poll_stream, area)
+        elif not (area == "pdf" and self.summary_call is not None):
+            self.stop_buttons[area].config(state=tk.DISABLED)
+
+    def _poll_queue_status(self):
+        for area in self.queue_vars:
+            self._update_queue_status(area)
+        self.master.after(500, self._poll_queue_status)
+
+    def _update_queue_status(self, area):
+        """
+        Requêtes en cours / en attente de l'onglet et temps d'attente, d'après l'ordonnanceur.
+        """
+        if not self._engine.ready():
+            return
+        lanes = ("chat", "memory") if area == "chat" else ("pdf", "summary")
+        stats = self.engine.scheduler.stats(lanes)
+        if not stats["queued"] and not stats["running"]:
+            text = ""
+        else:
+            text = f"File : {stats['running']} en cours, {stats['queued']} en attente"
+            if stats["queued"]:
+                text += f" (la plus ancienne depuis {stats['oldest_wait']:.1f} s)"
+        if stats["average_wait"] >= 0.05:
+            text += ("" if not text else " · ") + f"attente moyenne {stats['average_wait']:.1f} s"
+        self.queue_vars[area].set(text)
+
+    def _insert_text(self, area, text):
+        widget = self.conversation_area if area == "chat" else self.pdf_answer_area
+        widget.config(state=tk.NORMAL)
+        widget.insert(tk.END, text)
+        widget.config(state=tk.DISABLED)
+        widget.see(tk.END)
 
     def _append_chat_message(self, text, area="chat"):
         if area == "chat":
@@ -352,6 +728,17 @@ Résumé :
             self.pdf_answer_area.see(tk.END)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Mode sans interface : python main.py ingest|ask|summarize|serve ...
+        import cli
+        sys.exit(cli.main(sys.argv[1:]))
     root = tk.Tk()
     app = PDFChatApplication(root)
+
+    def report_startup():
+        app.startup_seconds = time.perf_counter() - _STARTED_AT
+        if app.startup_seconds > WINDOW_TARGET:
+            print(f"[startup] fenêtre affichée en {app.startup_seconds * 1000:.0f} ms "
+                  f"(objectif {WINDOW_TARGET * 1000:.0f} ms)")
+    root.after_idle(report_startup)
     root.mainloop()
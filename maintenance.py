@@ -0,0 +1,163 @@
+import os
+import re
+import shutil
+import sqlite3
+
+# Dossiers de segments Chroma (index HNSW) : nommés par l'UUID du segment
+SEGMENT_DIR_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+# -------------------------------
+# Entretien de chroma_db : inventaire, collections orphelines ou en double, compactage
+# -------------------------------
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StoreMaintenance:
+    """
+    Inventaire et nettoyage du répertoire de persistance d'un RAGEngine.
+    État d'une collection :
+      - "ok" : enregistrée dans le registre, fichier PDF présent ;
+      - "missing_file" : enregistrée, mais aucun de ses fichiers n'existe plus ;
+      - "duplicate" : hors registre, et ses PDF sources sont déjà indexés ailleurs
+        (collections créées par les anciennes versions à chaque chargement) ;
+      - "orphan" : hors registre, sans équivalent.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.persist_dir = engine.persist_dir
+
+    def client(self):
+        import chromadb
+        return chromadb.PersistentClient(path=self.persist_dir)
+
+    def inventory(self):
+        """
+        Une entrée par collection Chroma : nom, nombre de vecteurs, taille de
+        l'index sur disque, état, chemins des PDF.
+        """
+        registered = {e["collection"]: e for e in self.engine.registry.entries()}
+        segments = self._segments()
+        result = []
+        for collection in self.client().list_collections():
+            entry = registered.get(collection.name)
+            info = {
+                "collection": collection.name,
+                "vectors": collection.count(),
+                "disk_bytes": sum(directory_size(os.path.join(self.persist_dir, s))
+                                  for s in segments.get(str(collection.id), [])),
+                "paths": entry["paths"] if entry else [],
+            }
+            if entry:
+                missing = not any(os.path.exists(p) for p in entry["paths"])
+                info["status"] = "missing_file" if missing else "ok"
+            else:
+                info["sources"] = self._sources(collection)
+                info["status"] = "duplicate" if self._indexed_elsewhere(info["sources"]) else "orphan"
+            result.append(info)
+        return sorted(result, key=lambda info: -info["disk_bytes"])
+
+    def usage(self):
+        """
+        Octets occupés par le répertoire de persistance (collections, registre, index).
+        """
+        return directory_size(self.persist_dir)
+
+    def collect_garbage(self, dry_run=False, orphans=True, missing_files=False):
+        """
+        Supprime les collections en double, les orphelines (si `orphans`) et celles
+        dont le PDF a disparu (si `missing_files`), ainsi que les entrées des index
+        BM25 / compact sans collection. Retourne les entrées d'inventaire supprimées.
+        À lancer hors ingestion : une collection en cours d'écriture n'est pas
+        encore dans le registre et serait vue comme orpheline.
+        """
+        statuses = {"duplicate"} | ({"orphan"} if orphans else set()) | ({"missing_file"} if missing_files else set())
+        inventory = self.inventory()
+        removed = [info for info in inventory if info["status"] in statuses]
+        if dry_run:
+            return removed
+        for info in removed:
+            for path in info["paths"]:
+                self.engine.registry.remove(path)
+            self.engine.drop_collection(info["collection"])
+
+        # Index dérivés d'une collection qui n'existe plus dans Chroma
+        alive = {info["collection"] for info in inventory} - {info["collection"] for info in removed}
+        derived = set(self.engine.lexical.collections())
+        if self.engine.vectors is not None:
+            derived |= set(self.engine.vectors.collections())
+        for name in derived - alive:
+            self.engine.drop_collection(name)
+        return removed
+
+    def compact(self):
+        """
+        Supprime les dossiers de segments laissés par les collections supprimées et
+        récupère l'espace libre des bases SQLite. Retourne les tailles avant / après.
+        """
+        before = self.usage()
+        live = {s for ids in self._segments().values() for s in ids}
+        removed = 0
+        for name in os.listdir(self.persist_dir):
+            path = os.path.join(self.persist_dir, name)
+            if SEGMENT_DIR_RE.match(name) and os.path.isdir(path) and name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        errors = []
+        try:
+            conn = sqlite3.connect(os.path.join(self.persist_dir, "chroma.sqlite3"), timeout=10)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # Base occupée par une écriture en cours : on compactera une autre fois
+            errors.append(f"chroma.sqlite3 : {e}")
+        self.engine.lexical.vacuum()
+        if self.engine.vectors is not None:
+            self.engine.vectors.vacuum()
+        return {"before_bytes": before, "after_bytes": self.usage(), "removed_segments": removed, "errors": errors}
+
+    # ---- Interne
+    def _segments(self):
+        """
+        {identifiant de collection: [identifiants des segments vectoriels]}.
+        """
+        path = os.path.join(self.persist_dir, "chroma.sqlite3")
+        if not os.path.exists(path):
+            return {}
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT id, collection FROM segments WHERE scope = 'VECTOR'").fetchall()
+        finally:
+            conn.close()
+        segments = {}
+        for segment, collection in rows:
+            segments.setdefault(collection, []).append(segment)
+        return segments
+
+    @staticmethod
+    def _sources(collection, sample=200):
+        metadatas = collection.get(include=["metadatas"], limit=sample)["metadatas"] or []
+        return sorted({m.get("source") for m in metadatas if m and m.get("source")})
+
+    def _indexed_elsewhere(self, sources):
+        if not sources:
+            return False
+        indexed = {e["content_hash"] for e in self.engine.registry.entries()}
+        for path in sources:
+            try:
+                if self.engine.registry.content_hash(path) not in indexed:
+                    return False
+            except OSError:
+                return False  # fichier disparu : rien ne prouve qu'il est indexé ailleurs
+        return True
@@ -0,0 +1,180 @@
+import math
+import threading
+from collections import deque
+
+from chunking import estimate_tokens
+
+
+# -------------------------------
+# Mémoire de conversation bornée pour le chat général
+# -------------------------------
+SUMMARY_PROMPT = """Voici le résumé d'une conversation, suivi de nouveaux échanges.
+Mets à jour le résumé en quelques phrases, en français, en gardant les faits,
+les préférences et les décisions utiles pour la suite de la conversation.
+
+Résumé actuel :
+{summary}
+
+Nouveaux échanges :
+{turns}
+
+Résumé mis à jour :
+"""
+
+
+def format_turn(question, answer):
+    return f"Utilisateur : {question}\nAssistant : {answer}"
+
+
+def truncate_tokens(text, budget):
+    """
+    Garde la fin du texte dans la limite du budget (les éléments récents comptent plus).
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    return text[-budget * 4:]
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ConversationMemory:
+    """
+    Contexte du chat borné à `token_budget` tokens : les derniers échanges sont
+    gardés tels quels, les plus anciens sont fusionnés dans un résumé glissant
+    par `summarize(prompt) -> str`, dans un thread de fond pour ne pas allonger
+    la latence du tour. Si `embeddings` est fourni, les échanges archivés les
+    plus proches de la question sont rappelés mot pour mot ; seuls les
+    `max_archive` derniers sont gardés, pour que le rappel (comparé à chaque
+    échange archivé) ne ralentisse pas les tours d'une longue session.
+    """
+
+    def __init__(self, summarize, token_budget=1500, summary_budget=300, recall_budget=300,
+                 embeddings=None, recall_k=2, recall_threshold=0.75, max_archive=200, background=True):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.recall_budget = recall_budget if embeddings is not None else 0
+        self.recent_budget = token_budget - summary_budget - self.recall_budget
+        self.embeddings = embeddings
+        self.recall_k = recall_k
+        self.recall_threshold = recall_threshold
+        self.background = background
+        self.turns = []
+        self.summary = ""
+        self.archive = deque(maxlen=max_archive)  # (texte de l'échange, vecteur), les plus anciens évincés
+        self._pending = []
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def add_turn(self, question, answer):
+        with self._lock:
+            self.turns.append((question, answer))
+            # Les échanges qui dépassent le budget « récent » partent vers le résumé
+            while len(self.turns) > 1 and self._recent_tokens() > self.recent_budget:
+                self._pending.append(self.turns.pop(0))
+            start = bool(self._pending) and self._worker is None
+            if start and self.background:
+                self._worker = threading.Thread(target=self._compress, daemon=True)
+                self._worker.start()
+        if start and not self.background:
+            self._compress()
+
+    def build_context(self, question):
+        """
+        Contexte à injecter dans le prompt : résumé, échanges rappelés, puis
+        derniers échanges (du plus récent au plus ancien tant que le budget le permet).
+        """
+        with self._lock:
+            summary = self.summary
+            turns = list(self.turns)
+            archive = list(self.archive)
+
+        parts = []
+        used = 0
+        if summary:
+            parts.append("Résumé de la conversation précédente :\n" + summary)
+            used += estimate_tokens(parts[-1])
+
+        recalled = self._recall(question, archive)
+        if recalled:
+            parts.append("Échanges antérieurs pertinents :\n" + "\n\n".join(recalled))
+            used += estimate_tokens(parts[-1])
+
+        recent = []
+        for q, a in reversed(turns):
+            text = format_turn(q, a)
+            if recent and used + estimate_tokens(text) > self.token_budget:
+                break
+            recent.insert(0, truncate_tokens(text, self.token_budget - used))
+            used += estimate_tokens(recent[0])
+        if recent:
+            parts.append("Derniers échanges :\n" + "\n\n".join(recent))
+        return "\n\n".join(parts)
+
+    def wait_idle(self, timeout=None):
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def clear(self):
+        with self._lock:
+            self.turns = []
+            self.summary = ""
+            self.archive.clear()
+            self._pending = []
+
+    def _recent_tokens(self):
+        return sum(estimate_tokens(format_turn(q, a)) for q, a in self.turns)
+
+    def _compress(self):
+        while True:
+            with self._lock:
+                batch = self._pending
+                self._pending = []
+                previous = self.summary
+                if not batch:
+                    self._worker = None
+                    return
+            texts = [format_turn(q, a) for q, a in batch]
+            try:
+                summary = self.summarize(SUMMARY_PROMPT.format(
+                    summary=previous or "(aucun)", turns="\n\n".join(texts)
+                )).strip()
+            except Exception:
+                # Modèle indisponible : on garde au moins la fin des échanges
+                summary = "\n".join([previous, *texts]).strip()
+            summary = truncate_tokens(summary, self.summary_budget)
+
+            vectors = None
+            if self.embeddings is not None:
+                try:
+                    vectors = self.embeddings.embed_documents(texts)
+                except Exception:
+                    vectors = None
+            with self._lock:
+                self.summary = summary
+                if vectors:
+                    self.archive.extend(zip(texts, vectors))
+
+    def _recall(self, question, archive):
+        if not archive or self.embeddings is None:
+            return []
+        try:
+            query = self.embeddings.embed_query(question)
+        except Exception:
+            return []
+        scored = sorted(((cosine(query, vec), text) for text, vec in archive), reverse=True)
+        recalled = []
+        used = 0
+        for score, text in scored[:self.recall_k]:
+            if score < self.recall_threshold:
+                break
+            if used + estimate_tokens(text) > self.recall_budget:
+                continue
+            recalled.append(text)
+            used += estimate_tokens(text)
+        return recalled
@@ -0,0 +1,108 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+
+
+def ollama_base_url():
+    """
+    URL du serveur Ollama, selon la même variable OLLAMA_HOST que la CLI ollama.
+    """
+    host = os.environ.get("OLLAMA_HOST", "").strip() or "http://localhost:11434"
+    if "://" not in host:
+        host = "http://" + host
+    return host.rstrip("/")
+
+
+# -------------------------------
+# Fonction pour lister les modèles Ollama
+# -------------------------------
+def get_ollama_models():
+    try:
+        result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
+        if result.returncode == 0:
+            lines = result.stdout.strip().split('\n')
+            models = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                parts = line.split()
+                model_name = parts[0]
+                models.append(model_name)
+            return models
+        else:
+            return []
+    except FileNotFoundError:
+        print("Erreur : la commande 'ollama' n'est pas trouvée.")
+        return []
+
+
+def fetch_models(base_url=None, timeout=2.0):
+    """
+    Modèles installés, via l'API HTTP d'Ollama (/api/tags) : plus rapide que
+    `ollama list`, qui lance un processus.
+    """
+    import urllib.request
+
+    url = (base_url or ollama_base_url()).rstrip("/") + "/api/tags"
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        payload = json.loads(response.read())
+    return [m["name"] for m in payload.get("models", [])]
+
+
+class ModelDiscovery:
+    """
+    Découverte des modèles en arrière-plan : la fenêtre s'ouvre tout de suite avec
+    la dernière liste connue (`cached()`), puis l'événement {"type": "models"} ou
+    {"type": "error"} arrive dans `self.events`. Au-delà de `timeout` secondes,
+    l'appelant garde la liste en cache (`expired()`).
+    """
+
+    def __init__(self, cache_path, timeout=3.0, base_url=None, fallback=get_ollama_models):
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.base_url = base_url
+        self.fallback = fallback
+        self.events = queue.Queue()
+        self.started_at = None
+
+    def cached(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                models = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [m for m in models if isinstance(m, str)] if isinstance(models, list) else []
+
+    def start(self):
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def expired(self):
+        return self.started_at is not None and time.monotonic() - self.started_at > self.timeout
+
+    def _run(self):
+        try:
+            try:
+                models = fetch_models(self.base_url, timeout=self.timeout)
+            except Exception:
+                # API injoignable (OLLAMA_HOST différent, ancienne version) : la commande ollama
+                models = self.fallback()
+                if not models:
+                    raise RuntimeError("aucun modèle Ollama trouvé")
+            self._save(models)
+            self.events.put({"type": "models", "models": models})
+        except Exception as e:
+            self.events.put({"type": "error", "error": e})
+
+    def _save(self, models):
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(models, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+from model_discovery import ollama_base_url
+
+
+# -------------------------------
+# Clients LLM et chaînes partagés, modèles préchargés et gardés en mémoire par Ollama
+# -------------------------------
+def ollama_llm(model, keep_alive, **params):
+    from langchain_ollama import OllamaLLM
+    return OllamaLLM(model=model, keep_alive=keep_alive, **params)
+
+
+class ModelPool:
+    """
+    Un seul client LLM par (modèle, paramètres), et des chaînes réutilisées
+    par clé (LRU, au plus `max_chains`). Chaque requête demande à Ollama de
+    garder le modèle chargé `keep_alive` ; warm_up() charge un modèle à l'avance
+    (requête vide) pour que la première vraie question ne paie pas le chargement.
+    """
+
+    def __init__(self, keep_alive="30m", max_chains=32, base_url=None, llm_factory=ollama_llm, timeout=300):
+        self.keep_alive = keep_alive
+        self.max_chains = max_chains
+        self.base_url = base_url or ollama_base_url()
+        self.llm_factory = llm_factory
+        self.timeout = timeout
+        self._llms = {}
+        self._chains = OrderedDict()
+        self._warm = {}
+        self._warming = {}
+        self._lock = threading.Lock()
+
+    def llm(self, model, **params):
+        key = (model, tuple(sorted(params.items())))
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                llm = self._llms[key] = self.llm_factory(model, self.keep_alive, **params)
+            return llm
+
+    def chain(self, key, build):
+        """
+        Chaîne mise en cache sous `key` (construite par build() au premier appel).
+        """
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is not None:
+                self._chains.move_to_end(key)
+                return chain
+        chain = build()
+        with self._lock:
+            chain = self._chains.setdefault(key, chain)
+            self._chains.move_to_end(key)
+            while len(self._chains) > self.max_chains:
+                self._chains.popitem(last=False)
+        return chain
+
+    def forget_chains(self, predicate):
+        """
+        Retire les chaînes dont la clé vérifie predicate(key) (collection supprimée...).
+        """
+        with self._lock:
+            for key in [k for k in self._chains if predicate(k)]:
+                del self._chains[key]
+
+    def warm_up(self, model, kind="generate", wait=False):
+        """
+        Charge le modèle dans Ollama en arrière-plan (une seule requête en vol par
+        modèle). kind="embed" pour un modèle d'embedding. Retourne le thread.
+        """
+        with self._lock:
+            thread = self._warming.get(model)
+            if thread is None:
+                thread = threading.Thread(target=self._warm_up, args=(model, kind), daemon=True)
+                self._warming[model] = thread
+                thread.start()
+        if wait:
+            thread.join()
+        return thread
+
+    def is_warm(self, model):
+        with self._lock:
+            return model in self._warm
+
+    def stats(self):
+        with self._lock:
+            return {"llms": len(self._llms), "chains": len(self._chains), "warm": sorted(self._warm)}
+
+    def _warm_up(self, model, kind):
+        if kind == "embed":
+            path, body = "/api/embed", {"model": model, "input": "", "keep_alive": self.keep_alive}
+        else:
+            # Prompt vide : Ollama charge le modèle sans rien générer
+            path, body = "/api/generate", {"model": model, "prompt": "", "stream": False,
+                                           "keep_alive": self.keep_alive}
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            with self._lock:
+                self._warm[model] = time.time()
+        except Exception:
+            # Ollama indisponible : le modèle sera chargé à la première requête
+            pass
+        finally:
+            with self._lock:
+                self._warming.pop(model, None)
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+# -------------------------------
+# Registre des PDF déjà ingérés dans chroma_db
+# -------------------------------
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Hash SHA-256 du contenu d'un fichier, lu par blocs.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_signature(path):
+    """
+    Signature rapide (taille, mtime) permettant d'éviter de re-hacher un fichier inchangé.
+    """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def document_ids(docs):
+    """
+    Identifiants déterministes des documents : une page (ou un morceau) au contenu
+    inchangé garde le même identifiant d'une ingestion à l'autre.
+    """
+    ids = []
+    for doc in docs:
+        meta = doc.metadata
+        key = f"{meta.get('page')}|{meta.get('start_index', 0)}|{doc.page_content}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        ids.append(f"p{meta.get('page')}-{digest}")
+    return ids
+
+
+class CollectionWriter:
+    """
+    Écrit des morceaux par lots dans une collection Chroma (protocole `store` de
+    run_ingestion). En mode incrémental, seuls les identifiants absents de la
+    collection sont ajoutés (donc embeddés) et, à la fin, les identifiants qui
+    ont disparu sont supprimés. finish() enregistre le document dans le registre.
+    Si `lexical` (LexicalIndex) est fourni, l'index BM25 est tenu à jour en même temps.
+    """
+
+    def __init__(self, registry, pdf_path, persist_directory, lexical=None):
+        self.registry = registry
+        self.pdf_path = pdf_path
+        self.persist_directory = persist_directory
+        self.lexical = lexical
+        self.collection_name = None
+        self.incremental = False
+        self.vectorstore = None
+        self.ids = []
+        self.existing = set()
+        self.added = 0
+        self.deleted = 0
+
+    def add(self, docs, embedding):
+        from langchain.vectorstores import Chroma
+
+        if self.collection_name is None:
+            # Résolu au premier lot, dans le thread d'ingestion (le hash du fichier peut être long)
+            self.collection_name = self.registry.collection_for(self.pdf_path)
+            self.incremental = self.registry.is_known_collection(self.collection_name)
+
+        ids = document_ids(docs)
+        self.ids.extend(ids)
+        if self.lexical is not None:
+            # Sans embedding : on passe tout le lot, les morceaux déjà indexés sont ignorés
+            self.lexical.add(self.collection_name, docs, ids)
+        if self.vectorstore is None and not self.incremental:
+            self.vectorstore = Chroma.from_documents(
+                documents=docs,
+                embedding=embedding,
+                ids=ids,
+                collection_name=self.collection_name,
+                persist_directory=self.persist_directory
+            )
+            self.added += len(docs)
+            return
+        if self.vectorstore is None:
+            self.vectorstore = Chroma(
+                collection_name=self.collection_name,
+                embedding_function=embedding,
+                persist_directory=self.persist_directory
+            )
+            self.existing = set(self.vectorstore.get(include=[])["ids"])
+        new = [(i, d) for i, d in zip(ids, docs) if i not in self.existing]
+        if new:
+            self.vectorstore.add_documents([d for _, d in new], ids=[i for i, _ in new])
+            self.added += len(new)
+
+    def finish(self, pages):
+        stale = list(self.existing - set(self.ids))
+        if stale:
+            self.vectorstore.delete(ids=stale)
+            if self.lexical is not None:
+                self.lexical.remove(self.collection_name, stale)
+            self.deleted = len(stale)
+        self.vectorstore.persist()
+        self.registry.record(self.pdf_path, self.collection_name, self.ids, pages=pages)
+        return self.vectorstore
+
+    def abort(self):
+        # Une nouvelle collection à moitié écrite est supprimée ; en mode incrémental
+        # les ajouts déjà faits restent valides (identifiants déterministes)
+        if self.vectorstore is not None and not self.incremental:
+            self.vectorstore.delete_collection()
+        if self.lexical is not None and self.collection_name and not self.incremental:
+            self.lexical.drop(self.collection_name)
+
+
+class DocumentRegistry:
+    """
+    Associe chaque PDF (hash de contenu, taille, mtime) à sa collection Chroma.
+    Stocké en JSON dans le répertoire de persistance de Chroma.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._hash_cache = {}
+        self.data = {"documents": {}, "paths": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def content_hash(self, pdf_path):
+        """
+        Hash du contenu, mémorisé par (chemin, taille, mtime).
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        key = (pdf_path, *file_signature(pdf_path))
+        with self._lock:
+            if key not in self._hash_cache:
+                self._hash_cache[key] = hash_file(pdf_path)
+            return self._hash_cache[key]
+
+    def find(self, pdf_path):
+        """
+        Retourne l'entrée du document si ce contenu a déjà été ingéré, sinon None.
+        Un fichier dont la taille et le mtime n'ont pas changé n'est pas relu.
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        size, mtime = file_signature(pdf_path)
+        with self._lock:
+            info = self.data["paths"].get(pdf_path)
+            if info and info["size"] == size and info["mtime"] == mtime:
+                entry = self.data["documents"].get(info["content_hash"])
+                if entry:
+                    return entry
+
+            content_hash = self.content_hash(pdf_path)
+            entry = self.data["documents"].get(content_hash)
+            if entry:
+                # Même contenu sous un autre chemin (ou simple changement de mtime)
+                self._link_path(pdf_path, size, mtime, content_hash)
+                self.save()
+            return entry
+
+    def collection_for(self, pdf_path):
+        """
+        Nom de collection à utiliser pour (ré)ingérer ce fichier. Une nouvelle version
+        d'un fichier connu réutilise sa collection, sauf si elle est partagée avec un
+        autre chemin ; sinon le nom dérive du hash du contenu.
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        with self._lock:
+            info = self.data["paths"].get(pdf_path)
+            if info:
+                entry = self.data["documents"].get(info["content_hash"])
+                if entry and entry["paths"] == [pdf_path]:
+                    return entry["collection"]
+            return f"pdf-{self.content_hash(pdf_path)[:24]}"
+
+    def is_current(self, pdf_path):
+        """
+        Vrai si ce chemin est enregistré avec la taille et le mtime actuels du fichier
+        (rien à réingérer), sans relire son contenu.
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        size, mtime = file_signature(pdf_path)
+        with self._lock:
+            info = self.data["paths"].get(pdf_path)
+            return bool(info and info["size"] == size and info["mtime"] == mtime
+                        and info["content_hash"] in self.data["documents"])
+
+    def path_entry(self, pdf_path):
+        """
+        Entrée du document enregistré pour ce chemin (même si le fichier a changé ou
+        disparu depuis), ou None.
+        """
+        with self._lock:
+            info = self.data["paths"].get(os.path.abspath(pdf_path))
+            return self.data["documents"].get(info["content_hash"]) if info else None
+
+    def known_paths(self):
+        with self._lock:
+            return list(self.data["paths"])
+
+    def writer(self, pdf_path, persist_directory, lexical=None):
+        """
+        CollectionWriter prêt à (ré)ingérer ce fichier dans sa collection.
+        """
+        return CollectionWriter(self, pdf_path, persist_directory, lexical)
+
+    def is_known_collection(self, collection):
+        with self._lock:
+            return any(e["collection"] == collection for e in self.data["documents"].values())
+
+    def record(self, pdf_path, collection, ids, pages):
+        """
+        Enregistre (ou met à jour) le document après une ingestion réussie.
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        size, mtime = file_signature(pdf_path)
+        content_hash = self.content_hash(pdf_path)
+        with self._lock:
+            self._unlink_path(pdf_path)
+            previous = self.data["documents"].get(content_hash)
+            self.data["documents"][content_hash] = {
+                "content_hash": content_hash,
+                "collection": collection,
+                "paths": previous["paths"] if previous else [],
+                "ids": list(ids),
+                "pages": pages,
+                "ingested_at": time.time(),
+            }
+            self._link_path(pdf_path, size, mtime, content_hash)
+            self.save()
+            return self.data["documents"][content_hash]
+
+    def remove(self, pdf_path):
+        """
+        Oublie un chemin. Retourne l'entrée du document si plus aucun chemin ne la
+        référence (sa collection peut alors être supprimée), sinon None.
+        """
+        with self._lock:
+            orphan = self._unlink_path(os.path.abspath(pdf_path))
+            self.save()
+            return orphan
+
+    def entries(self):
+        with self._lock:
+            return list(self.data["documents"].values())
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def _link_path(self, pdf_path, size, mtime, content_hash):
+        self._unlink_path(pdf_path, keep=content_hash)
+        self.data["paths"][pdf_path] = {"size": size, "mtime": mtime, "content_hash": content_hash}
+        entry = self.data["documents"][content_hash]
+        if pdf_path not in entry["paths"]:
+            entry["paths"].append(pdf_path)
+
+    def _unlink_path(self, pdf_path, keep=None):
+        info = self.data["paths"].pop(pdf_path, None)
+        if not info or info["content_hash"] == keep:
+            return None
+        entry = self.data["documents"].get(info["content_hash"])
+        if not entry:
+            return None
+        if pdf_path in entry["paths"]:
+            entry["paths"].remove(pdf_path)
+        if not entry["paths"]:
+            return self.data["documents"].pop(info["content_hash"])
+        return None
@@ -0,0 +1,222 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from streaming import GenerationStopped, StreamingCall
+
+# Priorités : la plus petite valeur passe en premier
+INTERACTIVE = 0  # chat
+QUESTION = 1     # questions PDF, CLI, API
+BACKGROUND = 2   # résumés, compression de la mémoire de conversation
+
+
+def default_workers():
+    """
+    Requêtes servies en parallèle par le serveur Ollama local (OLLAMA_NUM_PARALLEL),
+    2 si la variable n'est pas définie.
+    """
+    try:
+        return max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", "")))
+    except ValueError:
+        return 2
+
+
+# -------------------------------
+# Ordonnanceur des appels au modèle : pool borné, files par onglet, priorités
+# -------------------------------
+class ScheduledCall(StreamingCall):
+    """
+    Appel en flux exécuté par un worker du RequestScheduler plutôt que par son
+    propre thread. `state` : queued, running, puis done, error, stopped ou
+    cancelled (retiré de la file avant d'avoir démarré).
+    """
+
+    def __init__(self, scheduler, lane, run, priority, key):
+        super().__init__(run)
+        self.scheduler = scheduler
+        self.lane = lane
+        self.priority = priority
+        self.key = key
+        self.state = "queued"
+        self.submitted_at = time.monotonic()
+        self.subscribers = 1
+        self.finished = threading.Event()
+
+    def start(self):
+        return self  # démarré par l'ordonnanceur
+
+    def stop(self):
+        self.scheduler.cancel(self)
+
+    def is_alive(self):
+        return not self.finished.is_set()
+
+    def join(self, timeout=None):
+        self.finished.wait(timeout)
+
+    def wait_time(self):
+        """
+        Secondes passées (ou déjà écoulées) dans la file avant de démarrer.
+        """
+        return (self.started_at or time.monotonic()) - self.submitted_at
+
+    def result(self, timeout=None):
+        """
+        Attend la fin de l'appel et retourne son résultat (exception si erreur,
+        GenerationStopped si interrompu ou annulé, TimeoutError si `timeout` expire).
+        """
+        if not self.finished.wait(timeout):
+            raise TimeoutError(f"requête toujours {'en file' if self.state == 'queued' else 'en cours'}")
+        if self.outcome["type"] == "error":
+            raise self.outcome["error"]
+        if self.outcome["type"] != "done":
+            raise GenerationStopped()
+        return self.outcome["text"]
+
+    def _execute(self):
+        self.started_at = time.monotonic()
+        self._run()
+        self.state = self.outcome["type"]
+        self.finished.set()
+
+
+class RequestScheduler:
+    """
+    Possède les appels au modèle de l'application : `workers` requêtes au plus
+    en parallèle (ce que le serveur Ollama local sert réellement), les autres
+    attendent dans la file de leur voie ("chat", "pdf", "summary"...). Un worker
+    libre prend la requête de plus haute priorité, la plus ancienne à priorité
+    égale. `lane_limits` borne les requêtes simultanées d'une voie : 1 pour un
+    onglet, dont les réponses s'affichent dans l'ordre. Une requête identique
+    (même `key`) à une requête en file ou en cours la rejoint au lieu d'appeler
+    une seconde fois le modèle.
+    """
+
+    def __init__(self, workers=None, lane_limits=None, history=50):
+        self.workers = workers or default_workers()
+        self.lane_limits = dict(lane_limits or {})
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._running = {}
+        self._inflight = {}
+        self._waits = deque(maxlen=history)
+        self._order = itertools.count()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, daemon=True, name=f"scheduler-{i}")
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, lane, run, priority=QUESTION, key=None):
+        """
+        Met `run(callbacks)` en file et retourne son ScheduledCall (celui de la
+        requête déjà en cours si `key` est identique).
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ordonnanceur arrêté")
+            if key is not None:
+                call = self._inflight.get(key)
+                if call is not None:
+                    call.subscribers += 1
+                    # La requête rejointe prend la priorité la plus haute des deux
+                    call.priority = min(call.priority, priority)
+                    return call
+            call = ScheduledCall(self, lane, run, priority, key)
+            call.order = next(self._order)
+            self._queues.setdefault(lane, []).append(call)
+            if key is not None:
+                self._inflight[key] = call
+            self._cond.notify()
+        return call
+
+    def cancel(self, call):
+        """
+        Retire une requête de la file ou interrompt sa génération. Une requête
+        partagée (dédoublonnée) n'est annulée qu'au départ de son dernier demandeur.
+        """
+        with self._cond:
+            if call.finished.is_set():
+                return False
+            call.subscribers -= 1
+            if call.subscribers > 0:
+                return False
+            if call.state == "queued":
+                self._queues[call.lane].remove(call)
+                self._forget(call)
+                call.state = "cancelled"
+                call._finish({"type": "stopped"})
+                call.finished.set()
+                return True
+            self._forget(call)  # une nouvelle demande identique ne rejoint pas un appel interrompu
+        call.stop_event.set()
+        return True
+
+    def stats(self, lanes=None):
+        """
+        Requêtes en file et en cours, attente de la plus ancienne requête en file,
+        attente moyenne des dernières requêtes démarrées (secondes), pour les voies
+        indiquées (toutes si None).
+        """
+        now = time.monotonic()
+        with self._cond:
+            names = set(self._queues) | set(self._running) if lanes is None else set(lanes)
+            queued = [call for lane in names for call in self._queues.get(lane, [])]
+            waits = [wait for lane, wait in self._waits if lane in names]
+            return {
+                "workers": self.workers,
+                "queued": len(queued),
+                "running": sum(self._running.get(lane, 0) for lane in names),
+                "oldest_wait": max((now - call.submitted_at for call in queued), default=0.0),
+                "average_wait": sum(waits) / len(waits) if waits else 0.0,
+            }
+
+    def shutdown(self):
+        """
+        Annule les requêtes en file et arrête les workers après leur requête en cours.
+        """
+        with self._cond:
+            self._closed = True
+            pending = [call for calls in self._queues.values() for call in calls]
+            for call in pending:
+                call.subscribers = 1
+                self.cancel(call)
+            self._cond.notify_all()
+
+    # ---- Interne
+    def _next(self):
+        best = None
+        for lane, calls in self._queues.items():
+            if not calls or self._running.get(lane, 0) >= self.lane_limits.get(lane, self.workers):
+                continue
+            call = min(calls, key=lambda c: (c.priority, c.order))
+            if best is None or (call.priority, call.order) < (best.priority, best.order):
+                best = call
+        return best
+
+    def _work(self):
+        while True:
+            with self._cond:
+                call = self._next()
+                while call is None and not self._closed:
+                    self._cond.wait()
+                    call = self._next()
+                if call is None:
+                    return
+                self._queues[call.lane].remove(call)
+                self._running[call.lane] = self._running.get(call.lane, 0) + 1
+                call.state = "running"
+                self._waits.append((call.lane, time.monotonic() - call.submitted_at))
+            try:
+                call._execute()
+            finally:
+                with self._cond:
+                    self._running[call.lane] -= 1
+                    self._forget(call)
+                    self._cond.notify_all()
+
+    def _forget(self, call):
+        if call.key is not None and self._inflight.get(call.key) is call:
+            del self._inflight[call.key]
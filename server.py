@@ -0,0 +1,121 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# -------------------------------
+# API HTTP locale : plusieurs clients, un seul moteur (chroma_db et modèles déjà chargés)
+#   GET  /health
+#   POST /ingest     {"path": "doc.pdf"}
+#   POST /ask        {"pdf" | "collection": ... | "corpus": true, "model": ..., "question": ...}
+#   POST /summarize  {"pdf" | "collection": ..., "model": ...}
+# -------------------------------
+class BadRequest(Exception):
+    """
+    Requête invalide (champ manquant, JSON mal formé) : réponse 400.
+    """
+
+
+def _require(body, *fields):
+    missing = [f for f in fields if not body.get(f)]
+    if missing:
+        raise BadRequest(f"champ(s) manquant(s) : {', '.join(missing)}")
+
+
+def _vectorstore(engine, body):
+    if not body.get("pdf") and not body.get("collection"):
+        raise BadRequest("indiquer 'pdf' ou 'collection'")
+    return engine.vectorstore_for(pdf_path=body.get("pdf"), collection=body.get("collection"))
+
+
+def handle_ingest(engine, body):
+    _require(body, "path")
+    result = engine.ingest(body["path"])
+    return {k: v for k, v in result.items() if k != "vectorstore"}
+
+
+def handle_ask(engine, body):
+    _require(body, "model", "question")
+    if body.get("corpus"):
+        return engine.ask_corpus(body["model"], body["question"], k=int(body.get("k", 4)))
+    return engine.ask(_vectorstore(engine, body), body["model"], body["question"])
+
+
+def handle_summarize(engine, body):
+    _require(body, "model")
+    return {"summary": engine.summarize(_vectorstore(engine, body), body["model"])}
+
+
+ROUTES = {
+    "/ingest": handle_ingest,
+    "/ask": handle_ask,
+    "/summarize": handle_summarize,
+}
+
+
+def make_server(engine, host="127.0.0.1", port=8765, metrics=False):
+    """
+    Serveur multi-thread (un thread par requête) partageant `engine`. Avec
+    `metrics`, GET /metrics expose les durées par étape au format Prometheus.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if metrics and self.path == "/metrics":
+                return self._send_text(200, engine.tracer.render_prometheus())
+            if self.path != "/health":
+                return self._send(404, {"error": "route inconnue"})
+            self._send(200, {"status": "ok", "documents": len(engine.registry.entries())})
+
+        def do_POST(self):
+            route = ROUTES.get(self.path)
+            if route is None:
+                return self._send(404, {"error": "route inconnue"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    raise BadRequest("JSON invalide")
+                if not isinstance(body, dict):
+                    raise BadRequest("un objet JSON est attendu")
+                self._send(200, route(engine, body))
+            except BadRequest as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+
+        def _send(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_text(self, status, text):
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(engine, host="127.0.0.1", port=8765, metrics=False):
+    server = make_server(engine, host, port, metrics)
+    print(f"API disponible sur http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
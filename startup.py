@@ -0,0 +1,101 @@
+import re
+import subprocess
+import sys
+import threading
+
+
+# -------------------------------
+# Démarrage rapide : chargement différé et mesure du temps de démarrage
+# -------------------------------
+# Objectifs : `import main` sans LangChain, Chroma ni PyMuPDF, et fenêtre affichée
+# avant la fin du chargement du moteur
+IMPORT_TARGET = 0.3
+WINDOW_TARGET = 0.5
+
+
+class LazyValue:
+    """
+    Valeur coûteuse à construire (moteur RAG, modules lourds). start() la
+    construit dans un thread de fond ; get() attend ce thread, ou la construit
+    sur place si rien n'a été lancé. Une erreur de construction est relevée par get().
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._started = False
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def get(self):
+        with self._lock:
+            run_here = not self._started
+            self._started = True
+        if run_here:
+            self._run()
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def ready(self):
+        return self._done.is_set()
+
+    def _run(self):
+        try:
+            self._value = self.factory()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_report(module="main", top=15):
+    """
+    Mesure `import module` dans un interpréteur neuf (python -X importtime).
+    Retourne (durée en secondes, [(durée cumulée en secondes, nom)] des `top`
+    imports directs du module les plus coûteux).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} impossible :\n{result.stderr.strip()[-2000:]}")
+    total = 0.0
+    direct = []
+    pending = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 1e6
+        depth = (len(match.group(3)) - 1) // 2
+        if depth == 1:
+            pending.append((cumulative, match.group(4)))
+        elif depth == 0:
+            # Les imports directs d'un module précèdent sa propre ligne dans la sortie
+            if match.group(4) == module:
+                total, direct = cumulative, pending
+            pending = []
+    return total, sorted(direct, reverse=True)[:top]
+
+
+def format_report(total, ranked, target=IMPORT_TARGET):
+    lines = [f"import main : {total * 1000:.0f} ms (objectif {target * 1000:.0f} ms)"
+             + ("" if total <= target else " - AU-DELÀ DE L'OBJECTIF")]
+    for seconds, name in ranked:
+        lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# -------------------------------
+# Génération en flux : tokens poussés d'un thread vers l'interface
+# -------------------------------
+class GenerationStopped(Exception):
+    """
+    Levée dans le thread de génération quand l'utilisateur demande l'arrêt.
+    """
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """
+    Callback LangChain qui dépose chaque nouveau token dans une file. Lever une
+    exception depuis on_llm_new_token interrompt la requête en cours.
+    """
+
+    raise_error = True
+
+    def __init__(self, call):
+        self.call = call
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.call.stop_event.is_set():
+            raise GenerationStopped()
+        if self.call.first_token_at is None:
+            self.call.first_token_at = time.monotonic()
+        self.call.events.put({"type": "token", "text": token})
+
+
+class StreamingCall:
+    """
+    Exécute `run(callbacks)` (typiquement chain.run(..., callbacks=callbacks))
+    dans un thread. Les tokens arrivent dans `self.events` au fil de la
+    génération, suivis d'un événement final : done, stopped ou error.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.events = queue.Queue()
+        self.stop_event = threading.Event()
+        self.started_at = None
+        self.first_token_at = None
+        self.outcome = None  # événement final, une fois l'appel terminé
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    def drain(self):
+        """
+        Vide la file : retourne (texte des tokens reçus, événement final ou None).
+        Les tokens sont concaténés pour une seule mise à jour de l'interface.
+        """
+        tokens = []
+        final = None
+        while final is None:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event["type"] == "token":
+                tokens.append(event["text"])
+            else:
+                final = event
+        return "".join(tokens), final
+
+    def _run(self):
+        try:
+            result = self.run([TokenQueueHandler(self)])
+        except GenerationStopped:
+            self._finish({"type": "stopped"})
+        except Exception as e:
+            if self.stop_event.is_set():
+                self._finish({"type": "stopped"})
+            else:
+                self._finish({"type": "error", "error": e})
+        else:
+            self._finish({"type": "done", "text": result})
+
+    def _finish(self, event):
+        self.outcome = event
+        self.events.put(event)
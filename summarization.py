@@ -0,0 +1,148 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chunking import estimate_tokens
+
+
+# -------------------------------
+# Résumé map-reduce des PDF, avec cache des résumés intermédiaires
+# -------------------------------
+MAP_PROMPT = """Vous êtes un assistant.
+Voici un extrait d'un document PDF (page {page}).
+Résumez-le en quelques phrases, sans perdre les informations importantes.
+
+{text}
+
+Résumé de l'extrait :
+"""
+
+REDUCE_PROMPT = """Vous êtes un assistant.
+Voici des résumés partiels successifs d'un document PDF.
+Fusionnez-les en un résumé unique, cohérent et synthétique.
+
+{text}
+
+Résumé :
+"""
+
+
+class SummaryCache:
+    """
+    Cache SQLite des résumés, clé = hash (modèle, prompt complet).
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(model_name, prompt):
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                (key, summary, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def load_chunks(vectorstore, page_size=500):
+    """
+    Lit tous les morceaux d'une collection, dans l'ordre du document
+    (page puis offset), sans passer par une recherche vectorielle.
+    """
+    chunks = []
+    offset = 0
+    while True:
+        batch = vectorstore.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        chunks.extend(zip(batch["documents"], batch["metadatas"]))
+        if len(batch["documents"]) < page_size:
+            break
+        offset += page_size
+    chunks.sort(key=lambda c: ((c[1] or {}).get("page", 0), (c[1] or {}).get("start_index", 0)))
+    return chunks
+
+
+class SummaryEngine:
+    """
+    Résumé hiérarchique : chaque morceau est résumé en parallèle (map), puis les
+    résumés sont regroupés sous `reduce_budget` tokens et fusionnés, niveau par
+    niveau, jusqu'à tenir dans un seul appel (reduce). Chaque résumé, partiel ou
+    fusionné, est mis en cache : une nouvelle demande, ou une demande après une
+    petite modification du PDF, ne rappelle le modèle que pour ce qui a changé.
+    `run_llm(prompt)` remplace l'appel direct llm.invoke(prompt) (ordonnanceur).
+    """
+
+    def __init__(self, llm, model_name, cache, reduce_budget=3000, max_workers=4, run_llm=None):
+        self.llm = llm
+        self.run_llm = run_llm or llm.invoke
+        self.model_name = model_name
+        self.cache = cache
+        self.reduce_budget = reduce_budget
+        self.max_workers = max_workers
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def summarize(self, vectorstore):
+        chunks = load_chunks(vectorstore)
+        if not chunks:
+            return ""
+        summaries = self._run_all([
+            MAP_PROMPT.format(page=(meta or {}).get("page", "?"), text=text)
+            for text, meta in chunks
+        ])
+        # Réduction hiérarchique jusqu'à un seul résumé
+        while len(summaries) > 1:
+            groups = self._pack(summaries)
+            summaries = self._run_all([REDUCE_PROMPT.format(text="\n\n".join(g)) for g in groups])
+        return summaries[0]
+
+    def _pack(self, summaries):
+        """
+        Regroupe des résumés consécutifs sous le budget de tokens (au moins deux par groupe,
+        pour que chaque niveau réduise effectivement leur nombre).
+        """
+        groups = [[]]
+        tokens = 0
+        for summary in summaries:
+            size = estimate_tokens(summary)
+            if len(groups[-1]) >= 2 and tokens + size > self.reduce_budget:
+                groups.append([])
+                tokens = 0
+            groups[-1].append(summary)
+            tokens += size
+        return groups
+
+    def _run_all(self, prompts):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self._run, prompts))
+
+    def _run(self, prompt):
+        key = SummaryCache.key(self.model_name, prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        summary = self.run_llm(prompt).strip()
+        with self._lock:
+            self.llm_calls += 1
+        self.cache.put(key, summary)
+        return summary
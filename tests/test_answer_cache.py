@@ -0,0 +1,77 @@
+import time
+
+from answer_cache import AnswerCache, answer_scope
+
+
+class TopicEmbeddings:
+    """Embeddings fictifs : les questions sur le même sujet sont quasi identiques."""
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [1.0 if "garantie" in text else 0.0, 1.0 if "batterie" in text else 0.0, 0.05]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+SCOPE = answer_scope("pdf-abc", "llama3", "template {context} {question}")
+
+
+def test_exact_hit_and_scope(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    cache.store(SCOPE, "Quelle est la garantie ?", ["c1", "c2"], "Deux ans.")
+    assert cache.lookup(SCOPE, "quelle est  la garantie ?", ["c2", "c1"]) == ("Deux ans.", "exact")
+    # Autres morceaux retrouvés (collection modifiée) ou autre modèle : pas de réponse
+    assert cache.lookup(SCOPE, "Quelle est la garantie ?", ["c3"]) is None
+    other = answer_scope("pdf-abc", "mistral", "template {context} {question}")
+    assert cache.lookup(other, "Quelle est la garantie ?", ["c1", "c2"]) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_semantic_hit_for_paraphrase(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), embeddings=TopicEmbeddings())
+    cache.store(SCOPE, "Quelle est la durée de la garantie ?", ["c1", "c2"], "Deux ans.")
+    assert cache.lookup(SCOPE, "Combien de temps dure la garantie ?", ["c1", "c2"]) == ("Deux ans.", "semantic")
+    assert cache.lookup(SCOPE, "Comment changer la batterie ?", ["c1", "c2"]) is None
+
+
+def test_ttl_and_persistence(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    cache = AnswerCache(path)
+    cache.store(SCOPE, "q", ["c1"], "r")
+    cache.close()
+
+    assert AnswerCache(path).lookup(SCOPE, "q", ["c1"]) == ("r", "exact")
+    expired = AnswerCache(path, ttl=0)
+    time.sleep(0.01)
+    assert expired.lookup(SCOPE, "q", ["c1"]) is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_entries=2)
+    cache.store(SCOPE, "q1", ["c"], "r1")
+    cache.store(SCOPE, "q2", ["c"], "r2")
+    cache.lookup(SCOPE, "q1", ["c"])
+    cache.store(SCOPE, "q3", ["c"], "r3")
+    assert cache.lookup(SCOPE, "q2", ["c"]) is None
+    assert cache.lookup(SCOPE, "q1", ["c"]) is not None
+
+
+def test_question_is_embedded_once_per_request(tmp_path):
+    """Consultation puis mise en cache d'une question non servie : un seul embedding."""
+    calls = []
+
+    class CountingEmbeddings(TopicEmbeddings):
+        def embed_query(self, text):
+            calls.append(text)
+            return super().embed_query(text)
+
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), embeddings=CountingEmbeddings())
+    cache.store(SCOPE, "Quelle est la durée de la garantie ?", ["c1", "c2"], "Deux ans.")
+    calls.clear()
+    query = cache.query_vector("Comment changer la batterie ?")
+    assert cache.lookup(SCOPE, "Comment changer la batterie ?", ["c1", "c2"], query=query) is None
+    cache.store(SCOPE, "Comment changer la batterie ?", ["c1", "c2"], "Dévisser le capot.", query=query)
+    assert calls == ["Comment changer la batterie ?"]
+    # Le vecteur stocké sert bien la couche sémantique
+    assert cache.lookup(SCOPE, "Changer la batterie ?", ["c1", "c2"]) == ("Dévisser le capot.", "semantic")
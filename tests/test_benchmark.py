@@ -0,0 +1,69 @@
+import json
+import urllib.request
+
+import fitz
+import pytest
+
+from benchmarks.bench import compare, generate_pdf, make_questions, percentile, run_size
+from benchmarks.fake_ollama import FakeOllama, fake_vector
+
+
+@pytest.fixture
+def fake():
+    server = FakeOllama(embed_latency=0, embed_item_latency=0, first_token_latency=0.01,
+                        token_latency=0, tokens=5).start()
+    yield server
+    server.stop()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return response.read().decode()
+
+
+def test_fake_ollama_is_deterministic(fake):
+    first = json.loads(post(fake.url + "/api/embed", {"model": "m", "input": ["a", "b"]}))
+    second = json.loads(post(fake.url + "/api/embed", {"model": "m", "input": ["a"]}))
+    assert first["embeddings"][0] == second["embeddings"][0] == fake_vector("a")
+    assert fake.counts["embedded"] == 3
+
+    stream = [json.loads(line) for line in post(fake.url + "/api/generate", {"model": "m", "prompt": "q"}).splitlines()]
+    assert len(stream) == 6 and stream[-1]["done"]
+    again = post(fake.url + "/api/generate", {"model": "m", "prompt": "q"})
+    assert [json.loads(line)["response"] for line in again.splitlines()] == [c["response"] for c in stream]
+
+
+def test_generated_pdf_and_questions_are_reproducible(tmp_path):
+    generate_pdf(str(tmp_path / "a.pdf"), 3)
+    generate_pdf(str(tmp_path / "b.pdf"), 3)
+    with fitz.open(str(tmp_path / "a.pdf")) as a, fitz.open(str(tmp_path / "b.pdf")) as b:
+        assert a.page_count == 3
+        assert [p.get_text() for p in a] == [p.get_text() for p in b]
+    assert make_questions(5) == make_questions(5)
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([1, 2, 3, 4, 5], 95) == pytest.approx(4.8)
+
+
+def test_compare_flags_regressions_in_the_right_direction():
+    baseline = {"results": {"10": {"pages_per_sec": 100, "query_p50": 0.2, "ttft_p50": 0.1}}}
+    results = [{"pages": 10, "pages_per_sec": 70, "query_p50": 0.21, "ttft_p50": 0.05, "peak_rss_mb": 50}]
+    rows = {row[1]: row for row in compare(results, baseline, tolerance=0.2)}
+    assert rows["pages_per_sec"][5]        # 30 % plus lent
+    assert not rows["query_p50"][5]        # +5 % : toléré
+    assert not rows["ttft_p50"][5]         # plus rapide
+    assert rows["peak_rss_mb"][3] is None and not rows["peak_rss_mb"][5]
+
+
+def test_run_size_end_to_end(fake, tmp_path, monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", fake.url)  # restauré après le test
+    result = run_size(3, str(tmp_path), fake.url, questions=3, summarize_max_pages=3)
+    assert result["pages"] == 3 and result["chunks"] > 0
+    assert result["pages_per_sec"] > 0 and result["embeddings_per_sec"] > 0
+    assert 0 < result["ttft_p50"] <= result["query_p50"]
+    assert result["summary_seconds"] is not None
+    assert fake.counts["generate_requests"] >= 3
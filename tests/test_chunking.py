@@ -0,0 +1,57 @@
+from langchain.docstore.document import Document
+
+from chunking import TokenChunker, estimate_tokens, is_heading
+
+
+def make_page(text, page=1):
+    return Document(page_content=text, metadata={"source": "doc.pdf", "page": page})
+
+
+def test_is_heading():
+    assert is_heading("1.2 Installation")
+    assert is_heading("CONSIGNES DE SÉCURITÉ")
+    assert not is_heading("Le moteur démarre lorsque la clé est tournée.")
+
+
+def test_chunks_respect_budget_and_keep_offsets():
+    """Chaque morceau tient dans le budget et son offset pointe dans le texte de la page."""
+    text = " ".join(f"Phrase numéro {i} du manuel." for i in range(300))
+    page = make_page(text, page=7)
+    chunks = TokenChunker(chunk_tokens=100, overlap_tokens=20).split(page)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk.page_content) <= 110
+        start = chunk.metadata["start_index"]
+        assert text[start:start + len(chunk.page_content)] == chunk.page_content
+        assert chunk.metadata["page"] == 7
+    # Recouvrement : chaque morceau commence avant la fin du précédent
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.metadata["start_index"] < prev.metadata["start_index"] + len(prev.page_content)
+
+
+def test_headings_start_new_chunks():
+    """Un titre ouvre un nouveau morceau et est propagé dans les métadonnées."""
+    text = ("INTRODUCTION\nCe document présente le produit et ses usages principaux.\n\n"
+            "2. Installation\nBrancher l'appareil puis appuyer sur le bouton de mise en marche.")
+    chunks = TokenChunker(chunk_tokens=200, overlap_tokens=20).split(make_page(text))
+    assert [c.metadata["heading"] for c in chunks] == ["INTRODUCTION", "2. Installation"]
+    assert chunks[1].page_content.startswith("2. Installation")
+
+
+def test_near_empty_pages_are_skipped():
+    assert TokenChunker().split(make_page("  12 \n")) == []
+
+
+def test_overlap_reaches_into_long_paragraphs():
+    """Paragraphes plus longs que le recouvrement : leurs dernières phrases sont reprises."""
+    paragraph = " ".join(f"La pompe {i} alimente le circuit secondaire du bâtiment." for i in range(12))
+    text = "\n\n".join(f"Section {n} : {paragraph}" for n in range(12))
+    chunks = TokenChunker().split(make_page(text))
+
+    assert len(chunks) > 2
+    for prev, nxt in zip(chunks, chunks[1:]):
+        prev_end = prev.metadata["start_index"] + len(prev.page_content)
+        shared = prev_end - nxt.metadata["start_index"]
+        assert 0 < estimate_tokens(text[nxt.metadata["start_index"]:prev_end]) <= 40 and shared > 0
+        assert nxt.page_content.startswith("La pompe")  # reprise sur une frontière de phrase
@@ -0,0 +1,114 @@
+import io
+import json
+import os
+
+import pytest
+
+import cli
+
+
+class FakeEngine:
+    """Moteur factice : enregistre les appels, sans Ollama ni Chroma."""
+
+    def __init__(self):
+        self.ingested = []
+        self.opened = []
+        self.warmed = []
+
+    def warm_up(self, *models):
+        self.warmed.extend(models)
+
+    def ingest(self, pdf_path):
+        if "broken" in pdf_path:
+            raise ValueError("aucun texte exploitable dans ce PDF")
+        self.ingested.append(pdf_path)
+        return {"path": pdf_path, "collection": "pdf-abc", "attached": False,
+                "chunks": 3, "pages": 1, "vectorstore": object()}
+
+    def vectorstore_for(self, pdf_path=None, collection=None):
+        self.opened.append((pdf_path, collection))
+        return (pdf_path, collection)
+
+    def ask(self, vectorstore, model, question):
+        return {"question": question, "answer": f"{model}:{vectorstore[0] or vectorstore[1]}",
+                "cached": None, "sources": []}
+
+    def summarize(self, vectorstore, model):
+        return f"résumé de {vectorstore[0] or vectorstore[1]}"
+
+
+def run(argv, engine):
+    out = io.StringIO()
+    code = cli.main(argv, engine=engine, out=out)
+    return code, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_find_pdfs_walks_directories(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ["b.pdf", "a.PDF", "notes.txt", "sub/c.pdf"]:
+        (tmp_path / name).write_bytes(b"%PDF")
+    found = cli.find_pdfs([str(tmp_path), "single.pdf"])
+    names = [p.replace(str(tmp_path), "").lstrip("/\\") for p in found]
+    assert names == ["a.PDF", "b.pdf", os.path.join("sub", "c.pdf"), "single.pdf"]
+
+
+def test_ingest_reports_each_pdf_and_errors(tmp_path):
+    for name in ["ok.pdf", "broken.pdf"]:
+        (tmp_path / name).write_bytes(b"%PDF")
+    engine = FakeEngine()
+    code, records = run(["ingest", str(tmp_path), "--workers", "2"], engine)
+    assert code == 1
+    assert [r.get("error") for r in records] == ["aucun texte exploitable dans ce PDF", None]
+    assert records[1]["chunks"] == 3 and "vectorstore" not in records[1]
+
+
+def test_ask_jsonl_questions_in_order(tmp_path):
+    questions = tmp_path / "q.jsonl"
+    questions.write_text(
+        '"Première ?"\n\n{"question": "Deuxième ?", "pdf": "autre.pdf", "model": "m2"}\n',
+        encoding="utf-8"
+    )
+    engine = FakeEngine()
+    code, records = run(["ask", "--pdf", "doc.pdf", "--model", "m1", "--questions", str(questions),
+                         "Zéro ?"], engine)
+    assert code == 0
+    assert [r["question"] for r in records] == ["Zéro ?", "Première ?", "Deuxième ?"]
+    assert [r["answer"] for r in records] == ["m1:doc.pdf", "m1:doc.pdf", "m2:autre.pdf"]
+    # Chaque PDF n'est ouvert qu'une fois ; chaque modèle est préchargé une fois
+    assert sorted(engine.opened) == [("autre.pdf", None), ("doc.pdf", None)]
+    assert engine.warmed == ["m1", "m2"]
+
+
+def test_ask_requires_a_target():
+    with pytest.raises(SystemExit):
+        run(["ask", "--model", "m", "Question ?"], FakeEngine())
+
+
+def test_summarize_collections_and_pdfs():
+    code, records = run(["summarize", "doc.pdf", "--collection", "pdf-abc", "--model", "m"], FakeEngine())
+    assert code == 0
+    assert records == [{"pdf": "doc.pdf", "summary": "résumé de doc.pdf"},
+                       {"collection": "pdf-abc", "summary": "résumé de pdf-abc"}]
+
+
+def test_ask_corpus():
+    class CorpusEngine(FakeEngine):
+        def ask_corpus(self, model, question, k=5):
+            return {"question": question, "answer": f"{model}:corpus:{k}",
+                    "citations": ["a.pdf, p. 1"]}
+
+    engine = CorpusEngine()
+    code, records = run(["ask", "--corpus", "--k", "8", "--model", "m", "Où ?"], engine)
+    assert code == 0
+    assert records == [{"question": "Où ?", "answer": "m:corpus:8", "citations": ["a.pdf, p. 1"]}]
+    assert engine.opened == []
+
+
+def test_trace_log_is_closed_after_the_command(tmp_path):
+    from tracing import logger
+
+    handlers = list(logger.handlers)
+    path = tmp_path / "traces.jsonl"
+    code, records = run(["--trace-log", str(path), "summarize", "doc.pdf", "--model", "m"], FakeEngine())
+    assert code == 0 and records[0]["summary"] == "résumé de doc.pdf"
+    assert path.exists() and logger.handlers == handlers
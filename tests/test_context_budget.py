@@ -0,0 +1,116 @@
+from langchain.docstore.document import Document
+
+from benchmarks.bench import generate_pdf
+from benchmarks.fake_ollama import FakeOllama
+from chunking import TokenChunker
+from context_budget import FALLBACK_WINDOW, ContextBudget, ModelContext, dedupe_chunks, parse_show
+
+
+class FixedContext:
+    """Fenêtre fixe, 4 caractères par token."""
+
+    def __init__(self, window):
+        self._window = window
+
+    def window(self, model):
+        return self._window
+
+    def count(self, text, model=None):
+        return -(-len(text.strip()) // 4)
+
+
+def test_model_context_reads_and_caches_window(tmp_path):
+    assert parse_show({"parameters": "num_ctx 2048\nstop \"<|eot|>\"",
+                       "model_info": {"llama.context_length": 131072}}) == (2048, 131072)
+    assert parse_show({"model_info": {"qwen2.context_length": 32768}}, default_num_ctx=4096) == (4096, 32768)
+    assert parse_show({"model_info": {"phi.context_length": 2048}}, default_num_ctx=8192) == (2048, 2048)
+
+    fake = FakeOllama(context_length=32768, num_ctx=16384).start()
+    try:
+        path = str(tmp_path / "model_context.json")
+        assert ModelContext(path, base_url=fake.url).window("bench-llm") == 16384
+        # Relu depuis le fichier : pas de second appel à /api/show
+        assert ModelContext(path, base_url=fake.url).window("bench-llm") == 16384
+        assert fake.counts["show_requests"] == 1
+        # Modèle inconnu : fenêtre prudente, redemandée plus tard
+        context = ModelContext(path, base_url=fake.url, retry_after=0)
+        assert context.window("absent") == FALLBACK_WINDOW
+        fake.models.append("absent")
+        assert context.window("absent") == 16384
+    finally:
+        fake.stop()
+
+
+def test_model_context_calibrates_token_count(tmp_path):
+    context = ModelContext(str(tmp_path / "model_context.json"), base_url="http://127.0.0.1:9")
+    assert context.count("a" * 400, "m") == 100
+    context.observe("m", 300, 100)  # 3 caractères par token
+    assert context.count("a" * 400, "m") > 100
+    context.observe("autre", 4000, 100)  # cache KV : ratio plafonné
+    assert context.count("a" * 400, "autre") == 100
+    assert ModelContext(context.cache_path).chars_per_token("m") == context.chars_per_token("m")
+
+
+def test_dedupe_merges_overlapping_chunks():
+    # Paragraphes ordinaires, plus longs que le recouvrement
+    paragraph = " ".join(f"La vanne {i} règle le débit du circuit principal." for i in range(12))
+    page = Document(page_content="\n\n".join(f"Section {n} : {paragraph}" for n in range(6)),
+                    metadata={"source": "a.pdf", "page": 1})
+    chunks = TokenChunker().split(page)
+    assert len(chunks) >= 3 and chunks[1].metadata["start_index"] < chunks[0].metadata["start_index"] + \
+        len(chunks[0].page_content)
+    other = Document(page_content=chunks[0].page_content, metadata={"source": "b.pdf", "page": 1,
+                                                                    "start_index": 0})
+
+    docs, absorbed = dedupe_chunks([chunks[2], chunks[0], other, chunks[1], chunks[0]])
+    assert absorbed == 4
+    merged = docs[0]
+    start = merged.metadata["start_index"]
+    assert merged.page_content == page.page_content[start:start + len(merged.page_content)]
+    assert start == chunks[0].metadata["start_index"]
+    assert merged.page_content.endswith(chunks[2].page_content)
+    assert len(docs) == 1  # même texte dans b.pdf : doublon retiré
+
+
+def test_budget_packs_best_chunks_within_model_window():
+    docs = [Document(page_content=f"{name} " * size, metadata={"source": "a.pdf", "page": i})
+            for i, (name, size) in enumerate([("un", 100), ("long", 400), ("deux", 100), ("trois", 100)])]
+    template = "Extraits :\n{context}\nQuestion : {question}"
+
+    # Grand modèle : borné par max_tokens, le morceau trop long est sauté
+    packed, info = ContextBudget(FixedContext(32768), max_tokens=250, answer_tokens=100).fit(
+        "m", docs, template, "question ?")
+    assert [d.page_content.split()[0] for d in packed] == ["un", "deux"]
+    assert info["tokens"] <= info["budget"] == 250 and info["candidates"] == 4
+
+    # Petit modèle : borné par la fenêtre moins la réponse et le gabarit
+    budget = ContextBudget(FixedContext(250), max_tokens=1500, answer_tokens=200)
+    packed, info = budget.fit("m", docs, template, "question ?")
+    assert info["budget"] < 75 and info["tokens"] <= info["budget"]
+    assert len(packed) == 1 and packed[0].metadata["truncated"]  # meilleur morceau raccourci
+
+    # Les références du mode corpus comptent dans le budget
+    plain = ContextBudget(FixedContext(32768), max_tokens=1000).fit("m", docs, template, "q")[1]
+    corpus = ContextBudget(FixedContext(32768), max_tokens=1000).fit(
+        "m", docs, template, "q", "[{document}, p. {page}]\n{page_content}")[1]
+    assert corpus["tokens"] > plain["tokens"]
+
+
+def test_engine_fits_question_context_to_model(tmp_path, monkeypatch):
+    fake = FakeOllama(embed_latency=0, embed_item_latency=0, first_token_latency=0, token_latency=0,
+                      tokens=3, num_ctx=1024).start()
+    monkeypatch.setenv("OLLAMA_HOST", fake.url)
+    try:
+        from engine import RAGEngine
+        engine = RAGEngine(str(tmp_path / "chroma_db"))
+        pdf = generate_pdf(str(tmp_path / "doc.pdf"), 6, seed=3)
+        vectorstore = engine.ingest(pdf)["vectorstore"]
+        prepared = engine.prepare_question(engine.qa_chain(vectorstore, "bench-llm"),
+                                           vectorstore._collection.name, "bench-llm", "Que dit la section 2 ?")
+        span = next(s for s in prepared.trace.spans if s["span"] == "context_budget")
+        assert span["window"] == 1024 and span["tokens"] <= span["budget"] < 1024 - 512
+        assert span["candidates"] == 8 and span["docs"] == len(prepared.docs) < 8
+        prepared.generate()
+        assert engine.context.chars_per_token("bench-llm") < 4
+    finally:
+        fake.stop()
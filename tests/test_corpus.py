@@ -0,0 +1,95 @@
+import time
+
+from langchain.docstore.document import Document
+
+from corpus import CorpusSearch, citation, with_document
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [1.0, 0.0]
+
+
+class FakeStore:
+    """Collection factice : renvoie des morceaux à des distances fixées."""
+
+    def __init__(self, name, distances, delay=0.0, fail=False):
+        self.name = name
+        self.distances = distances
+        self.delay = delay
+        self.fail = fail
+
+    def similarity_search_by_vector_with_relevance_scores(self, vector, k=4):
+        if self.fail:
+            raise RuntimeError("collection supprimée")
+        time.sleep(self.delay)
+        hits = [(Document(page_content=f"{self.name}-{i}",
+                          metadata={"source": f"/docs/{self.name}.pdf", "page": i + 1}), d)
+                for i, d in enumerate(self.distances)]
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+
+
+def make_search(stores, **kwargs):
+    opened = []
+
+    def open_collection(name):
+        opened.append(name)
+        return stores[name]
+
+    search = CorpusSearch(FakeEmbeddings(), open_collection, lambda: list(stores), **kwargs)
+    return search, opened
+
+
+def test_merges_top_k_by_distance_across_collections():
+    search, _ = make_search({
+        "a": FakeStore("a", [0.1, 0.5, 0.9]),
+        "b": FakeStore("b", [0.2, 0.3]),
+        "c": FakeStore("c", [0.8]),
+    })
+    hits = search.search("question", k=4)
+    assert [d.page_content for d, _ in hits] == ["a-0", "b-0", "b-1", "a-1"]
+    assert hits[0][0].metadata["collection"] == "a"
+    assert hits[0][0].metadata["document"] == "a.pdf"
+    assert search.embeddings.calls == 1
+
+
+def test_only_restricts_collections_and_stores_are_reused():
+    search, opened = make_search({"a": FakeStore("a", [0.5]), "b": FakeStore("b", [0.1])})
+    assert [d.page_content for d, _ in search.search("q", k=5, only={"a"})] == ["a-0"]
+    search.search("q", k=5)
+    search.search("q", k=5)
+    assert sorted(opened) == ["a", "b"]
+
+
+def test_failing_collection_is_skipped():
+    search, opened = make_search({"a": FakeStore("a", [0.5]), "b": FakeStore("b", [0.1], fail=True)})
+    assert [d.page_content for d, _ in search.search("q")] == ["a-0"]
+    # Rouverte une fois avant d'être ignorée
+    assert opened.count("b") == 2
+
+
+def test_collections_are_searched_in_parallel():
+    stores = {f"c{i}": FakeStore(f"c{i}", [0.1 * i], delay=0.1) for i in range(8)}
+    search, _ = make_search(stores, max_workers=8)
+    start = time.monotonic()
+    hits = search.search("q", k=3)
+    assert time.monotonic() - start < 0.5
+    assert [d.page_content for d, _ in hits] == ["c0-0", "c1-0", "c2-0"]
+
+
+def test_empty_corpus():
+    search, _ = make_search({})
+    assert search.search("q") == []
+    assert search.embeddings.calls == 0
+
+
+def test_citation_and_document_name():
+    search, _ = make_search({"rapport": FakeStore("rapport", [0.3, 0.1])})
+    [(doc, _)] = search.search("q", k=1)
+    assert citation(doc) == "rapport.pdf, p. 2"
+    other = with_document(Document(page_content="x", metadata={"source": "/a/b/notice.pdf", "page": 4}))
+    assert other.metadata["document"] == "notice.pdf"
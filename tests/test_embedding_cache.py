@@ -0,0 +1,53 @@
+from embedding_cache import CachedEmbeddings, embedding_key
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_embedding_key_ignores_whitespace():
+    """Les différences d'espaces ne changent pas la clé, mais le modèle oui."""
+    assert embedding_key("m", "a  b\n") == embedding_key("m", "a b")
+    assert embedding_key("m1", "a b") != embedding_key("m2", "a b")
+
+
+def test_cached_embeddings_only_embeds_misses(tmp_path):
+    """Un second passage ne recalcule que les textes nouveaux, et le cache survit à la réouverture."""
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, "m", str(tmp_path / "cache.sqlite3"))
+    first = cache.embed_documents(["alpha", "beta", "alpha"])
+    assert inner.calls == [["alpha", "beta"]]
+    assert first[0] == first[2]
+    cache.close()
+
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, "m", str(tmp_path / "cache.sqlite3"))
+    second = cache.embed_documents(["alpha", "gamma"])
+    assert inner.calls == [["gamma"]]
+    assert second[0] == first[0]
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_cached_embeddings_lru_eviction(tmp_path):
+    """Au-delà de max_entries, les entrées les moins récemment utilisées sont évincées."""
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, "m", str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.embed_documents(["a"])
+    cache.embed_documents(["b"])
+    cache.embed_documents(["a"])  # "a" redevient le plus récent
+    cache.embed_documents(["c"])
+    assert cache.stats()["entries"] == 2
+
+    inner.calls.clear()
+    cache.embed_documents(["a", "b", "c"])
+    assert inner.calls == [["b"]]
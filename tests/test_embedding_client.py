@@ -0,0 +1,130 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from embedding_client import OllamaEmbeddingClient, ollama_base_url
+
+
+class StubOllama:
+    """
+    Faux serveur Ollama local : /api/embed renvoie [len(texte), index], en
+    omettant les `missing` derniers vecteurs de chaque réponse.
+    """
+
+    def __init__(self, fail_first=0, missing=0):
+        self.fail_first = fail_first
+        self.missing = missing
+        self.batches = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    fail = stub.fail_first > 0
+                    stub.fail_first -= 1
+                    if not fail:
+                        stub.batches.append(body)
+                if fail:
+                    payload = b"{}"
+                    self.send_response(503)
+                else:
+                    vectors = [[float(len(t)), float(i)] for i, t in enumerate(body["input"])]
+                    vectors = vectors[:len(vectors) - stub.missing]
+                    payload = json.dumps({"embeddings": vectors}).encode()
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    yield server
+    server.close()
+
+
+def test_ollama_base_url(monkeypatch):
+    monkeypatch.delenv("OLLAMA_HOST", raising=False)
+    assert ollama_base_url() == "http://localhost:11434"
+    monkeypatch.setenv("OLLAMA_HOST", "0.0.0.0:1234")
+    assert ollama_base_url() == "http://0.0.0.0:1234"
+
+
+def test_embed_documents_batches_in_order(stub):
+    """Les lots partent en parallèle mais les vecteurs reviennent dans l'ordre des textes."""
+    client = OllamaEmbeddingClient("nomic-embed-text", base_url=stub.url, batch_size=3,
+                                   concurrency=2, target_latency=0)
+    texts = ["x" * i for i in range(1, 11)]
+    vectors = client.embed_documents(texts)
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert all(b["model"] == "nomic-embed-text" for b in stub.batches)
+    assert max(len(b["input"]) for b in stub.batches) <= 3
+    assert sum(len(b["input"]) for b in stub.batches) == 10
+    client.close()
+
+
+def test_batch_size_grows_when_fast(stub):
+    """Des lots rapides font grossir la taille de lot, bornée par max_batch_size."""
+    client = OllamaEmbeddingClient("m", base_url=stub.url, batch_size=2, max_batch_size=8,
+                                   concurrency=1, target_latency=60)
+    client.embed_documents(["t"] * 40)
+    assert client.batch_size == 8
+    assert [len(b["input"]) for b in stub.batches][:3] == [2, 3, 4]
+    client.close()
+
+
+def test_retry_with_backoff_on_server_errors():
+    """Des 503 transitoires sont rejoués et réduisent la taille des lots."""
+    server = StubOllama(fail_first=2)
+    try:
+        client = OllamaEmbeddingClient("m", base_url=server.url, batch_size=8, concurrency=1,
+                                       backoff=0.01, target_latency=60)
+        assert client.embed_query("abc") == [3.0, 0.0]
+        assert client.stats()["retries"] == 2
+        assert client.batch_size == 2
+        client.close()
+    finally:
+        server.close()
+
+
+def test_gives_up_after_max_retries():
+    server = StubOllama(fail_first=10)
+    try:
+        client = OllamaEmbeddingClient("m", base_url=server.url, max_retries=1, backoff=0.01)
+        with pytest.raises(requests.HTTPError):
+            client.embed_documents(["a", "b"])
+        client.close()
+    finally:
+        server.close()
+
+
+def test_rejects_reply_with_wrong_vector_count():
+    """Une réponse incomplète n'est jamais rattachée aux textes par décalage."""
+    server = StubOllama(missing=1)
+    try:
+        client = OllamaEmbeddingClient("m", base_url=server.url, batch_size=4, concurrency=1)
+        with pytest.raises(ValueError, match="3 vecteurs pour 4 textes"):
+            client.embed_documents(["a", "b", "c", "d"])
+        client.close()
+    finally:
+        server.close()
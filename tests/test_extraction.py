@@ -0,0 +1,119 @@
+import fitz  # PyMuPDF
+
+from extraction import ExtractionCache, count_pages, iter_pages
+
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Contenu de la page {i + 1}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_iter_pages_sequential(tmp_path):
+    pdf = make_pdf(tmp_path / "small.pdf", 3)
+    pages = list(iter_pages(pdf))
+    assert count_pages(pdf) == 3
+    assert [p.metadata["page"] for p in pages] == [1, 2, 3]
+    assert "Contenu de la page 2" in pages[1].page_content
+
+
+def test_iter_pages_process_pool_keeps_order(tmp_path):
+    """L'extraction parallèle par plages rend les pages dans l'ordre, comme la version séquentielle."""
+    pdf = make_pdf(tmp_path / "big.pdf", 40)
+    parallel = list(iter_pages(pdf, workers=2, pages_per_task=7, parallel_threshold=10))
+    sequential = list(iter_pages(pdf, workers=1))
+    assert [p.metadata["page"] for p in parallel] == list(range(1, 41))
+    assert [p.page_content for p in parallel] == [p.page_content for p in sequential]
+
+
+def make_layout_pdf(path):
+    """Titre, deux colonnes, un tableau à bordures, puis une page numérisée (image seule) et une page vide."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 50), "Manuel de maintenance de la pompe, édition complète", fontsize=11)
+    page.insert_textbox(fitz.Rect(50, 80, 280, 200), "\n".join(f"Gauche {i}." for i in range(4)), fontsize=10)
+    page.insert_textbox(fitz.Rect(320, 80, 550, 200), "\n".join(f"Droite {i}." for i in range(4)), fontsize=10)
+    rows = [["Code", "Pression", "Débit"], ["E-1001", "3 bar", "12 l/min"], ["E-2002", "5 bar", "20 l/min"]]
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            cell = fitz.Rect(50 + c * 120, 260 + r * 20, 170 + c * 120, 280 + r * 20)
+            page.draw_rect(cell, color=(0, 0, 0), width=0.8)
+            page.insert_text((cell.x0 + 4, cell.y1 - 6), value, fontsize=9)
+    scanned = doc.new_page()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), 0)
+    pixmap.clear_with(200)
+    scanned.insert_image(fitz.Rect(50, 50, 150, 150), pixmap=pixmap)
+    doc.new_page()
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_layout_keeps_reading_order_and_tables(tmp_path):
+    pdf = make_layout_pdf(tmp_path / "layout.pdf")
+    text = list(iter_pages(pdf))[0].page_content
+    # Colonne de gauche lue en entier avant celle de droite
+    assert text.index("Gauche 3.") < text.index("Droite 0.")
+    assert "Code | Pression | Débit\nE-1001 | 3 bar | 12 l/min" in text
+
+
+def test_empty_and_scanned_pages_are_flagged(tmp_path, monkeypatch):
+    pdf = make_layout_pdf(tmp_path / "layout.pdf")
+
+    def no_tesseract(self, **kwargs):
+        raise RuntimeError("OCR non disponible")
+    monkeypatch.setattr(fitz.Page, "get_textpage_ocr", no_tesseract)
+
+    pages = list(iter_pages(pdf, ocr="fra"))
+    assert pages[1].page_content == "" and pages[1].metadata["empty"] and pages[1].metadata["ocr_failed"]
+    assert pages[2].metadata["empty"] and "ocr_failed" not in pages[2].metadata  # pas d'image : pas d'OCR
+    # Sans OCR demandé, la page numérisée est seulement signalée vide
+    assert list(iter_pages(pdf))[1].metadata == {"source": pdf, "page": 2, "empty": True}
+
+
+def test_extraction_cache_skips_already_extracted_pages(tmp_path, monkeypatch):
+    import extraction
+
+    pdf = make_pdf(tmp_path / "doc.pdf", 20)
+    cache = ExtractionCache(str(tmp_path / "extraction.sqlite3"))
+    calls = []
+    extract_page = extraction.extract_page
+    monkeypatch.setattr(extraction, "extract_page", lambda page, ocr=None: calls.append(page.number) or
+                        extract_page(page, ocr))
+
+    first = [p.page_content for p in iter_pages(pdf, workers=1, pages_per_task=8, cache=cache)]
+    assert len(calls) == 20
+    second = [p.page_content for p in iter_pages(pdf, workers=1, pages_per_task=8, cache=cache)]
+    assert second == first and len(calls) == 20
+    # Même contenu sous un autre nom, extraction parallèle : tout vient du cache, sans pool de processus
+    copy = tmp_path / "copie.pdf"
+    copy.write_bytes(open(pdf, "rb").read())
+    monkeypatch.setattr(extraction, "ProcessPoolExecutor", None)
+    parallel = list(iter_pages(str(copy), workers=2, pages_per_task=7, parallel_threshold=10, cache=cache))
+    assert [p.page_content for p in parallel] == first
+    # Réglages différents (OCR) : nouvelle extraction
+    list(iter_pages(pdf, workers=1, cache=cache, ocr="fra"))
+    assert len(calls) == 40
+
+
+def test_failed_ocr_is_retried_instead_of_cached(tmp_path, monkeypatch):
+    pdf = make_layout_pdf(tmp_path / "layout.pdf")
+    cache = ExtractionCache(str(tmp_path / "extraction.sqlite3"))
+    calls = []
+
+    def flaky_ocr(self, **kwargs):
+        calls.append(self.number)
+        if len(calls) == 1:
+            raise RuntimeError("OCR non disponible")
+        return self.get_textpage()
+    monkeypatch.setattr(fitz.Page, "get_textpage_ocr", flaky_ocr)
+
+    assert list(iter_pages(pdf, ocr="fra", cache=cache))[1].metadata["ocr_failed"]
+    retried = list(iter_pages(pdf, ocr="fra", cache=cache))[1]
+    assert calls == [1, 1] and retried.metadata["ocr"] and "ocr_failed" not in retried.metadata
+    # Réussie, la page vient désormais du cache
+    assert list(iter_pages(pdf, ocr="fra", cache=cache))[1].metadata["ocr"] and calls == [1, 1]
@@ -0,0 +1,59 @@
+from langchain.docstore.document import Document
+
+from benchmarks.bench import generate_pdf
+from benchmarks.fake_ollama import FakeOllama
+from hybrid import HybridRetriever, coverage_rerank, reciprocal_rank_fusion
+
+
+def doc(text, page=1):
+    return Document(page_content=text, metadata={"page": page})
+
+
+def test_rrf_rewards_documents_found_by_both():
+    a, b, c = doc("a"), doc("b"), doc("c")
+    fused = reciprocal_rank_fusion([[a, b], [c, b]])
+    assert [d.page_content for d, _ in fused] == ["b", "a", "c"]
+
+
+def test_rrf_merges_same_chunk_from_both_searches():
+    # Même morceau retourné par Chroma et par l'index BM25 (métadonnées différentes)
+    vector = Document(page_content="x", metadata={"page": 2})
+    lexical = Document(page_content="x", metadata={"page": 2, "collection": "pdf-a"})
+    assert len(reciprocal_rank_fusion([[vector], [lexical]])) == 1
+
+
+def test_coverage_rerank_prefers_chunks_with_the_reference():
+    generic = doc("Procédure générale de maintenance de la pompe.")
+    exact = doc("Le code E-1042 indique un filtre bouché.", page=2)
+    reranked = coverage_rerank("code E-1042 pompe", [(generic, 0.03), (exact, 0.029)])
+    assert reranked[0][0] is exact
+
+
+def test_hybrid_retriever_returns_k_fused_documents():
+    chunks = [doc(f"morceau {i}", page=i) for i in range(6)]
+    retriever = HybridRetriever(
+        vector_search=lambda query, n: [(d, 0.1) for d in chunks[:4]][:n],
+        lexical_search=lambda query, n: [(d, 5.0) for d in reversed(chunks[2:])][:n],
+        k=2
+    )
+    result = retriever.invoke("question")
+    assert [d.page_content for d in result] == ["morceau 2", "morceau 3"]
+
+
+def test_existing_collection_gets_bm25_index_when_attached(tmp_path, monkeypatch):
+    """Collection indexée avant BM25 : rattrapée au chargement (thread d'ingestion)."""
+    fake = FakeOllama(embed_latency=0, embed_item_latency=0).start()
+    monkeypatch.setenv("OLLAMA_HOST", fake.url)
+    try:
+        from engine import RAGEngine
+        engine = RAGEngine(str(tmp_path / "chroma_db"))
+        pdf = generate_pdf(str(tmp_path / "doc.pdf"), 3, seed=5)
+        name = engine.ingest(pdf)["collection"]
+        engine.lexical.drop(name)
+        assert engine.lexical.count(name) == 0
+
+        result = engine.ingest(pdf)
+        assert result["attached"]
+        assert engine.lexical.count(name) == result["vectorstore"]._collection.count()
+    finally:
+        fake.stop()
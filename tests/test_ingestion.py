@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+
+from langchain.docstore.document import Document
+
+from ingestion import IngestionCancelled, IngestionJob, run_ingestion
+
+
+class DummyEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+class DummyStore:
+    """Store minimal : garde les lots reçus et signale finish/abort."""
+
+    def __init__(self):
+        self.batches = []
+        self.finished_pages = None
+        self.aborted = False
+
+    def add(self, docs, embedding):
+        embedding.embed_documents([d.page_content for d in docs])
+        self.batches.append(list(docs))
+
+    def finish(self, pages):
+        self.finished_pages = pages
+        return {"docs": [d for b in self.batches for d in b]}
+
+    def abort(self):
+        self.aborted = True
+
+
+def fake_extract(pdf_path):
+    for i in range(5):
+        yield Document(page_content=f"page {i}", metadata={"source": pdf_path, "page": i + 1})
+
+
+def test_run_ingestion_streams_batches_and_reports_progress():
+    """Les lots sont écrits au fil de l'extraction et la progression est publiée."""
+    events = []
+    embeddings = DummyEmbeddings()
+    store = DummyStore()
+    vectorstore, chunks, pages = run_ingestion("doc.pdf", fake_extract, embeddings, store,
+                                               report=events.append, batch_size=2,
+                                               count_pages=lambda path: 5)
+
+    assert (chunks, pages) == (5, 5)
+    assert len(vectorstore["docs"]) == 5
+    assert store.finished_pages == 5
+    assert [len(c) for c in embeddings.calls] == [2, 2, 1]
+    assert [e["pages"] for e in events] == [1, 2, 3, 4, 5, 5]
+    assert [e["chunks"] for e in events] == [0, 2, 2, 4, 4, 5]
+    assert events[-1]["total_pages"] == 5
+    assert events[-1]["eta"] == 0
+
+
+def test_run_ingestion_splits_each_page():
+    """Le découpage est appliqué page par page ; un PDF sans texte exploitable échoue."""
+    def split_in_two(page):
+        return [page, Document(page_content=page.page_content + " bis", metadata=page.metadata)]
+
+    _, chunks, pages = run_ingestion("doc.pdf", fake_extract, DummyEmbeddings(), DummyStore(),
+                                     split_document=split_in_two)
+    assert (chunks, pages) == (10, 5)
+
+    store = DummyStore()
+    with pytest.raises(ValueError):
+        run_ingestion("doc.pdf", fake_extract, DummyEmbeddings(), store,
+                      split_document=lambda page: [])
+    assert store.aborted
+
+
+def test_run_ingestion_attaches_existing_collection():
+    """Un PDF déjà indexé n'est ni extrait ni embeddé."""
+    embeddings = DummyEmbeddings()
+    vectorstore, chunks, pages = run_ingestion("doc.pdf", fake_extract, embeddings, DummyStore(),
+                                               attach_existing=lambda path: "existing")
+    assert (vectorstore, chunks, pages) == ("existing", None, None)
+    assert embeddings.calls == []
+
+
+def test_run_ingestion_cancelled_during_extraction():
+    """Une annulation entre deux pages interrompt l'ingestion et annule l'écriture."""
+    cancel_event = threading.Event()
+    embeddings = DummyEmbeddings()
+    store = DummyStore()
+
+    def extract_then_cancel(pdf_path):
+        yield Document(page_content="p1", metadata={"page": 1})
+        cancel_event.set()
+        yield Document(page_content="p2", metadata={"page": 2})
+
+    with pytest.raises(IngestionCancelled):
+        run_ingestion("doc.pdf", extract_then_cancel, embeddings, store,
+                      cancel_event=cancel_event)
+    assert embeddings.calls == []
+    assert store.aborted
+
+
+def test_ingestion_job_posts_done_event():
+    """Le thread de fond dépose un événement 'done' avec le vectorstore construit."""
+    job = IngestionJob("doc.pdf", fake_extract, DummyEmbeddings(), DummyStore()).start()
+    job.join(timeout=5)
+    events = []
+    while not job.events.empty():
+        events.append(job.events.get_nowait())
+    assert events[-1]["type"] == "done"
+    assert events[-1]["chunks"] == 5
+
+
+def test_ingestion_job_cancel():
+    """Annuler un job avant son démarrage produit un événement 'cancelled'."""
+    job = IngestionJob("doc.pdf", fake_extract, DummyEmbeddings(), DummyStore())
+    job.cancel()
+    job.start().join(timeout=5)
+    events = []
+    while not job.events.empty():
+        events.append(job.events.get_nowait())
+    assert events[-1]["type"] == "cancelled"
+
+
+def test_run_ingestion_records_a_trace():
+    """Extraction cumulée, écriture de chaque lot, trace close avec le résultat."""
+    from tracing import Tracer
+
+    tracer = Tracer()
+    run_ingestion("doc.pdf", fake_extract, DummyEmbeddings(), DummyStore(), batch_size=2,
+                  trace=tracer.trace("ingest"))
+    last = tracer.last()
+    assert (last["pages"], last["chunks"]) == (5, 5)
+    assert [s["span"] for s in last["spans"]].count("store") == 3
+    assert [s for s in last["spans"] if s["span"] == "extract"][0]["items"] == 5
+
+    with pytest.raises(ValueError):
+        run_ingestion("doc.pdf", fake_extract, DummyEmbeddings(), DummyStore(),
+                      split_document=lambda page: [], trace=tracer.trace("ingest"))
+    assert tracer.last()["error"] == "ValueError"
@@ -0,0 +1,50 @@
+from langchain.docstore.document import Document
+
+from lexical import LexicalIndex, tokenize
+
+
+def docs(*texts):
+    return [Document(page_content=t, metadata={"page": i + 1}) for i, t in enumerate(texts)]
+
+
+def test_tokenize_keeps_references_whole_and_split():
+    assert tokenize("Erreur E-1042 sur la pièce AB/77.") == [
+        "erreur", "e-1042", "e", "1042", "sur", "la", "pièce", "ab/77", "ab", "77"
+    ]
+
+
+def test_bm25_ranks_exact_reference_first(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lex.sqlite3"))
+    chunks = docs(
+        "La pompe affiche l'erreur E-1042 quand le filtre est bouché.",
+        "Remplacer la pompe tous les ans. Voir erreur E-1043.",
+        "Garantie et conditions générales de vente.",
+    )
+    assert index.add("pdf-a", chunks, ["c1", "c2", "c3"]) == 3
+    hits = index.search("que signifie E-1042 ?", k=2)
+    assert hits[0][0].page_content == chunks[0].page_content
+    assert hits[0][0].metadata == {"page": 1, "collection": "pdf-a"}
+    assert hits[0][1] > (hits[1][1] if len(hits) > 1 else 0)
+
+
+def test_add_is_incremental_and_remove_drop(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lex.sqlite3"))
+    index.add("pdf-a", docs("alpha", "beta"), ["c1", "c2"])
+    assert index.add("pdf-a", docs("alpha", "beta", "gamma"), ["c1", "c2", "c3"]) == 1
+    assert index.count("pdf-a") == 3
+    index.remove("pdf-a", ["c2"])
+    assert index.search("beta") == []
+    index.drop("pdf-a")
+    assert index.count("pdf-a") == 0
+
+
+def test_search_restricted_to_collections(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lex.sqlite3"))
+    index.add("pdf-a", docs("moteur diesel"), ["c1"])
+    index.add("pdf-b", docs("moteur électrique"), ["c1"])
+    assert [d.metadata["collection"] for d, _ in index.search("moteur", collections=["pdf-b"])] == ["pdf-b"]
+    assert len(index.search("moteur")) == 2
+    assert index.search("moteur", collections=[]) == []
+    # Persisté sur disque
+    index.close()
+    assert LexicalIndex(str(tmp_path / "lex.sqlite3")).count("pdf-a") == 1
@@ -1,5 +1,6 @@
 import os
 import subprocess
+import time
 import tkinter as tk
 import pytest
 
@@ -35,13 +36,23 @@ def test_get_ollama_models_file_not_found(monkeypatch, capsys):
     assert models == []
 
 
+def pump(root, done, timeout=10):
+    """Laisse la boucle Tk relever les appels faits en arrière-plan jusqu'à `done()`."""
+    deadline = time.monotonic() + timeout
+    while not done() and time.monotonic() < deadline:
+        root.update()
+        time.sleep(0.02)
+
+
 # --- Fixture pour créer une instance de l'application ---
 @pytest.fixture
-def app_instance(monkeypatch):
+def app_instance(monkeypatch, tmp_path):
     """
     Crée une instance de PDFChatApplication en masquant la fenêtre Tkinter.
     Redéfinit la méthode _append_chat_message pour capturer les messages affichés.
+    L'application travaille dans un répertoire temporaire (chroma_db, registre, caches).
     """
+    monkeypatch.chdir(tmp_path)
     root = tk.Tk()
     root.withdraw()  # Masquer la fenêtre principale pendant les tests
 
@@ -77,7 +88,7 @@ def test_send_message_with_chain(app_instance):
 
     # Création d'une chaîne fictive qui renvoie une réponse prédéfinie
     class DummyChain:
-        def run(self, inputs):
+        def run(self, inputs, callbacks=None):
             return "Dummy response"
     app.chat_chain = DummyChain()
 
@@ -85,11 +96,12 @@ def test_send_message_with_chain(app_instance):
     app.user_entry.delete("1.0", tk.END)
     app.user_entry.insert("1.0", test_message)
     app.send_message()
-    chat_msgs = messages["chat"]
-    # Vérification que le message utilisateur est affiché
-    assert any("**User**:" in msg and test_message in msg for msg in chat_msgs)
-    # Vérification que la réponse du bot est affichée
-    assert any("**Bot**:" in msg and "Dummy response" in msg for msg in chat_msgs)
+    # L'appel passe par l'ordonnanceur : on laisse la boucle Tk afficher la réponse
+    pump(root, lambda: not app.streams.get("chat"))
+    conversation = app.conversation_area.get("1.0", tk.END)
+    # Vérification que le message utilisateur puis la réponse du bot sont affichés
+    assert f"**User**: {test_message}\n**Bot**: Dummy response" in conversation
+    assert app.user_entry.get("1.0", tk.END).strip() == ""
 
 
 # --- Tests pour l'onglet PDF ---
@@ -110,21 +122,36 @@ def test_ask_pdf_question_no_chain(app_instance):
     app.ask_pdf_question()
     assert "Veuillez charger un PDF et sélectionner un modèle PDF." in messages["pdf"]
 
-def test_ask_pdf_question_with_chain(app_instance):
-    """Simule l'appel à ask_pdf_question avec une QA chain fictive."""
+def test_ask_pdf_question_with_chain(monkeypatch, app_instance):
+    """Simule l'appel à ask_pdf_question avec une QA chain et une recherche fictives."""
     app, messages, root = app_instance
 
     class DummyQAChain:
-        def run(self, question):
+        pass
+
+    # Question préparée fictive : pas de réponse en cache, génération prédéfinie
+    class DummyPreparedQuestion:
+        cached = None
+        docs = []
+        def generate(self, callbacks=None):
             return "Dummy PDF answer"
+    monkeypatch.setattr(app.engine, "prepare_question",
+                        lambda chain, scope, model, question: DummyPreparedQuestion())
+
+    class DummyCollection:
+        name = "dummy"
+    class DummyVectorstore:
+        _collection = DummyCollection()
+    app.vectorstore = DummyVectorstore()
     app.qa_chain = DummyQAChain()
+    app.qa_model = "DummyModel"
     test_question = "What is PDF about?"
     app.pdf_question_entry.delete("1.0", tk.END)
     app.pdf_question_entry.insert("1.0", test_question)
     app.ask_pdf_question()
-    pdf_msgs = messages["pdf"]
-    assert any("**Question**:" in msg and test_question in msg for msg in pdf_msgs)
-    assert any("**Réponse**:" in msg and "Dummy PDF answer" in msg for msg in pdf_msgs)
+    pump(root, lambda: not app.streams.get("pdf"))
+    answers = app.pdf_answer_area.get("1.0", tk.END)
+    assert f"**Question**: {test_question}\n**Réponse**: Dummy PDF answer" in answers
 
 def test_summarize_pdf_not_ready(app_instance):
     """Vérifie que summarize_pdf affiche une erreur si le PDF ou le modèle n'est pas prêt."""
@@ -136,31 +163,34 @@ def test_summarize_pdf_not_ready(app_instance):
 
 def test_summarize_pdf_with_dummy(monkeypatch, app_instance):
     """
-    Teste summarize_pdf en simulant un vectorstore existant et en remplaçant la création de la QA chain
-    par une chaîne fictive qui renvoie un résumé prédéfini.
+    Teste summarize_pdf en simulant un vectorstore existant (lecture directe des morceaux)
+    et un LLM fictif qui renvoie un résumé prédéfini.
     """
     app, messages, root = app_instance
 
-    # Création d'un vectorstore fictif avec la méthode as_retriever
-    class DummyRetriever:
-        pass
+    # Vectorstore fictif exposant get(), utilisé par le résumé map-reduce
     class DummyVectorstore:
-        def as_retriever(self, search_kwargs):
-            return DummyRetriever()
+        def get(self, include, limit, offset):
+            if offset:
+                return {"documents": [], "metadatas": []}
+            return {"documents": ["Texte page 1", "Texte page 2"],
+                    "metadatas": [{"page": 1}, {"page": 2}]}
     app.vectorstore = DummyVectorstore()
+    app.qa_chain = object()
 
-    # Création d'une QA chain fictive pour le résumé
-    class DummySumChain:
-        def run(self, question):
+    # LLM fictif pour les étapes map et reduce, servi par le pool de modèles du moteur
+    class DummyLLM:
+        def __init__(self, model, keep_alive):
+            pass
+        def invoke(self, prompt):
             return "Dummy summary"
-
-    # Remplacement de RetrievalQA.from_chain_type par une fonction lambda retournant DummySumChain
-    from langchain.chains import RetrievalQA
-    monkeypatch.setattr(RetrievalQA, "from_chain_type", lambda **kwargs: DummySumChain())
+    monkeypatch.setattr(app.engine.models, "llm_factory", DummyLLM)
 
     # S'assurer qu'un modèle PDF valide est sélectionné
     app.pdf_model_var.set("DummyModel")
     app.summarize_pdf()
+    # Le résumé tourne en arrière-plan : on laisse la boucle Tk relever le résultat
+    pump(root, lambda: app.summary_call is None)
     pdf_msgs = messages["pdf"]
     assert any("**Résumé demandé**:" in msg for msg in pdf_msgs)
     assert any("**Résumé**:" in msg and "Dummy summary" in msg for msg in pdf_msgs)
@@ -170,34 +200,52 @@ def test_load_pdf(monkeypatch, app_instance):
     Teste load_pdf en simulant :
       - La sélection d'un fichier PDF via filedialog
       - L'extraction de texte d'un PDF via _extract_text_by_page
-      - La création d'un vectorstore via Chroma.from_documents
+      - La création d'un vectorstore via Chroma.from_documents (dans le thread d'ingestion)
     """
     app, messages, root = app_instance
     fake_pdf_path = "dummy.pdf"
+    with open(fake_pdf_path, "wb") as f:
+        f.write(b"%PDF-1.4 dummy")
     monkeypatch.setattr(tk.filedialog, "askopenfilename", lambda **kwargs: fake_pdf_path)
 
     # Remplacer _extract_text_by_page pour retourner une liste avec une page fictive
     def fake_extract_text_by_page(self, pdf_path):
         from langchain.docstore.document import Document
-        return [Document(page_content="Dummy page text", metadata={"source": pdf_path, "page": 1})]
+        text = "Dummy page text describing the content of the document in a few sentences."
+        return [Document(page_content=text, metadata={"source": pdf_path, "page": 1})]
     monkeypatch.setattr(PDFChatApplication, "_extract_text_by_page", fake_extract_text_by_page)
 
-    # Création d'un vectorstore fictif
+    # Création d'un vectorstore fictif : nom de collection et lecture des morceaux,
+    # utilisés par la QA chain (index BM25 de la collection)
+    class DummyCollection:
+        def __init__(self, name):
+            self.name = name
     class DummyVectorstore:
+        def __init__(self, documents, ids, collection_name):
+            self.documents = documents
+            self.ids = ids
+            self._collection = DummyCollection(collection_name)
         def persist(self):
             pass
-        def as_retriever(self, search_kwargs):
-            class DummyRetriever:
-                pass
-            return DummyRetriever()
+        def get(self, include, limit, offset):
+            docs = self.documents[offset:offset + limit]
+            return {"ids": self.ids[offset:offset + limit],
+                    "documents": [d.page_content for d in docs],
+                    "metadatas": [d.metadata for d in docs]}
     from langchain.vectorstores import Chroma
-    monkeypatch.setattr(Chroma, "from_documents", lambda documents, embedding, collection_name, persist_directory: DummyVectorstore())
+    monkeypatch.setattr(Chroma, "from_documents",
+                        lambda documents, embedding, ids, collection_name, persist_directory:
+                        DummyVectorstore(documents, ids, collection_name))
 
     # S'assurer qu'un modèle PDF valide est sélectionné pour que _create_pdf_qa_chain fonctionne
     app.pdf_model_var.set("DummyModel")
     app.load_pdf()
+    # L'ingestion tourne dans un thread : on attend sa fin puis on relève les événements
+    app.ingestion_job.join(timeout=5)
+    app._poll_ingestion()
     pdf_msgs = messages["pdf"]
     assert any("Chargement du PDF" in msg and fake_pdf_path in msg for msg in pdf_msgs)
     assert any("PDF ingéré" in msg for msg in pdf_msgs)
     assert any("QA chain prête avec le modèle" in msg for msg in pdf_msgs)
+    assert len(app.registry.entries()) == 1
 
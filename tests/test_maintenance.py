@@ -0,0 +1,80 @@
+import io
+import json
+import os
+
+import pytest
+
+from langchain.vectorstores import Chroma
+from langchain_core.documents import Document
+
+import cli
+from benchmarks.bench import generate_pdf
+from benchmarks.fake_ollama import FakeOllama
+from maintenance import StoreMaintenance
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    fake = FakeOllama(embed_latency=0, embed_item_latency=0).start()
+    monkeypatch.setenv("OLLAMA_HOST", fake.url)
+    from engine import RAGEngine
+    yield RAGEngine(str(tmp_path / "chroma_db"), quantize="int8")
+    fake.stop()
+
+
+def test_inventory_gc_and_compact(engine, tmp_path):
+    kept = generate_pdf(str(tmp_path / "kept.pdf"), 2, seed=1)
+    gone = generate_pdf(str(tmp_path / "gone.pdf"), 2, seed=2)
+    engine.ingest(kept)
+    gone_collection = engine.ingest(gone)["collection"]
+    # Collection d'une ancienne version (nommée d'après le fichier) et collection sans source
+    Chroma.from_documents([Document(page_content="x", metadata={"source": kept, "page": 1})],
+                          engine.embeddings, collection_name="kept-legacy", persist_directory=engine.persist_dir)
+    Chroma.from_documents([Document(page_content="y", metadata={"page": 1})],
+                          engine.embeddings, collection_name="stray", persist_directory=engine.persist_dir)
+    engine.ensure_quantized(gone_collection)
+    os.remove(gone)
+
+    maintenance = StoreMaintenance(engine)
+    statuses = {info["collection"]: info["status"] for info in maintenance.inventory()}
+    assert statuses == {engine.collections()[0]: "ok", gone_collection: "missing_file",
+                        "kept-legacy": "duplicate", "stray": "orphan"}
+    assert all(info["disk_bytes"] > 0 for info in maintenance.inventory())
+
+    dry = maintenance.collect_garbage(dry_run=True, orphans=False)
+    assert [info["collection"] for info in dry] == ["kept-legacy"]
+    assert len(maintenance.inventory()) == 4
+
+    removed = maintenance.collect_garbage(missing_files=True)
+    assert sorted(info["collection"] for info in removed) == sorted([gone_collection, "kept-legacy", "stray"])
+    assert [info["collection"] for info in maintenance.inventory()] == engine.collections()
+    assert gone_collection not in engine.lexical.collections() + engine.vectors.collections()
+
+    result = maintenance.compact()
+    assert result["removed_segments"] == 3 and result["after_bytes"] < result["before_bytes"]
+    assert engine.ask_corpus("bench-llm", "pompe ?")["citations"]
+
+
+def test_quantized_search_follows_reingestion(engine, tmp_path):
+    pdf = generate_pdf(str(tmp_path / "doc.pdf"), 2, seed=3)
+    vectorstore = engine.ingest(pdf)["vectorstore"]
+    name = vectorstore._collection.name
+    exact = [doc.page_content for doc, _ in vectorstore.similarity_search_with_score("pompe", k=3)]
+    assert [doc.page_content for doc, _ in engine._quantized_search("pompe", 3, [name])] == exact
+
+    generate_pdf(pdf, 1, seed=4)
+    engine.ingest(pdf)
+    assert [doc.metadata["page"] for doc, _ in engine._quantized_search("pompe", 10, [name])] == [1] * len(
+        engine.open_collection(name).get(include=[])["ids"])
+
+
+def test_store_cli(engine, tmp_path):
+    engine.ingest(generate_pdf(str(tmp_path / "doc.pdf"), 1))
+    out = io.StringIO()
+    assert cli.main(["store", "list"], engine=engine, out=out) == 0
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert lines[0]["status"] == "ok" and "total_bytes" in lines[-1]
+
+    out = io.StringIO()
+    assert cli.main(["store", "quantize"], engine=engine, out=out) == 0
+    assert json.loads(out.getvalue().splitlines()[-1])["vectors"] > 0
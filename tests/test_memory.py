@@ -0,0 +1,85 @@
+from chunking import estimate_tokens
+from memory import ConversationMemory
+
+
+class KeywordEmbeddings:
+    """Embeddings fictifs : un axe par mot-clé."""
+
+    KEYWORDS = ["vélo", "cuisine", "python"]
+
+    def _vec(self, text):
+        return [1.0 if k in text.lower() else 0.0 for k in self.KEYWORDS] + [0.01]
+
+    def embed_documents(self, texts):
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+
+def long_answer(topic):
+    return f"Réponse détaillée à propos de {topic}. " * 15
+
+
+def test_context_stays_within_budget_over_long_session():
+    """La taille du contexte reste bornée quel que soit le nombre d'échanges."""
+    prompts = []
+
+    def summarize(prompt):
+        prompts.append(prompt)
+        return "Résumé : l'utilisateur a posé beaucoup de questions."
+
+    memory = ConversationMemory(summarize, token_budget=400, summary_budget=100, background=False)
+    sizes = []
+    for i in range(30):
+        memory.add_turn(f"question {i}", long_answer(f"sujet {i}"))
+        sizes.append(estimate_tokens(memory.build_context("nouvelle question")))
+    assert max(sizes) <= 400 + 20
+    assert prompts  # les anciens échanges ont été résumés
+    context = memory.build_context("nouvelle question")
+    assert "Résumé de la conversation précédente" in context
+    assert "question 29" in context
+    assert "question 0\n" not in context
+
+
+def test_background_summarization():
+    memory = ConversationMemory(lambda prompt: "résumé glissant", token_budget=300, summary_budget=80)
+    for i in range(10):
+        memory.add_turn(f"q{i}", long_answer("x"))
+    memory.wait_idle(timeout=5)
+    assert memory.summary == "résumé glissant"
+
+
+def test_summarizer_failure_keeps_a_bounded_summary():
+    def failing(prompt):
+        raise RuntimeError("modèle indisponible")
+
+    memory = ConversationMemory(failing, token_budget=300, summary_budget=50, background=False)
+    for i in range(10):
+        memory.add_turn(f"q{i}", long_answer("x"))
+    assert 0 < estimate_tokens(memory.summary) <= 50
+
+
+def test_recall_of_relevant_archived_turns():
+    """Un ancien échange pertinent est rappelé mot pour mot."""
+    memory = ConversationMemory(lambda prompt: "résumé", token_budget=500, summary_budget=50,
+                                recall_budget=200, embeddings=KeywordEmbeddings(), background=False)
+    memory.add_turn("Quel vélo acheter ?", "Un vélo de route léger.")
+    for i in range(12):
+        memory.add_turn(f"Recette de cuisine {i} ?", long_answer("la cuisine"))
+    context = memory.build_context("Et pour l'entretien du vélo ?")
+    assert "Échanges antérieurs pertinents" in context
+    assert "Un vélo de route léger." in context
+
+
+def test_archive_keeps_only_the_latest_turns():
+    """L'archive du rappel est bornée : les échanges les plus anciens sont évincés."""
+    memory = ConversationMemory(lambda prompt: "résumé", token_budget=500, summary_budget=50,
+                                recall_budget=200, embeddings=KeywordEmbeddings(), max_archive=3,
+                                background=False)
+    memory.add_turn("Quel vélo acheter ?", "Un vélo de route léger.")
+    for i in range(12):
+        memory.add_turn(f"Recette de cuisine {i} ?", long_answer("la cuisine"))
+    assert len(memory.archive) == 3
+    assert all("cuisine" in text for text, _ in memory.archive)
+    assert "Un vélo de route léger." not in memory.build_context("Et pour l'entretien du vélo ?")
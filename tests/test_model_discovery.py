@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from model_discovery import ModelDiscovery, fetch_models
+
+
+def serve_tags(models, delay=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            payload = json.dumps({"models": [{"name": m} for m in models]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def tags():
+    servers = []
+
+    def start(models, delay=0.0):
+        server, url = serve_tags(models, delay)
+        servers.append(server)
+        return url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_models(tags):
+    assert fetch_models(tags(["llama3:8b", "mistral:latest"])) == ["llama3:8b", "mistral:latest"]
+
+
+def test_discovery_caches_last_known_list(tmp_path, tags):
+    cache = str(tmp_path / "models.json")
+    discovery = ModelDiscovery(cache, base_url=tags(["llama3:8b"]))
+    assert discovery.cached() == []
+    event = discovery.start().events.get(timeout=5)
+    assert event == {"type": "models", "models": ["llama3:8b"]}
+    assert ModelDiscovery(cache).cached() == ["llama3:8b"]
+
+
+def test_discovery_falls_back_to_ollama_list(tmp_path):
+    discovery = ModelDiscovery(str(tmp_path / "models.json"), timeout=0.5,
+                               base_url="http://127.0.0.1:9", fallback=lambda: ["phi3"])
+    assert discovery.start().events.get(timeout=5) == {"type": "models", "models": ["phi3"]}
+
+
+def test_discovery_error_keeps_cache(tmp_path):
+    cache = tmp_path / "models.json"
+    cache.write_text('["ancien"]', encoding="utf-8")
+    discovery = ModelDiscovery(str(cache), timeout=0.5, base_url="http://127.0.0.1:9", fallback=lambda: [])
+    assert discovery.start().events.get(timeout=5)["type"] == "error"
+    assert discovery.cached() == ["ancien"]
+
+
+def test_discovery_expires(tmp_path, tags):
+    discovery = ModelDiscovery(str(tmp_path / "models.json"), timeout=0.1, base_url=tags(["lent"], delay=0.5))
+    discovery.start()
+    time.sleep(0.2)
+    assert discovery.expired()
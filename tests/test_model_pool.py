@@ -0,0 +1,105 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from model_pool import ModelPool
+
+
+class FakeLLM:
+    def __init__(self, model, keep_alive, **params):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.params = params
+
+
+@pytest.fixture
+def ollama():
+    """Faux Ollama : enregistre les requêtes de préchargement."""
+    requests = []
+    release = threading.Event()
+    release.set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            release.wait(5)
+            requests.append((self.path, body))
+            payload = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests, release
+    release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_llm_clients_are_shared_per_model_and_params():
+    pool = ModelPool(keep_alive="1h", llm_factory=FakeLLM)
+    a = pool.llm("llama3", temperature=0.1)
+    assert pool.llm("llama3", temperature=0.1) is a
+    assert pool.llm("llama3") is not a
+    assert pool.llm("mistral") is not pool.llm("llama3")
+    assert a.keep_alive == "1h" and a.params == {"temperature": 0.1}
+    assert pool.stats()["llms"] == 3
+
+
+def test_chains_are_cached_with_lru_eviction():
+    pool = ModelPool(max_chains=2, llm_factory=FakeLLM)
+    builds = []
+
+    def build(name):
+        def make():
+            builds.append(name)
+            return object()
+        return make
+
+    first = pool.chain(("chat", "a"), build("a"))
+    assert pool.chain(("chat", "a"), build("a")) is first
+    pool.chain(("chat", "b"), build("b"))
+    pool.chain(("chat", "a"), build("a"))  # "a" redevient la plus récente
+    pool.chain(("chat", "c"), build("c"))  # évince "b"
+    pool.chain(("chat", "a"), build("a"))
+    pool.chain(("chat", "b"), build("b"))
+    assert builds == ["a", "b", "c", "b"]
+
+    pool.forget_chains(lambda key: key[1] == "b")
+    assert pool.stats()["chains"] == 1
+
+
+def test_warm_up_loads_model_with_keep_alive(ollama):
+    url, requests, _ = ollama
+    pool = ModelPool(keep_alive="45m", base_url=url, llm_factory=FakeLLM)
+    pool.warm_up("llama3", wait=True)
+    pool.warm_up("nomic-embed-text", kind="embed", wait=True)
+    assert requests == [
+        ("/api/generate", {"model": "llama3", "prompt": "", "stream": False, "keep_alive": "45m"}),
+        ("/api/embed", {"model": "nomic-embed-text", "input": "", "keep_alive": "45m"}),
+    ]
+    assert pool.is_warm("llama3") and pool.stats()["warm"] == ["llama3", "nomic-embed-text"]
+
+
+def test_warm_up_is_deduplicated_while_in_flight(ollama):
+    url, requests, release = ollama
+    release.clear()
+    pool = ModelPool(base_url=url, llm_factory=FakeLLM)
+    first = pool.warm_up("llama3")
+    assert pool.warm_up("llama3") is first
+    release.set()
+    first.join(5)
+    assert len(requests) == 1
+
+
+def test_warm_up_failure_is_silent():
+    pool = ModelPool(base_url="http://127.0.0.1:9", timeout=1, llm_factory=FakeLLM)
+    pool.warm_up("llama3", wait=True)
+    assert not pool.is_warm("llama3")
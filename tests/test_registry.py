@@ -0,0 +1,141 @@
+import os
+
+from langchain.docstore.document import Document
+
+from registry import DocumentRegistry, document_ids
+
+
+def write_pdf(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def test_registry_finds_known_content_under_another_path(tmp_path):
+    """Deux fichiers au contenu identique partagent la même collection."""
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    a = write_pdf(tmp_path / "a.pdf", b"%PDF same")
+    assert registry.find(a) is None
+    collection = registry.collection_for(a)
+    registry.record(a, collection, ["id1"], pages=1)
+
+    b = write_pdf(tmp_path / "b.pdf", b"%PDF same")
+    entry = registry.find(b)
+    assert entry["collection"] == collection
+    assert sorted(entry["paths"]) == sorted([os.path.abspath(a), os.path.abspath(b)])
+
+    # Le registre est persistant
+    reloaded = DocumentRegistry(str(tmp_path / "registry.json"))
+    assert reloaded.find(a)["collection"] == collection
+
+
+def test_registry_same_basename_different_content(tmp_path):
+    """Deux report.pdf différents n'entrent plus en collision."""
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    os.mkdir(tmp_path / "x")
+    os.mkdir(tmp_path / "y")
+    a = write_pdf(tmp_path / "x" / "report.pdf", b"%PDF one")
+    b = write_pdf(tmp_path / "y" / "report.pdf", b"%PDF two")
+    registry.record(a, registry.collection_for(a), [], pages=0)
+    assert registry.find(b) is None
+    assert registry.collection_for(b) != registry.collection_for(a)
+
+
+def test_registry_changed_file_reuses_its_collection(tmp_path):
+    """Une nouvelle version d'un fichier garde sa collection ; remove signale l'orphelin."""
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    a = write_pdf(tmp_path / "a.pdf", b"%PDF v1")
+    collection = registry.collection_for(a)
+    registry.record(a, collection, [], pages=1)
+
+    write_pdf(tmp_path / "a.pdf", b"%PDF version 2")
+    assert registry.find(a) is None
+    assert registry.collection_for(a) == collection
+    registry.record(a, collection, [], pages=2)
+    assert len(registry.entries()) == 1
+
+    orphan = registry.remove(a)
+    assert orphan["collection"] == collection
+    assert registry.entries() == []
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0, 0.5]
+
+
+def test_collection_writer_only_touches_changed_pages(tmp_path):
+    """Réingestion : seules les pages modifiées sont ré-embeddées, les pages disparues supprimées."""
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    pdf = write_pdf(tmp_path / "a.pdf", b"%PDF v1")
+    persist = str(tmp_path / "db")
+    embeddings = CountingEmbeddings()
+
+    v1 = [Document(page_content=f"page {i}", metadata={"page": i}) for i in (1, 2, 3)]
+    writer = registry.writer(pdf, persist)
+    writer.add(v1[:2], embeddings)
+    writer.add(v1[2:], embeddings)
+    writer.finish(pages=3)
+    assert not writer.incremental
+    assert len(embeddings.embedded) == 3
+
+    write_pdf(tmp_path / "a.pdf", b"%PDF v2")
+    embeddings.embedded.clear()
+    v2 = [v1[0], Document(page_content="page 2 modifiée", metadata={"page": 2})]
+    writer = registry.writer(pdf, persist)
+    writer.add(v2, embeddings)
+    vectorstore = writer.finish(pages=2)
+    assert writer.incremental
+    assert (writer.added, writer.deleted) == (1, 2)
+    assert embeddings.embedded == ["page 2 modifiée"]
+    assert sorted(vectorstore.get(include=[])["ids"]) == sorted(document_ids(v2))
+    assert registry.find(pdf)["pages"] == 2
+
+
+def test_collection_writer_abort_drops_new_collection(tmp_path):
+    """Une ingestion interrompue ne laisse pas de collection à moitié écrite."""
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    pdf = write_pdf(tmp_path / "a.pdf", b"%PDF v1")
+    writer = registry.writer(pdf, str(tmp_path / "db"))
+    writer.add([Document(page_content="page 1", metadata={"page": 1})], CountingEmbeddings())
+    writer.abort()
+    assert registry.find(pdf) is None
+    names = [c.name for c in writer.vectorstore._client.list_collections()]
+    assert writer.collection_name not in names
+
+
+def test_collection_writer_keeps_lexical_index_in_sync(tmp_path):
+    """L'index BM25 suit les ajouts, les pages disparues et les ingestions annulées."""
+    from lexical import LexicalIndex
+
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    pdf = write_pdf(tmp_path / "a.pdf", b"%PDF v1")
+    persist = str(tmp_path / "db")
+
+    v1 = [Document(page_content=f"page {i} code E-10{i}", metadata={"page": i}) for i in (1, 2)]
+    writer = registry.writer(pdf, persist, lexical)
+    writer.add(v1, CountingEmbeddings())
+    writer.finish(pages=2)
+    assert lexical.count(writer.collection_name) == 2
+
+    write_pdf(tmp_path / "a.pdf", b"%PDF v2")
+    writer = registry.writer(pdf, persist, lexical)
+    writer.add(v1[:1], CountingEmbeddings())
+    writer.finish(pages=1)
+    assert lexical.count(writer.collection_name) == 1
+    hits = lexical.search("E-102", collections=[writer.collection_name])
+    assert [d.metadata["page"] for d, _ in hits] == [1]
+
+    other = write_pdf(tmp_path / "b.pdf", b"%PDF other")
+    writer = registry.writer(other, persist, lexical)
+    writer.add([Document(page_content="autre", metadata={"page": 1})], CountingEmbeddings())
+    writer.abort()
+    assert lexical.count(writer.collection_name) == 0
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from scheduler import BACKGROUND, INTERACTIVE, QUESTION, RequestScheduler
+from streaming import GenerationStopped
+from tests.test_streaming import TokenLLM, make_chain
+
+
+def blocking(gate, log=None, name=None):
+    """Appel fictif qui attend `gate` avant de répondre `name`."""
+    def run(callbacks):
+        gate.wait(5)
+        if log is not None:
+            log.append(name)
+        return name
+    return run
+
+
+def wait_for(predicate):
+    for _ in range(500):
+        if predicate():
+            return True
+        threading.Event().wait(0.01)
+    return False
+
+
+def test_scheduler_runs_highest_priority_first():
+    """Une fois le worker libre, le chat passe devant le résumé soumis avant lui."""
+    scheduler = RequestScheduler(workers=1)
+    gate = threading.Event()
+    log = []
+    first = scheduler.submit("pdf", blocking(gate, log, "question"), QUESTION)
+    assert wait_for(lambda: first.state == "running")
+    summary = scheduler.submit("summary", blocking(gate, log, "summary"), BACKGROUND)
+    chat = scheduler.submit("chat", blocking(gate, log, "chat"), INTERACTIVE)
+    gate.set()
+    assert [c.result(timeout=5) for c in (first, summary, chat)] == ["question", "summary", "chat"]
+    assert log == ["question", "chat", "summary"]
+    scheduler.shutdown()
+
+
+def test_scheduler_bounds_pool_and_lanes():
+    """`workers` appels au plus en parallèle, un seul par voie limitée à 1."""
+    scheduler = RequestScheduler(workers=2, lane_limits={"chat": 1})
+    gate = threading.Event()
+    calls = [scheduler.submit("chat", blocking(gate), INTERACTIVE) for _ in range(2)]
+    calls.append(scheduler.submit("summary", blocking(gate), BACKGROUND))
+    calls.append(scheduler.submit("summary", blocking(gate), BACKGROUND))
+    assert wait_for(lambda: scheduler.stats()["running"] == 2)
+    stats = scheduler.stats()
+    assert stats["running"] == 2 and stats["queued"] == 2
+    assert scheduler.stats(["chat"])["running"] == 1
+    assert [c.state for c in calls] == ["running", "queued", "running", "queued"]
+    gate.set()
+    for call in calls:
+        call.result(timeout=5)
+    assert scheduler.stats()["queued"] == 0
+    scheduler.shutdown()
+
+
+def test_scheduler_dedupes_identical_requests():
+    scheduler = RequestScheduler(workers=1)
+    gate = threading.Event()
+    log = []
+    first = scheduler.submit("api", blocking(gate, log, "réponse"), key=("q", "même question"))
+    second = scheduler.submit("api", blocking(gate, log, "réponse"), key=("q", "même question"))
+    assert second is first
+    gate.set()
+    assert second.result(timeout=5) == "réponse"
+    assert log == ["réponse"]
+    # Terminée : une nouvelle demande identique rappelle le modèle
+    third = scheduler.submit("api", blocking(gate, log, "réponse"), key=("q", "même question"))
+    assert third is not first
+    third.result(timeout=5)
+    assert log == ["réponse", "réponse"]
+    scheduler.shutdown()
+
+
+def test_scheduler_cancels_queued_and_running_requests():
+    scheduler = RequestScheduler(workers=1)
+    gate = threading.Event()
+    chain = make_chain(TokenLLM(gate=gate))
+    running = scheduler.submit("chat", lambda callbacks: chain.run({"question": "q"}, callbacks=callbacks))
+    queued = scheduler.submit("chat", blocking(gate, name="jamais"), key="k")
+
+    queued.stop()
+    assert queued.state == "cancelled"
+    with pytest.raises(GenerationStopped):
+        queued.result(timeout=1)
+
+    assert wait_for(lambda: running.state == "running")
+    running.stop()
+    gate.set()
+    with pytest.raises(GenerationStopped):
+        running.result(timeout=5)
+    assert running.drain()[1]["type"] == "stopped"
+    scheduler.shutdown()
+
+
+def test_scheduler_keeps_shared_request_until_last_subscriber_leaves():
+    scheduler = RequestScheduler(workers=1)
+    gate = threading.Event()
+    blocker = scheduler.submit("pdf", blocking(gate))
+    shared = scheduler.submit("pdf", blocking(gate, name="partagée"), key="k")
+    assert scheduler.submit("pdf", blocking(gate), key="k") is shared
+    shared.stop()
+    assert shared.state == "queued"
+    gate.set()
+    blocker.result(timeout=5)
+    assert shared.result(timeout=5) == "partagée"
+    assert scheduler.stats(["pdf"])["average_wait"] > 0
+    scheduler.shutdown()
+
+
+def test_scheduler_streams_tokens_and_reports_errors():
+    scheduler = RequestScheduler(workers=1)
+    chain = make_chain(TokenLLM())
+    call = scheduler.submit("chat", lambda callbacks: chain.run({"question": "q"}, callbacks=callbacks))
+    assert call.result(timeout=5) == "Bonjour !"
+    text, final = call.drain()
+    assert text == "Bonjour !" and final["type"] == "done"
+    assert call.wait_time() >= 0
+
+    def failing(callbacks):
+        raise RuntimeError("serveur indisponible")
+    with pytest.raises(RuntimeError, match="indisponible"):
+        scheduler.submit("chat", failing).result(timeout=5)
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit("chat", failing)
@@ -0,0 +1,108 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from server import make_server
+
+
+class FakeRegistry:
+    def entries(self):
+        return [{"collection": "pdf-abc"}]
+
+
+class FakeTracer:
+    def render_prometheus(self):
+        return 'rag_stage_seconds_count{stage="retrieval"} 1\n'
+
+
+class FakeEngine:
+    registry = FakeRegistry()
+    tracer = FakeTracer()
+
+    def ingest(self, pdf_path):
+        return {"path": pdf_path, "collection": "pdf-abc", "chunks": 2, "vectorstore": object()}
+
+    def vectorstore_for(self, pdf_path=None, collection=None):
+        return collection or pdf_path
+
+    def ask(self, vectorstore, model, question):
+        if question == "boom":
+            raise RuntimeError("modèle indisponible")
+        return {"question": question, "answer": f"{model}@{vectorstore}"}
+
+    def ask_corpus(self, model, question, k=5):
+        return {"question": question, "answer": f"{model}@corpus", "k": k}
+
+    def summarize(self, vectorstore, model):
+        return f"résumé {vectorstore}"
+
+
+@pytest.fixture
+def url():
+    server = make_server(FakeEngine(), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def call(url, path, body=None):
+    data = None if body is None else json.dumps(body).encode()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url + path, data=data), timeout=5) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health(url):
+    assert call(url, "/health") == (200, {"status": "ok", "documents": 1})
+
+
+def test_ingest_ask_summarize(url):
+    status, body = call(url, "/ingest", {"path": "doc.pdf"})
+    assert status == 200 and body == {"path": "doc.pdf", "collection": "pdf-abc", "chunks": 2}
+    assert call(url, "/ask", {"collection": "pdf-abc", "model": "m", "question": "Q ?"}) == \
+        (200, {"question": "Q ?", "answer": "m@pdf-abc"})
+    assert call(url, "/ask", {"corpus": True, "model": "m", "question": "Q ?", "k": 3}) == \
+        (200, {"question": "Q ?", "answer": "m@corpus", "k": 3})
+    assert call(url, "/summarize", {"pdf": "doc.pdf", "model": "m"}) == (200, {"summary": "résumé doc.pdf"})
+
+
+def test_errors(url):
+    assert call(url, "/ask", {"model": "m", "question": "Q ?"})[0] == 400
+    assert call(url, "/ask", {"pdf": "doc.pdf"})[0] == 400
+    assert call(url, "/ask", {"pdf": "doc.pdf", "model": "m", "question": "boom"}) == \
+        (500, {"error": "modèle indisponible"})
+    assert call(url, "/nope", {})[0] == 404
+
+
+def test_concurrent_clients(url):
+    results = []
+
+    def client(i):
+        results.append(call(url, "/ask", {"pdf": "doc.pdf", "model": "m", "question": f"Q{i}"})[1]["question"])
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == sorted(f"Q{i}" for i in range(8))
+
+
+def test_metrics_endpoint_is_opt_in(url):
+    assert call(url, "/metrics")[0] == 404
+
+    server = make_server(FakeEngine(), port=0, metrics=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as r:
+            assert r.headers["Content-Type"].startswith("text/plain")
+            assert r.read().decode() == 'rag_stage_seconds_count{stage="retrieval"} 1\n'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from startup import IMPORT_TARGET, LazyValue, format_report, import_report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("langchain", "langchain_core", "langchain_ollama", "chromadb", "fitz", "requests")
+
+
+def test_import_main_does_not_load_heavy_modules():
+    """La fenêtre peut s'afficher avant LangChain, Chroma et PyMuPDF."""
+    code = f"import sys, main; print([m for m in {HEAVY!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+
+def test_import_report_measures_main():
+    """Structure et classement du rapport ; l'objectif de durée reste vérifié par `startup-report`."""
+    total, ranked = import_report("main")
+    assert total > 0
+    names = [name for _, name in ranked]
+    assert "model_discovery" in names and "startup" in names
+    durations = [seconds for seconds, _ in ranked]
+    assert durations == sorted(durations, reverse=True)
+    assert all(0 <= seconds <= total for seconds in durations)
+    assert "main" in format_report(total, ranked)
+
+
+def test_format_report_flags_imports_over_target():
+    ranked = [(0.2, "model_discovery"), (0.01, "startup")]
+    assert "AU-DELÀ" not in format_report(IMPORT_TARGET / 2, ranked)
+    report = format_report(IMPORT_TARGET * 2, ranked).splitlines()
+    assert "AU-DELÀ DE L'OBJECTIF" in report[0]
+    assert [line.split()[-1] for line in report[1:]] == ["model_discovery", "startup"]
+
+
+def test_lazy_value_builds_once_in_background():
+    calls = []
+    release = threading.Event()
+
+    def factory():
+        calls.append(threading.current_thread())
+        release.wait(5)
+        return "moteur"
+
+    lazy = LazyValue(factory).start().start()
+    assert not lazy.ready()
+    release.set()
+    assert lazy.get() == "moteur" and lazy.get() == "moteur"
+    assert len(calls) == 1 and calls[0] is not threading.current_thread()
+
+
+def test_lazy_value_builds_in_place_when_not_started():
+    lazy = LazyValue(lambda: threading.current_thread())
+    assert lazy.get() is threading.current_thread()
+
+
+def test_lazy_value_reraises_errors():
+    def factory():
+        time.sleep(0.01)
+        raise ValueError("chroma_db illisible")
+
+    lazy = LazyValue(factory).start()
+    with pytest.raises(ValueError):
+        lazy.get()
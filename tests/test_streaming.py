@@ -0,0 +1,67 @@
+import threading
+
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
+from langchain_core.language_models.llms import LLM
+
+from streaming import StreamingCall
+
+
+class TokenLLM(LLM):
+    """LLM fictif qui émet ses tokens un par un via les callbacks, comme OllamaLLM."""
+
+    tokens: list = ["Bon", "jour", " !"]
+    gate: object = None
+
+    @property
+    def _llm_type(self):
+        return "token-fake"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        for token in self.tokens:
+            if self.gate is not None:
+                self.gate.wait()
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+        return "".join(self.tokens)
+
+
+def make_chain(llm):
+    prompt = PromptTemplate(template="{question}", input_variables=["question"])
+    return LLMChain(llm=llm, prompt=prompt)
+
+
+def collect(call):
+    call.join(timeout=5)
+    return call.drain()
+
+
+def test_streaming_call_pushes_tokens():
+    """Les tokens arrivent dans la file, suivis de l'événement 'done'."""
+    chain = make_chain(TokenLLM())
+    call = StreamingCall(lambda callbacks: chain.run({"question": "q"}, callbacks=callbacks)).start()
+    text, final = collect(call)
+    assert text == "Bonjour !"
+    assert final == {"type": "done", "text": "Bonjour !"}
+    assert call.time_to_first_token() is not None
+
+
+def test_streaming_call_stop_aborts_generation():
+    """Demander l'arrêt interrompt la génération au token suivant."""
+    gate = threading.Event()
+    chain = make_chain(TokenLLM(gate=gate))
+    call = StreamingCall(lambda callbacks: chain.run({"question": "q"}, callbacks=callbacks)).start()
+    call.stop()
+    gate.set()
+    text, final = collect(call)
+    assert text == ""
+    assert final["type"] == "stopped"
+
+
+def test_streaming_call_reports_errors():
+    def failing(callbacks):
+        raise RuntimeError("serveur indisponible")
+
+    text, final = collect(StreamingCall(failing).start())
+    assert final["type"] == "error"
+    assert "indisponible" in str(final["error"])
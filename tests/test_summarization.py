@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from chunking import estimate_tokens
+from summarization import REDUCE_PROMPT, SummaryCache, SummaryEngine, load_chunks
+
+
+class FakeVectorstore:
+    def __init__(self, texts):
+        self.texts = texts
+
+    def get(self, include, limit, offset):
+        # Ordre volontairement mélangé : load_chunks doit remettre le document dans l'ordre
+        items = list(reversed(list(enumerate(self.texts, start=1))))[offset:offset + limit]
+        return {"documents": [t for _, t in items], "metadatas": [{"page": p} for p, _ in items]}
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        return f"résumé{len(prompt) % 97} " * 20
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = SummaryCache(str(tmp_path / "summaries.sqlite3"))
+    yield c
+    c.close()
+
+
+def test_load_chunks_pages_through_collection():
+    chunks = load_chunks(FakeVectorstore([f"t{i}" for i in range(1, 8)]), page_size=3)
+    assert [meta["page"] for _, meta in chunks] == list(range(1, 8))
+
+
+def test_map_reduce_stays_under_budget(cache):
+    """Chaque appel de réduction respecte le budget ; le résultat final est un seul résumé."""
+    llm = FakeLLM()
+    engine = SummaryEngine(llm, "m", cache, reduce_budget=120, max_workers=3)
+    summary = engine.summarize(FakeVectorstore([f"contenu de la page {i}" for i in range(20)]))
+    assert summary
+    map_prompts = [p for p in llm.prompts if "Voici un extrait" in p]
+    reduce_prompts = [p for p in llm.prompts if "résumés partiels" in p]
+    assert len(map_prompts) == 20
+    assert len(reduce_prompts) > 1  # plusieurs niveaux de réduction
+    # Résumés partiels sous le budget, plus le gabarit de réduction
+    overhead = estimate_tokens(REDUCE_PROMPT.format(text=""))
+    assert all(estimate_tokens(p) <= 120 + overhead for p in reduce_prompts)
+
+
+def test_second_summary_uses_cache(cache):
+    """Un second résumé est servi par le cache ; une page modifiée ne relance que sa branche."""
+    texts = [f"contenu de la page {i}" for i in range(10)]
+    llm = FakeLLM()
+    SummaryEngine(llm, "m", cache, reduce_budget=120).summarize(FakeVectorstore(texts))
+
+    again = SummaryEngine(llm, "m", cache, reduce_budget=120)
+    again.summarize(FakeVectorstore(texts))
+    assert again.llm_calls == 0
+
+    texts[3] = "contenu modifié"
+    edited = SummaryEngine(llm, "m", cache, reduce_budget=120)
+    edited.summarize(FakeVectorstore(texts))
+    map_calls = [p for p in llm.prompts[-edited.llm_calls:] if "Voici un extrait" in p]
+    assert len(map_calls) == 1
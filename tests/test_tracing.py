@@ -0,0 +1,101 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from tracing import Tracer, format_trace, log_json, logger
+
+
+def test_spans_attach_to_the_active_trace_only():
+    tracer = Tracer()
+    trace = tracer.trace("question", model="m")
+    with trace.activate():
+        with tracer.span("retrieval") as span:
+            span["docs"] = 4
+        # Un autre thread n'a pas de trace active : étape isolée
+        def other():
+            with tracer.span("other"):
+                pass
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+    with tracer.span("outside"):
+        pass
+    trace.finish(answer_chars=10)
+    trace.finish(answer_chars=99)  # une seule clôture
+
+    last = tracer.last()
+    assert last["request"] == "question" and last["model"] == "m" and last["answer_chars"] == 10
+    assert [s["span"] for s in last["spans"]] == ["retrieval"]
+    assert last["spans"][0]["docs"] == 4 and last["duration_ms"] >= last["spans"][0]["duration_ms"]
+    assert tracer.last("ingest") is None
+
+
+def test_span_records_errors():
+    tracer = Tracer()
+    trace = tracer.trace("ingest")
+    with pytest.raises(RuntimeError):
+        with trace.span("store"):
+            raise RuntimeError("disque plein")
+    trace.finish()
+    assert tracer.last()["spans"][0]["error"] == "RuntimeError"
+
+
+def test_iterate_records_cumulative_time():
+    tracer = Tracer()
+    trace = tracer.trace("ingest")
+    assert list(trace.iterate("extract", iter([1, 2, 3]))) == [1, 2, 3]
+    trace.finish()
+    span = tracer.last()["spans"][0]
+    assert span["span"] == "extract" and span["items"] == 3
+
+
+def test_prometheus_text():
+    tracer = Tracer(buckets=(0.1, 1))
+    trace = tracer.trace("question")
+    trace.record("generation", 0.5, tokens=40, ttft_ms=120.0)
+    trace.record("generation", 2.0, tokens=2, ttft_ms=80.0)
+    trace.record("context_budget", 0.01, window=4096, budget=1500, tokens=900)
+    trace.finish()
+    text = tracer.render_prometheus()
+    assert 'rag_stage_seconds_bucket{stage="generation",le="0.1"} 0' in text
+    assert 'rag_stage_seconds_bucket{stage="generation",le="1"} 1' in text
+    assert 'rag_stage_seconds_bucket{stage="generation",le="+Inf"} 2' in text
+    assert 'rag_stage_seconds_count{stage="generation"} 2' in text
+    assert 'rag_request_seconds_count{request="question"} 1' in text
+    assert 'rag_stage_tokens_total{stage="generation"} 42' in text
+    assert 'rag_stage_tokens_total{stage="context_budget"} 900' in text
+    # Grandeurs non additives : pas de compteur
+    assert "ttft_ms_total" not in text and "window_total" not in text and "budget_total" not in text
+
+
+def test_json_log_lines():
+    stream = io.StringIO()
+    handler = log_json(stream)
+    try:
+        tracer = Tracer()
+        trace = tracer.trace("question")
+        trace.record("retrieval", 0.01, docs=2)
+        trace.finish()
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["event"] for line in lines] == ["span", "trace"]
+    assert lines[0]["trace"] == lines[1]["trace"] and lines[0]["docs"] == 2
+
+
+def test_format_trace_groups_stages():
+    tracer = Tracer()
+    trace = tracer.trace("ingest")
+    trace.record("embed", 0.2, texts=16)
+    trace.record("embed", 0.3, texts=16)
+    trace.record("generation", 1.5, tokens=30, ttft_ms=120.0)
+    trace.finish()
+    text = format_trace(tracer.last())
+    assert text.startswith("ingest : ")
+    assert "embed 500 ms (x2)" in text
+    assert "generation 1.50 s (30 tokens, 1er token 120 ms)" in text
+    assert format_trace(None) == "Aucune requête mesurée pour le moment."
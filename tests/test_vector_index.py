@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from vector_index import QuantizedIndex, quantize
+
+
+def build(index, name, vectors, offset=0):
+    ids = [f"{name}-{i}" for i in range(len(vectors))]
+    index.build(name, ids, vectors, [f"texte {i}" for i in range(len(vectors))],
+                [{"page": offset + i} for i in range(len(vectors))], version="v1")
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(600, 32)).astype(np.float32)
+
+
+def test_quantize_int8_error_is_small(vectors):
+    compact, scales = quantize(vectors, "int8")
+    assert compact.dtype == np.int8 and compact.nbytes == vectors.nbytes // 4
+    restored = compact.astype(np.float32) * scales[:, None]
+    assert np.abs(restored - vectors).max() <= scales.max() / 2 + 1e-6
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+@pytest.mark.parametrize("budget", [1 << 30, 1024])
+def test_search_matches_exact_ranking(tmp_path, vectors, mode, budget):
+    """Même classement et mêmes distances qu'une recherche exacte, en mémoire ou depuis le disque."""
+    index = QuantizedIndex(str(tmp_path / "q.sqlite3"), mode, memory_budget=budget, block_rows=100)
+    build(index, "c1", vectors[:300])
+    build(index, "c2", vectors[300:], offset=300)
+    query = np.random.default_rng(1).normal(size=32).astype(np.float32)
+    expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:5]
+
+    results = index.search(query, k=5)
+    assert [doc.metadata["page"] for doc, _ in results] == expected.tolist()
+    assert results[0][1] == pytest.approx(float(((vectors[expected[0]] - query) ** 2).sum()), rel=1e-4)
+    assert {doc.metadata["collection"] for doc, _ in results} <= {"c1", "c2"}
+    assert index.memory() <= budget
+    assert [d.metadata["collection"] for d, _ in index.search(query, k=3, collections=["c2"])] == ["c2"] * 3
+
+
+def test_memory_budget_evicts_least_recently_used(tmp_path, vectors):
+    per_collection = 300 * (32 + 8)
+    index = QuantizedIndex(str(tmp_path / "q.sqlite3"), "int8", memory_budget=per_collection + 10)
+    build(index, "c1", vectors[:300])
+    build(index, "c2", vectors[300:])
+    index.search(vectors[0], k=1, collections=["c1"])
+    index.search(vectors[0], k=1, collections=["c2"])
+    assert index.stats()["loaded"] == ["c2"]
+    assert index.memory() == per_collection
+
+
+def test_rebuild_and_drop(tmp_path, vectors):
+    index = QuantizedIndex(str(tmp_path / "q.sqlite3"), "int8")
+    build(index, "c1", vectors[:10])
+    assert index.version("c1") == "v1" and index.has("c1")
+    index.build("c1", ["x"], vectors[:1], ["seul"], [{}], version="v2")
+    assert index.version("c1") == "v2"
+    assert [doc.page_content for doc, _ in index.search(vectors[5], k=3)] == ["seul"]
+    index.drop("c1")
+    assert not index.has("c1") and index.search(vectors[0], k=3) == []
+
+
+def test_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        QuantizedIndex(str(tmp_path / "q.sqlite3"), "int4")
@@ -0,0 +1,95 @@
+import io
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import cli
+from benchmarks.bench import generate_pdf
+from benchmarks.fake_ollama import FakeOllama
+from registry import DocumentRegistry
+from watcher import FolderWatcher
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    fake = FakeOllama(embed_latency=0, embed_item_latency=0).start()
+    monkeypatch.setenv("OLLAMA_HOST", fake.url)
+    from engine import RAGEngine
+    yield RAGEngine(str(tmp_path / "chroma_db"))
+    fake.stop()
+
+
+def events(watcher):
+    found = []
+    while not watcher.events.empty():
+        found.append(watcher.events.get_nowait())
+    return found
+
+
+def test_watcher_ingests_only_the_delta(engine, tmp_path):
+    folder = tmp_path / "partage"
+    (folder / "sous-dossier").mkdir(parents=True)
+    a = generate_pdf(str(folder / "a.pdf"), 3, seed=1)
+    b = generate_pdf(str(folder / "sous-dossier" / "b.pdf"), 2, seed=2)
+    watcher = FolderWatcher(engine, [str(folder)])
+
+    changed, removed = watcher.run_once()
+    assert sorted(changed) == sorted([a, b]) and removed == []
+    first = {os.path.basename(e["path"]): e for e in events(watcher)}
+    assert all(e["type"] == "ingested" and e["added"] == e["chunks"] for e in first.values())
+
+    # Rien n'a changé : pas de relecture
+    assert watcher.run_once() == ([], [])
+
+    # Une page ajoutée : seuls ses morceaux sont embeddés, dans la même collection
+    misses = engine.embeddings.stats()["misses"]
+    generate_pdf(a, 4, seed=1)
+    watcher.run_once()
+    event, = events(watcher)
+    assert event["collection"] == first["a.pdf"]["collection"]
+    assert 0 < event["added"] < event["chunks"] and event["deleted"] == 0
+    assert engine.embeddings.stats()["misses"] - misses == event["added"]
+
+    # Fichier supprimé : retiré du registre, collection supprimée
+    os.remove(b)
+    assert watcher.run_once() == ([], [b])
+    event, = events(watcher)
+    assert event == {"type": "removed", "path": b, "collection": first["b.pdf"]["collection"]}
+    assert engine.collections() == [first["a.pdf"]["collection"]]
+
+
+def test_watcher_waits_for_stable_files(tmp_path):
+    registry = DocumentRegistry(str(tmp_path / "registry.json"))
+    watcher = FolderWatcher(SimpleNamespace(registry=registry), [str(tmp_path)], settle=1.0)
+    pdf = tmp_path / "copie.pdf"
+    pdf.write_bytes(b"%PDF-1.4 debut")
+
+    assert watcher.scan(now=0) == ([], [])
+    pdf.write_bytes(b"%PDF-1.4 debut et suite")  # copie toujours en cours
+    assert watcher.scan(now=0.5) == ([], [])
+    assert watcher.scan(now=1.0) == ([], [])
+    assert watcher.scan(now=1.6) == ([str(pdf)], [])
+    # Déjà en file : pas mis en file une seconde fois
+    assert watcher.scan(now=5) == ([], [])
+
+
+def test_watch_command_once(engine, tmp_path):
+    folder = tmp_path / "entrant"
+    folder.mkdir()
+    generate_pdf(str(folder / "doc.pdf"), 2, seed=4)
+    (folder / "vide.pdf").write_bytes(b"pas un pdf")
+    out = io.StringIO()
+    assert cli.main(["watch", str(folder), "--once"], engine=engine, out=out) == 1
+    records = {os.path.basename(r["path"]): r for r in map(json.loads, out.getvalue().splitlines())}
+    assert records["doc.pdf"]["type"] == "ingested" and records["doc.pdf"]["pages"] == 2
+    assert records["vide.pdf"]["type"] == "error"
+
+    # Dans un même watcher, le fichier en erreur n'est retenté que s'il change
+    watcher = FolderWatcher(engine, [str(folder)])
+    watcher.run_once()
+    assert [e["type"] for e in events(watcher)] == ["error"]
+    assert watcher.run_once() == ([], [])
+    (folder / "vide.pdf").write_bytes(b"toujours pas un pdf")
+    assert watcher.run_once() == ([str(folder / "vide.pdf")], [])
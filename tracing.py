@@ -0,0 +1,290 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("ollama_chatbot.trace")
+
+# Bornes (secondes) des histogrammes de durée exportés au format Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Attributs d'étape cumulés en compteurs Prometheus : seulement des quantités
+# additives (un TTFT, une fenêtre ou un budget n'ont pas de sens une fois sommés)
+COUNTED = ("tokens", "prompt_tokens", "prompt_chars", "texts", "chunks")
+
+
+# -------------------------------
+# Traces par requête : une durée par étape du pipeline RAG
+# -------------------------------
+class Trace:
+    """
+    Une requête (ingestion, question, résumé) et ses étapes (`spans`). Les
+    étapes lancées via Tracer.span() dans un thread où la trace est active
+    (`with trace.activate():`) lui sont rattachées.
+    """
+
+    def __init__(self, tracer, name, **attrs):
+        self.tracer = tracer
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.started_at = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def span(self, name, **attrs):
+        return self.tracer._span(self, name, attrs)
+
+    def record(self, name, seconds, **attrs):
+        self.tracer.record(self, name, seconds, attrs)
+
+    def iterate(self, name, iterable, **attrs):
+        """
+        Parcourt `iterable` en cumulant le temps passé à produire chaque élément
+        (extraction page par page) ; une seule étape est enregistrée à la fin.
+        """
+        seconds = 0.0
+        count = 0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+                count += 1
+                yield item
+        finally:
+            self.record(name, seconds, items=count, **attrs)
+
+    @contextmanager
+    def activate(self):
+        stack = self.tracer._stack()
+        stack.append(self)
+        try:
+            yield self
+        finally:
+            stack.remove(self)
+
+    def finish(self, **attrs):
+        """
+        Clôt la trace (une seule fois) : durée totale, journal JSON, métriques.
+        """
+        if self.duration is not None:
+            return
+        self.attrs.update(attrs)
+        self.duration = time.perf_counter() - self._start
+        self.tracer._finish(self)
+
+    def to_dict(self):
+        return {
+            "trace": self.id,
+            "request": self.name,
+            "started_at": self.started_at,
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 2),
+            **self.attrs,
+            "spans": list(self.spans),
+        }
+
+
+class Tracer:
+    """
+    Collecte les étapes : chacune est écrite en JSON (une ligne) sur le logger
+    "ollama_chatbot.trace", ajoutée à la trace active du thread et comptée dans
+    des histogrammes par étape (render_prometheus()), avec les attributs
+    additifs `counted` cumulés en compteurs. Les `keep` dernières
+    traces terminées restent consultables (last()).
+    """
+
+    def __init__(self, buckets=BUCKETS, keep=20, counted=COUNTED):
+        self.buckets = tuple(buckets)
+        self.counted = frozenset(counted)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._recent = deque(maxlen=keep)
+        self._stages = {}
+        self._requests = {}
+        self._totals = {}
+
+    def trace(self, name, **attrs):
+        return Trace(self, name, **attrs)
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name, **attrs):
+        """
+        Étape rattachée à la trace active du thread courant (ou isolée s'il n'y en a pas).
+        Le dictionnaire produit peut être complété (nombre de tokens...).
+        """
+        return self._span(self.current(), name, attrs)
+
+    def record(self, trace, name, seconds, attrs=None):
+        attrs = dict(attrs or {})
+        span = {"span": name, "duration_ms": round(seconds * 1000, 2), **attrs}
+        if trace is not None:
+            span["offset_ms"] = round((time.perf_counter() - seconds - trace._start) * 1000, 2)
+            with self._lock:
+                trace.spans.append(span)
+        with self._lock:
+            self._observe(self._stages, name, seconds)
+            for key, value in attrs.items():
+                if key in self.counted and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._totals[(name, key)] = self._totals.get((name, key), 0) + value
+        self._log({"event": "span", "trace": trace.id if trace else None,
+                   "request": trace.name if trace else None, **span})
+
+    def last(self, name=None):
+        """
+        Dernière trace terminée (de nom `name` si précisé), en dictionnaire, ou None.
+        """
+        with self._lock:
+            for trace in reversed(self._recent):
+                if name is None or trace["request"] == name:
+                    return trace
+        return None
+
+    def render_prometheus(self):
+        """
+        Métriques au format texte Prometheus (exposition 0.0.4).
+        """
+        with self._lock:
+            lines = []
+            lines += self._histogram("rag_stage_seconds", "Durée des étapes du pipeline RAG",
+                                     "stage", self._stages)
+            lines += self._histogram("rag_request_seconds", "Durée totale des requêtes",
+                                     "request", self._requests)
+            units = sorted({key for _, key in self._totals})
+            for unit in units:
+                metric = f"rag_stage_{_metric_name(unit)}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (stage, key), value in sorted(self._totals.items()):
+                    if key == unit:
+                        lines.append(f'{metric}{{stage="{_label(stage)}"}} {_number(value)}')
+        return "\n".join(lines) + "\n"
+
+    # ---- Interne
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def _span(self, trace, name, attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(trace, name, time.perf_counter() - start, attrs)
+
+    def _finish(self, trace):
+        data = trace.to_dict()
+        with self._lock:
+            self._recent.append(data)
+            self._observe(self._requests, trace.name, trace.duration)
+        self._log({"event": "trace", **{k: v for k, v in data.items() if k != "spans"}})
+
+    def _observe(self, series, name, seconds):
+        entry = series.get(name)
+        if entry is None:
+            entry = series[name] = {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)}
+        entry["count"] += 1
+        entry["sum"] += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                entry["buckets"][i] += 1
+
+    def _histogram(self, metric, help_text, label, series):
+        lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for name, entry in sorted(series.items()):
+            value = _label(name)
+            for bound, count in zip(self.buckets, entry["buckets"]):
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'{metric}_sum{{{label}="{value}"}} {entry["sum"]:.6f}')
+            lines.append(f'{metric}_count{{{label}="{value}"}} {entry["count"]}')
+        return lines
+
+    def _log(self, payload):
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(payload, ensure_ascii=False, default=str))
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric_name(value):
+    return "".join(ch if ch.isalnum() else "_" for ch in value)
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+def log_json(stream):
+    """
+    Écrit les traces en JSON (une ligne par étape et par requête) sur `stream`.
+    """
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+def format_trace(trace):
+    """
+    Résumé d'une trace sur quelques lignes, étapes de même nom cumulées
+    (panneau "Dernière requête" de l'interface).
+    """
+    if trace is None:
+        return "Aucune requête mesurée pour le moment."
+    stages = {}
+    for span in trace["spans"]:
+        entry = stages.setdefault(span["span"], {"ms": 0.0, "count": 0, "tokens": 0, "prompt_chars": 0,
+                                                 "ttft_ms": None})
+        entry["ms"] += span["duration_ms"]
+        entry["count"] += 1
+        entry["tokens"] += span.get("tokens") or 0
+        entry["prompt_chars"] += span.get("prompt_chars") or 0
+        if span.get("ttft_ms") is not None and entry["ttft_ms"] is None:
+            entry["ttft_ms"] = span["ttft_ms"]
+
+    header = f"{trace['request']} : {_duration(trace['duration_ms'])}"
+    if trace.get("error"):
+        header += f" (erreur : {trace['error']})"
+    elif trace.get("cached"):
+        header += " (depuis le cache)"
+    if trace.get("empty_pages"):
+        header += f" · {trace['empty_pages']} page(s) sans texte"
+    parts = []
+    for name, entry in stages.items():
+        details = []
+        if entry["count"] > 1:
+            details.append(f"x{entry['count']}")
+        if entry["prompt_chars"]:
+            details.append(f"{entry['prompt_chars']} caractères")
+        if entry["tokens"]:
+            details.append(f"{entry['tokens']} tokens")
+        if entry["ttft_ms"] is not None:
+            details.append(f"1er token {_duration(entry['ttft_ms'])}")
+        parts.append(f"{name} {_duration(entry['ms'])}" + (f" ({', '.join(details)})" if details else ""))
+    return header + ("\n" + " · ".join(parts) if parts else "")
+
+
+def _duration(ms):
+    if ms is None:
+        return "?"
+    return f"{ms:.0f} ms" if ms < 1000 else f"{ms / 1000:.2f} s"
@@ -0,0 +1,242 @@
+import heapq
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+MODES = ("int8", "float16")
+
+
+# -------------------------------
+# Index vectoriel compact (int8 / float16) à mémoire bornée, avec rescoring exact
+# -------------------------------
+def quantize(vectors, mode):
+    """
+    (vecteurs compacts, facteurs d'échelle) : int8 avec une échelle par vecteur
+    (max |v| / 127), ou float16 (échelle 1).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    compact = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return compact, scales.astype(np.float32)
+
+
+class QuantizedIndex:
+    """
+    Copie compacte des vecteurs des collections Chroma, pour que la recherche
+    tienne dans `memory_budget` octets : int8 (4 fois plus petit que float32)
+    ou float16 (2 fois). Les matrices compactes des collections interrogées
+    restent en mémoire (LRU) dans la limite du budget ; une collection plus
+    grande que le budget est parcourue depuis le disque par blocs. Les
+    `rescore * k` meilleurs candidats sont reclassés avec leurs vecteurs float32
+    exacts, lus sur disque. Distance : L2 au carré, comme Chroma par défaut.
+    Chaque collection porte une `version` (date d'ingestion) : une collection
+    réécrite est reconstruite par l'appelant (build()).
+    """
+
+    def __init__(self, path, mode="int8", memory_budget=256 << 20, rescore=4, block_rows=4096):
+        if mode not in MODES:
+            raise ValueError(f"mode inconnu : {mode} (attendu : {', '.join(MODES)})")
+        self.path = path
+        self.mode = mode
+        self.memory_budget = memory_budget
+        self.rescore = rescore
+        self.block_rows = block_rows
+        self._dtype = np.int8 if mode == "int8" else np.float16
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            "collection TEXT PRIMARY KEY, version TEXT, dim INTEGER NOT NULL, count INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "collection TEXT NOT NULL, id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "norm REAL NOT NULL, scale REAL NOT NULL, compact BLOB NOT NULL, exact BLOB NOT NULL, "
+            "PRIMARY KEY (collection, id))"
+        )
+        self._conn.commit()
+
+    def build(self, collection, ids, vectors, documents, metadatas, version=None):
+        """
+        (Re)construit la copie compacte d'une collection.
+        """
+        exact = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1) if len(ids) else np.zeros((0, 0))
+        compact, scales = quantize(exact, self.mode)
+        norms = (exact * exact).sum(axis=1)
+        rows = [
+            (collection, chunk_id, text or "", json.dumps(meta or {}, ensure_ascii=False),
+             float(norm), float(scale), c.tobytes(), e.tobytes())
+            for chunk_id, text, meta, norm, scale, c, e
+            in zip(ids, documents, metadatas, norms, scales, compact, exact)
+        ]
+        with self._lock:
+            self._loaded.pop(collection, None)
+            self._conn.execute("DELETE FROM vectors WHERE collection = ?", (collection,))
+            self._conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO collections (collection, version, dim, count) VALUES (?, ?, ?, ?)",
+                (collection, version, exact.shape[1], len(rows))
+            )
+            self._conn.commit()
+
+    def version(self, collection):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM collections WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def has(self, collection):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM collections WHERE collection = ?", (collection,)
+            ).fetchone() is not None
+
+    def collections(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT collection FROM collections")]
+
+    def drop(self, collection):
+        with self._lock:
+            self._loaded.pop(collection, None)
+            self._conn.execute("DELETE FROM vectors WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM collections WHERE collection = ?", (collection,))
+            self._conn.commit()
+
+    def search(self, vector, k=4, collections=None):
+        """
+        Retourne [(document, distance)] du plus proche au plus lointain, sur les
+        collections indiquées (toutes si None) ; metadata["collection"] est renseigné.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = float(query @ query)
+        names = self.collections() if collections is None else list(collections)
+        wanted = max(k, k * self.rescore)
+        candidates = []
+        for name in names:
+            for ids, distances in self._coarse(name, query, query_norm, wanted):
+                candidates.extend((float(d), name, chunk_id) for chunk_id, d in zip(ids, distances))
+                candidates = heapq.nsmallest(wanted, candidates)
+        return self._rescore(query, query_norm, candidates, k)
+
+    def memory(self):
+        """
+        Octets occupés par les matrices compactes chargées.
+        """
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._loaded.values())
+
+    def stats(self):
+        with self._lock:
+            count, = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()
+            loaded = list(self._loaded)
+            memory = sum(entry["bytes"] for entry in self._loaded.values())
+        return {"mode": self.mode, "vectors": count, "loaded": loaded, "memory_bytes": memory,
+                "memory_budget": self.memory_budget}
+
+    def vacuum(self):
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---- Interne
+    def _coarse(self, name, query, query_norm, wanted):
+        """
+        Produit (ids, distances approchées) par bloc, les `wanted` meilleurs de chaque bloc.
+        Les blocs sont convertis en float32 un par un : la mémoire temporaire reste bornée.
+        """
+        entry = self._resident(name)
+        blocks = self._slices(entry["block"]) if entry else self._stream(name)
+        for ids, compact, scales, norms in blocks:
+            if not len(ids):
+                continue
+            dots = (compact.astype(np.float32) @ query) * scales
+            distances = query_norm + norms - 2.0 * dots
+            if len(ids) > wanted:
+                best = np.argpartition(distances, wanted - 1)[:wanted]
+                yield [ids[i] for i in best], distances[best]
+            else:
+                yield ids, distances
+
+    def _resident(self, name):
+        """
+        Matrice compacte d'une collection gardée en mémoire, chargée au besoin si
+        elle tient dans le budget (en évinçant les moins récemment utilisées).
+        None si la collection doit être parcourue depuis le disque.
+        """
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry
+            row = self._conn.execute(
+                "SELECT dim, count FROM collections WHERE collection = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        dim, count = row
+        size = count * (dim * np.dtype(self._dtype).itemsize + 8)
+        if size > self.memory_budget:
+            return None
+        block = self._read(name)
+        with self._lock:
+            while self._loaded and sum(e["bytes"] for e in self._loaded.values()) + size > self.memory_budget:
+                self._loaded.popitem(last=False)
+            entry = self._loaded[name] = {"block": block, "bytes": size}
+        return entry
+
+    def _read(self, name, offset=0, limit=-1):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, scale, norm, compact FROM vectors WHERE collection = ? "
+                "ORDER BY rowid LIMIT ? OFFSET ?", (name, limit, offset)
+            ).fetchall()
+        ids = [row[0] for row in rows]
+        scales = np.array([row[1] for row in rows], dtype=np.float32)
+        norms = np.array([row[2] for row in rows], dtype=np.float32)
+        compact = np.frombuffer(b"".join(row[3] for row in rows), dtype=self._dtype)
+        compact = compact.reshape(len(rows), -1) if rows else compact.reshape(0, 0)
+        return ids, compact, scales, norms
+
+    def _slices(self, block):
+        ids, compact, scales, norms = block
+        for start in range(0, len(ids), self.block_rows):
+            end = start + self.block_rows
+            yield ids[start:end], compact[start:end], scales[start:end], norms[start:end]
+
+    def _stream(self, name):
+        offset = 0
+        while True:
+            block = self._read(name, offset, self.block_rows)
+            if not block[0]:
+                return
+            yield block
+            offset += len(block[0])
+
+    def _rescore(self, query, query_norm, candidates, k):
+        rescored = []
+        with self._lock:
+            for _, name, chunk_id in candidates:
+                text, metadata, norm, exact = self._conn.execute(
+                    "SELECT text, metadata, norm, exact FROM vectors WHERE collection = ? AND id = ?",
+                    (name, chunk_id)
+                ).fetchone()
+                distance = query_norm + norm - 2.0 * float(np.frombuffer(exact, dtype=np.float32) @ query)
+                rescored.append((distance, name, text, metadata))
+        results = []
+        for distance, name, text, metadata in heapq.nsmallest(k, rescored, key=lambda item: item[0]):
+            metadata = json.loads(metadata)
+            metadata["collection"] = name
+            results.append((Document(page_content=text, metadata=metadata), max(distance, 0.0)))
+        return results
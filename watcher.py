@@ -0,0 +1,189 @@
+import os
+import queue
+import threading
+import time
+
+from ingestion import IngestionCancelled
+from registry import file_signature
+
+
+# -------------------------------
+# Dossiers surveillés : ingestion incrémentale des PDF ajoutés, modifiés ou supprimés
+# -------------------------------
+def scan_pdfs(folder):
+    """
+    {chemin absolu: (taille, mtime)} des PDF du dossier, sous-dossiers compris.
+    """
+    found = {}
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.abspath(os.path.join(root, name))
+                try:
+                    found[path] = file_signature(path)
+                except OSError:
+                    pass  # supprimé entre le parcours et le stat
+    return found
+
+
+class FolderWatcher:
+    """
+    Tient chroma_db à jour avec des dossiers de PDF, parcourus toutes les
+    `interval` secondes :
+      - un PDF ajouté ou modifié est réingéré par un thread de fond, un à la fois ;
+        seuls ses morceaux nouveaux sont embeddés et ceux qui ont disparu sont
+        retirés (ingestion incrémentale de CollectionWriter) ;
+      - un PDF supprimé est retiré du registre, et sa collection supprimée si
+        aucun autre chemin ne la référence.
+    Un fichier n'est pris en compte qu'une fois sa taille et son mtime stables
+    pendant `settle` secondes (copie en cours). Les fichiers dont la signature
+    correspond au registre ne sont pas relus : un redémarrage ne coûte qu'un
+    parcours des dossiers. Les événements ingested, removed et error sont
+    déposés dans `self.events`.
+    """
+
+    def __init__(self, engine, folders, interval=2.0, settle=1.0):
+        self.engine = engine
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.interval = interval
+        self.settle = settle
+        self.events = queue.Queue()
+        self._tasks = queue.Queue()
+        self._queued = set()
+        self._seen = {}
+        self._failed = {}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._scan_loop, daemon=True),
+                         threading.Thread(target=self._work_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        Arrête la surveillance ; une ingestion en cours est interrompue (les
+        morceaux déjà écrits restent valides et ne seront pas ré-embeddés).
+        """
+        self._stop.set()
+        self._tasks.put(None)
+
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def scan(self, now=None, settle=None):
+        """
+        Un parcours des dossiers : met en file les PDF nouveaux ou modifiés (stables),
+        puis les chemins enregistrés qui n'existent plus. Retourne (à ingérer, à retirer).
+        """
+        now = time.monotonic() if now is None else now
+        settle = self.settle if settle is None else settle
+        present = {}
+        for folder in self.folders:
+            present.update(scan_pdfs(folder))
+
+        changed = []
+        for path, signature in present.items():
+            if path in self._queued or self._failed.get(path) == signature:
+                continue
+            if self.engine.registry.is_current(path):
+                self._seen.pop(path, None)
+                continue
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != signature:
+                self._seen[path] = (signature, now)
+                if settle > 0:
+                    continue
+            elif now - seen[1] < settle:
+                continue
+            del self._seen[path]
+            changed.append(path)
+        for path in list(self._seen):
+            if path not in present:
+                del self._seen[path]
+
+        # Après les ajouts : un fichier déplacé est rattaché à sa collection avant
+        # que l'ancien chemin ne soit oublié
+        removed = [path for path in self.engine.registry.known_paths()
+                   if self._watched(path) and path not in present and path not in self._queued]
+        for kind, paths in (("ingest", changed), ("remove", removed)):
+            for path in paths:
+                self._queued.add(path)
+                self._tasks.put((kind, path))
+        return changed, removed
+
+    def run_once(self):
+        """
+        Parcours puis traitement synchrone de tout ce qu'il a trouvé (CLI --once, tests),
+        sans attendre que les fichiers soient stables.
+        """
+        changed, removed = self.scan(settle=0)
+        while not self._tasks.empty():
+            task = self._tasks.get_nowait()
+            if task is not None:
+                self._process(*task)
+        return changed, removed
+
+    # ---- Interne
+    def _watched(self, path):
+        return any(path == folder or path.startswith(folder + os.sep) for folder in self.folders)
+
+    def _scan_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                self.events.put({"type": "error", "path": None, "error": e})
+            self._stop.wait(self.interval)
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            task = self._tasks.get()
+            if task is None:
+                return
+            self._process(*task)
+
+    def _process(self, kind, path):
+        try:
+            if kind == "ingest":
+                self._ingest(path)
+            else:
+                self._remove(path)
+        except IngestionCancelled:
+            pass
+        except Exception as e:
+            try:
+                self._failed[path] = file_signature(path)  # réessayé si le fichier change encore
+            except OSError:
+                pass
+            self.events.put({"type": "error", "path": path, "error": e})
+        finally:
+            self._queued.discard(path)
+
+    def _ingest(self, path):
+        registry = self.engine.registry
+        previous = registry.path_entry(path)
+        result = self.engine.ingest(path, cancel_event=self._stop)
+        # Contenu réécrit dans une autre collection : l'ancienne n'est plus référencée
+        if previous and previous["collection"] != result["collection"] \
+                and not registry.is_known_collection(previous["collection"]):
+            self.engine.drop_collection(previous["collection"])
+        self._failed.pop(path, None)
+        self.events.put({"type": "ingested", **{k: v for k, v in result.items() if k != "vectorstore"}})
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            return  # revenu entre-temps
+        orphan = self.engine.registry.remove(path)
+        dropped = None
+        if orphan and not self.engine.registry.is_known_collection(orphan["collection"]):
+            dropped = orphan["collection"]
+            self.engine.drop_collection(dropped)
+        self.events.put({"type": "removed", "path": path, "collection": dropped})